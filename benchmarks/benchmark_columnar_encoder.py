@@ -0,0 +1,72 @@
+"""
+Benchmark of the columnar encoder against records plus DictVectorizer.
+
+Run from the repository root:
+    python -m benchmarks.benchmark_columnar_encoder --n-rows 100000
+"""
+
+import time
+import tracemalloc
+from typing import Any, Callable
+
+import click
+from sklearn.feature_extraction import DictVectorizer
+
+from training.columnar_encoder import ColumnarEncoder
+from training.feature_engineering import feature_selection, feature_engineering
+from benchmarks.benchmark_feature_engineering import create_flight_data
+
+
+def measure(func: Callable[[], Any]) -> tuple[float, float]:
+    """
+    Wall time and peak traced allocations of a single call.
+
+    Args:
+        func (Callable[[], Any]): Function to call
+
+    Returns:
+        tuple[float, float]: Time in seconds and peak allocations in MiB
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+@click.command()
+@click.option(
+    "--n-rows",
+    type=int,
+    multiple=True,
+    default=[1, 1_000, 100_000],
+    help="Number of rows to benchmark. Can be given multiple times.",
+)
+@click.option("--seed", type=int, default=13371337, help="Random seed for the generated data.")
+def run_benchmark(n_rows: tuple[int, ...], seed: int) -> None:
+    """
+    Time and trace allocations of transforming features with both encoders.
+    """
+    print(f"{'rows':>8} {'encoder':>16} {'time [ms]':>10} {'peak [MiB]':>11}")
+    for n in n_rows:
+        features = feature_selection(feature_engineering(create_flight_data(n, seed)))
+        records_vectorizer = DictVectorizer().fit(features.to_dict(orient="records"))
+        columnar_encoder = ColumnarEncoder().fit(features)
+
+        candidates = {
+            "DictVectorizer": lambda: records_vectorizer.transform(
+                features.to_dict(orient="records")  # pylint: disable=cell-var-from-loop
+            ),
+            "ColumnarEncoder": lambda: columnar_encoder.transform(
+                features  # pylint: disable=cell-var-from-loop
+            ),
+        }
+        for name, func in candidates.items():
+            elapsed, peak = measure(func)
+            print(f"{n:>8} {name:>16} {elapsed * 1e3:>10.3f} {peak:>11.2f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
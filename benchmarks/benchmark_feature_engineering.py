@@ -0,0 +1,127 @@
+"""
+Benchmark of the vectorized feature engineering against the
+string based implementation it replaced.
+
+Run from the repository root:
+    python -m benchmarks.benchmark_feature_engineering --n-rows 1 --n-rows 1000 --n-rows 1000000
+"""
+
+import time
+from typing import Callable
+
+import click
+import numpy as np
+import pandas as pd
+
+from training.feature_engineering import (
+    feature_engineering,
+    _create_trip_ids_from_strings,
+    create_total_duration_minutes,
+    _create_weekday_feature_from_strings,
+    _create_rounded_arrival_and_departure_times_from_strings,
+)
+
+
+def legacy_feature_engineering(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The string based feature engineering, as used before vectorization.
+
+    Args:
+        df (pd.DataFrame): Dataframe with flight data
+
+    Returns:
+        pd.DataFrame: Dataframe with added features
+    """
+    df["weekday"] = _create_weekday_feature_from_strings(df=df)
+    df["tripid"] = _create_trip_ids_from_strings(df=df)
+    df["departure_hour_rounded"], df["arrival_hour_rounded"] = (
+        _create_rounded_arrival_and_departure_times_from_strings(df=df)
+    )
+    df["total_duration_minutes"] = create_total_duration_minutes(df=df)
+    return df
+
+
+def create_flight_data(n_rows: int, seed: int) -> pd.DataFrame:
+    """
+    Create random flight data with the same columns as the raw dataset.
+
+    Args:
+        n_rows (int): Number of rows
+        seed (int): Random seed
+
+    Returns:
+        pd.DataFrame: Random flight data
+    """
+    rng = np.random.default_rng(seed)
+    cities = ["Banglore", "Kolkata", "Chennai", "Delhi", "Mumbai", "Cochin", "New Delhi"]
+    return pd.DataFrame(
+        {
+            "airline": rng.choice(["IndiGo", "Air India", "Jet Airways", "SpiceJet"], n_rows),
+            "source": rng.choice(cities, n_rows),
+            "destination": rng.choice(cities, n_rows),
+            "total_stops": rng.integers(0, 5, n_rows),
+            "date": rng.integers(1, 28, n_rows),
+            "month": rng.integers(1, 13, n_rows),
+            "year": rng.integers(1990, 2050, n_rows),
+            "dep_hours": rng.integers(0, 24, n_rows),
+            "dep_min": rng.integers(0, 60, n_rows),
+            "arrival_hours": rng.integers(0, 24, n_rows),
+            "arrival_min": rng.integers(0, 60, n_rows),
+            "duration_hours": rng.integers(0, 24, n_rows),
+            "duration_min": rng.integers(0, 60, n_rows),
+        }
+    )
+
+
+def time_function(
+    func: Callable[[pd.DataFrame], pd.DataFrame], df: pd.DataFrame, repeats: int
+) -> float:
+    """
+    Best wall time of calling func on a copy of df.
+
+    Args:
+        func (Callable[[pd.DataFrame], pd.DataFrame]): Function to time
+        df (pd.DataFrame): Input data
+        repeats (int): Number of timed calls
+
+    Returns:
+        float: Smallest observed time in seconds
+    """
+    timings = []
+    for _ in range(repeats):
+        df_copy = df.copy()
+        start = time.perf_counter()
+        func(df_copy)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+@click.command()
+@click.option(
+    "--n-rows",
+    type=int,
+    multiple=True,
+    default=[1, 1_000, 1_000_000],
+    help="Number of rows to benchmark. Can be given multiple times.",
+)
+@click.option("--repeats", type=int, default=5, help="Number of timed calls per row count.")
+@click.option("--seed", type=int, default=13371337, help="Random seed for the generated data.")
+def run_benchmark(n_rows: tuple[int, ...], repeats: int, seed: int) -> None:
+    """
+    Time legacy and vectorized feature engineering and check that they agree.
+    """
+    print(f"{'rows':>10} {'legacy [ms]':>14} {'vectorized [ms]':>16} {'speedup':>8}")
+    for n in n_rows:
+        df = create_flight_data(n, seed)
+        pd.testing.assert_frame_equal(
+            feature_engineering(df.copy()), legacy_feature_engineering(df.copy())
+        )
+        legacy = time_function(legacy_feature_engineering, df, repeats)
+        vectorized = time_function(feature_engineering, df, repeats)
+        print(
+            f"{n:>10} {legacy * 1e3:>14.3f} {vectorized * 1e3:>16.3f} {legacy / vectorized:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,293 @@
+"""
+Admission control of prediction requests. Requests are shed early, with a
+Retry-After response, when they waited too long in nginx and gunicorn, when they
+can not finish before their deadline, or when too many rows are in progress.
+Bodies and requests which are too large are rejected.
+"""
+
+import time
+from http import HTTPStatus
+from typing import Any
+
+import metrics
+
+# Set by nginx to the time it passed the request on to gunicorn, as "t=<seconds since epoch>"
+REQUEST_START_HEADER = "X-Request-Start"
+# Exponential moving average weight of the latest service time
+SERVICE_TIME_SMOOTHING = 0.2
+# One in this many requests of a size which is shed for its deadline is served
+# anyway, so that the service time of that size recovers once the worker is faster
+DEADLINE_PROBE_EVERY = 10
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised for a request which is not admitted
+    """
+
+    def __init__(self, decision: str, status_code: int, detail: str) -> None:
+        """
+        Args:
+            decision (str): One of metrics.ADMISSION_DECISIONS
+            status_code (int): HTTP status of the response
+            detail (str): Reason for the client
+        """
+        super().__init__(detail)
+        self.decision = decision
+        self.status_code = status_code
+        self.detail = detail
+
+    @property
+    def retry(self) -> bool:
+        """
+        Whether the request was shed because of load, and may succeed later
+        """
+        return self.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+
+
+def queue_seconds(request_start: str | None, now: float | None = None) -> float | None:
+    """
+    Time a request spent between nginx and the app
+
+    Args:
+        request_start (str | None): Value of the X-Request-Start header
+        now (float | None, optional): Current time since epoch. Defaults to time.time().
+
+    Returns:
+        float | None: Seconds, None if the header is missing or malformed
+    """
+    if not request_start:
+        return None
+    try:
+        start = float(request_start.removeprefix("t="))
+    except ValueError:
+        return None
+    # Some proxies send milli- or microseconds
+    while start > 1e11:
+        start /= 1000
+    return max((time.time() if now is None else now) - start, 0.0)
+
+
+class AdmissionController:
+    """
+    Decides which prediction requests to serve. A limit of 0 disables its check.
+
+    The time a request will take is estimated from the recent service times of
+    requests with a similar number of rows, grouped by powers of two. Requests are
+    only shed for their deadline once requests of their size were served, and one
+    in DEADLINE_PROBE_EVERY of them is served anyway to measure the size again.
+    """
+
+    def __init__(
+        self,
+        max_body_bytes: int,
+        max_rows: int,
+        max_in_flight_rows: int,
+        max_queue_ms: float,
+        deadline_ms: float,
+    ) -> None:
+        """
+        Args:
+            max_body_bytes (int): Largest request body
+            max_rows (int): Largest number of rows per request
+            max_in_flight_rows (int): Largest number of rows in progress at once
+            max_queue_ms (float): Longest time a request may wait before the app gets it
+            deadline_ms (float): Time after which the client is assumed to have given up,
+                counted from when nginx passed the request on
+        """
+        self.max_body_bytes = max_body_bytes
+        self.max_rows = max_rows
+        self.max_in_flight_rows = max_in_flight_rows
+        self.max_queue_s = max_queue_ms / 1e3
+        self.deadline_s = deadline_ms / 1e3
+
+        self.in_flight_rows = 0
+        self.service_seconds: list[float | None] = [None] * 64
+        self.deadline_sheds = [0] * 64
+        self.decisions = dict.fromkeys(metrics.ADMISSION_DECISIONS, 0)
+
+    def reject(self, decision: str, status_code: int, detail: str) -> AdmissionRejected:
+        """
+        Count a rejection
+
+        Args:
+            decision (str): One of metrics.ADMISSION_DECISIONS
+            status_code (int): HTTP status of the response
+            detail (str): Reason for the client
+
+        Returns:
+            AdmissionRejected: Exception to raise
+        """
+        self.decisions[decision] += 1
+        metrics.ADMISSIONS.inc(decision)
+        return AdmissionRejected(decision, status_code, detail)
+
+    def check_arrival(self, request_start: str | None, content_length: str | None) -> float:
+        """
+        Checks before the body is read
+
+        Args:
+            request_start (str | None): Value of the X-Request-Start header
+            content_length (str | None): Value of the Content-Length header
+
+        Raises:
+            AdmissionRejected: If the request waited too long or its body is too large
+
+        Returns:
+            float: Seconds the request waited before the app got it, 0 if unknown
+        """
+        waited = queue_seconds(request_start) or 0.0
+        if self.max_queue_s and waited > self.max_queue_s:
+            raise self.reject(
+                "shed_queue_time",
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                f"Request waited {waited * 1e3:.0f} ms in the queue, "
+                f"the limit is {self.max_queue_s * 1e3:.0f} ms",
+            )
+        if self.deadline_s and waited > self.deadline_s:
+            raise self.reject(
+                "shed_deadline",
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                f"Request waited past its deadline of {self.deadline_s * 1e3:.0f} ms",
+            )
+        if content_length is not None and content_length.isdigit():
+            self.check_body_size(int(content_length))
+        return waited
+
+    def check_body_size(self, n_bytes: int) -> None:
+        """
+        Check the size of a request body
+
+        Args:
+            n_bytes (int): Size of the body
+
+        Raises:
+            AdmissionRejected: If the body is larger than max_body_bytes
+        """
+        if self.max_body_bytes and n_bytes > self.max_body_bytes:
+            raise self.reject(
+                "rejected_body_size",
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                f"Request body has {n_bytes} bytes, the limit is {self.max_body_bytes}",
+            )
+
+    def estimate_seconds(self, n_rows: int) -> float | None:
+        """
+        Expected service time of a request
+
+        Args:
+            n_rows (int): Number of rows of the request
+
+        Returns:
+            float | None: Seconds, None before any request of that size was served
+        """
+        return self.service_seconds[n_rows.bit_length()]
+
+    def misses_deadline(self, n_rows: int, elapsed_s: float) -> bool:
+        """
+        Whether a request is expected to finish after its deadline. Unmeasured
+        sizes are never expected to, and every DEADLINE_PROBE_EVERY-th request of
+        a size which would be shed is let through to measure it again.
+
+        Args:
+            n_rows (int): Number of rows of the request
+            elapsed_s (float): Seconds since nginx passed the request on
+
+        Returns:
+            bool: Whether to shed the request
+        """
+        estimate = self.estimate_seconds(n_rows)
+        if estimate is None or elapsed_s + estimate <= self.deadline_s:
+            return False
+        bucket = n_rows.bit_length()
+        self.deadline_sheds[bucket] += 1
+        if self.deadline_sheds[bucket] >= DEADLINE_PROBE_EVERY:
+            self.deadline_sheds[bucket] = 0
+            return False
+        return True
+
+    def admit(self, n_rows: int, elapsed_s: float) -> None:
+        """
+        Admit a parsed request for inference, to be released with release
+
+        Args:
+            n_rows (int): Number of rows of the request
+            elapsed_s (float): Seconds since nginx passed the request on
+
+        Raises:
+            AdmissionRejected: If the request has too many rows, too many rows are
+                in progress, or it is not expected to finish before its deadline
+        """
+        if self.max_rows and n_rows > self.max_rows:
+            raise self.reject(
+                "rejected_rows",
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                f"Request has {n_rows} rows, the limit is {self.max_rows}",
+            )
+        # A request larger than the limit is still served when nothing else is in progress
+        if (
+            self.max_in_flight_rows
+            and self.in_flight_rows > 0
+            and self.in_flight_rows + n_rows > self.max_in_flight_rows
+        ):
+            raise self.reject(
+                "shed_in_flight_rows",
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                f"{self.in_flight_rows} rows in progress, the limit is {self.max_in_flight_rows}",
+            )
+        if self.deadline_s and self.misses_deadline(n_rows, elapsed_s):
+            raise self.reject(
+                "shed_deadline",
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                f"Request is not expected to finish within its deadline of "
+                f"{self.deadline_s * 1e3:.0f} ms",
+            )
+        self.in_flight_rows += n_rows
+        self.decisions["admitted"] += 1
+        metrics.ADMISSIONS.inc("admitted")
+
+    def release(self, n_rows: int, service_s: float | None = None) -> None:
+        """
+        Release the rows of an admitted request
+
+        Args:
+            n_rows (int): Number of rows of the request
+            service_s (float | None, optional): Seconds it took to serve, None if it failed
+        """
+        self.in_flight_rows -= n_rows
+        if service_s is None:
+            return
+        bucket = n_rows.bit_length()
+        previous = self.service_seconds[bucket]
+        self.service_seconds[bucket] = (
+            service_s
+            if previous is None
+            else previous + SERVICE_TIME_SMOOTHING * (service_s - previous)
+        )
+
+    def count_shed(self, decision: str) -> None:
+        """
+        Count a request shed outside of the controller
+
+        Args:
+            decision (str): One of metrics.ADMISSION_DECISIONS
+        """
+        self.decisions[decision] += 1
+        metrics.ADMISSIONS.inc(decision)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Limits, rows in progress and decision counters of this worker
+
+        Returns:
+            dict[str, Any]: Admission stats
+        """
+        return {
+            "max_body_bytes": self.max_body_bytes,
+            "max_rows": self.max_rows,
+            "max_in_flight_rows": self.max_in_flight_rows,
+            "max_queue_ms": self.max_queue_s * 1e3,
+            "deadline_ms": self.deadline_s * 1e3,
+            "in_flight_rows": self.in_flight_rows,
+            "decisions": self.decisions,
+        }
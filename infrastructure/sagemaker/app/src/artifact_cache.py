@@ -0,0 +1,231 @@
+"""
+Content-addressed on-disk cache of mlflow model artifacts, so that a container
+downloads a model once and all its workers load it from local disk.
+
+Pre-warm the cache, e.g. at image build time (from this directory):
+    python artifact_cache.py --model-uri <MLFLOW_MODEL_URI> --cache-dir <ARTIFACT_CACHE_DIR>
+"""
+
+import os
+import json
+import fcntl
+import shutil
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+
+import click
+
+CHUNK_SIZE = 1 << 20
+
+
+class ArtifactCacheError(Exception):
+    """
+    Raised when cached artifacts do not match their recorded digest
+    """
+
+
+def directory_digest(path: Path) -> str:
+    """
+    SHA-256 digest of the relative paths and contents of all files in a directory
+
+    Args:
+        path (Path): Directory to hash
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    for file_path in sorted(p for p in path.rglob("*") if p.is_file()):
+        digest.update(file_path.relative_to(path).as_posix().encode())
+        digest.update(b"\0")
+        with open(file_path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                digest.update(chunk)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    """
+    Stores downloaded model directories under the digest of their content, in
+    <cache_dir>/blobs/<digest>, and maps each model uri to a digest in
+    <cache_dir>/uris/<hash of uri>.json. Entries are written atomically and
+    downloads are serialized with a file lock, so that the workers of a
+    container share one download.
+
+    The uri to digest mapping is trusted once written, so uris should point to
+    immutable artifacts, e.g. runs:/ or s3:// run artifact uris rather than
+    registered model aliases.
+    """
+
+    def __init__(
+        self, cache_dir: str | Path, verify: bool = True, logger: logging.Logger | None = None
+    ) -> None:
+        """
+        Args:
+            cache_dir (str | Path): Directory holding the cache
+            verify (bool, optional): Whether to check the digest of cached
+                artifacts before using them. Defaults to True.
+            logger (logging.Logger | None, optional): logger object. Defaults to the root logger.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.verify = verify
+        self.logger = logger or logging.getLogger()
+
+    def _index_path(self, model_uri: str) -> Path:
+        """
+        Path of the index entry of a model uri
+
+        Args:
+            model_uri (str): uri to the model
+
+        Returns:
+            Path: Index entry path
+        """
+        return self.cache_dir / "uris" / f"{hashlib.sha256(model_uri.encode()).hexdigest()}.json"
+
+    def lookup(self, model_uri: str) -> Path | None:
+        """
+        Local directory of a cached model
+
+        Args:
+            model_uri (str): uri to the model
+
+        Raises:
+            ArtifactCacheError: If verification is on and the cached files do not match their digest
+
+        Returns:
+            Path | None: The model directory, or None if the model is not cached
+        """
+        try:
+            entry = json.loads(self._index_path(model_uri).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        blob_path = self.cache_dir / "blobs" / entry["digest"]
+        if not blob_path.is_dir():
+            return None
+        if self.verify and directory_digest(blob_path) != entry["digest"]:
+            raise ArtifactCacheError(
+                f"Cached artifacts of {model_uri} in {blob_path} are corrupted"
+            )
+        return blob_path
+
+    def _download(self, model_uri: str) -> Path:
+        """
+        Download a model into the cache and record its digest
+
+        Args:
+            model_uri (str): uri to the model
+
+        Returns:
+            Path: The cached model directory
+        """
+        (self.cache_dir / "blobs").mkdir(parents=True, exist_ok=True)
+        (self.cache_dir / "uris").mkdir(parents=True, exist_ok=True)
+
+        # Imported when needed only, cache hits do not pay for importing mlflow
+        import mlflow  # pylint: disable=import-outside-toplevel
+
+        download_dir = Path(tempfile.mkdtemp(dir=self.cache_dir, prefix=".download-"))
+        try:
+            local_path = Path(
+                mlflow.artifacts.download_artifacts(
+                    artifact_uri=model_uri, dst_path=str(download_dir)
+                )
+            )
+            digest = directory_digest(local_path)
+            blob_path = self.cache_dir / "blobs" / digest
+            if blob_path.is_dir():
+                self.logger.info("Artifacts of %s are already cached as %s", model_uri, digest)
+            else:
+                local_path.rename(blob_path)
+        finally:
+            shutil.rmtree(download_dir, ignore_errors=True)
+
+        index_path = self._index_path(model_uri)
+        tmp_index_path = index_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_index_path.write_text(
+            json.dumps({"model_uri": model_uri, "digest": digest}), encoding="utf-8"
+        )
+        tmp_index_path.replace(index_path)
+        return blob_path
+
+    def resolve(self, model_uri: str) -> Path:
+        """
+        Local directory of a model, downloading it into the cache if needed.
+        Corrupted cache entries are downloaded again.
+
+        Args:
+            model_uri (str): uri to the model
+
+        Returns:
+            Path: The cached model directory
+        """
+        try:
+            cached_path = self.lookup(model_uri)
+        except ArtifactCacheError:
+            cached_path = None
+        if cached_path is not None:
+            self.logger.info("Loading %s from artifact cache %s", model_uri, cached_path)
+            return cached_path
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_dir / ".lock", "w", encoding="utf-8") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Another worker may have filled the cache while we waited for the lock
+                try:
+                    cached_path = self.lookup(model_uri)
+                except ArtifactCacheError:
+                    self.logger.warning("Discarding corrupted cache entry", exc_info=True)
+                    shutil.rmtree(
+                        self.cache_dir / "blobs" / self._read_digest(model_uri), ignore_errors=True
+                    )
+                if cached_path is not None:
+                    self.logger.info("Loading %s from artifact cache %s", model_uri, cached_path)
+                    return cached_path
+                self.logger.info("Downloading %s into artifact cache %s", model_uri, self.cache_dir)
+                return self._download(model_uri)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_digest(self, model_uri: str) -> str:
+        """
+        Digest recorded for a model uri
+
+        Args:
+            model_uri (str): uri to the model
+
+        Returns:
+            str: Hex digest
+        """
+        return json.loads(self._index_path(model_uri).read_text(encoding="utf-8"))["digest"]
+
+
+@click.command()
+@click.option(
+    "--model-uri",
+    type=str,
+    required=True,
+    envvar="MLFLOW_MODEL_URI",
+    help="URI to the mlflow model.",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    required=True,
+    envvar="ARTIFACT_CACHE_DIR",
+    help="Directory holding the artifact cache.",
+)
+def prewarm(model_uri: str, cache_dir: Path) -> None:
+    """
+    Download a model into the artifact cache.
+    """
+    logging.basicConfig(level=logging.INFO)
+    print(ArtifactCache(cache_dir).resolve(model_uri))
+
+
+if __name__ == '__main__':
+    prewarm()
@@ -0,0 +1,162 @@
+"""
+Coalescing of concurrent prediction requests into single model calls
+"""
+
+import asyncio
+from typing import Any, Callable, Awaitable
+from logging import Logger
+
+import numpy as np
+import pandas as pd
+
+
+class MicroBatcher:
+    """
+    Gathers the rows of concurrent requests and predicts them with one model call.
+
+    A batch is predicted when max_rows rows are pending, or max_wait_ms after the
+    first request of the batch arrived, whichever comes first. A request whose
+    rows would not fit in the pending batch sends it off first, so that no batch
+    has more than max_rows rows. Requests with at least max_rows rows are predicted
+    directly. Each request gets back the predictions of its own rows, in order.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[pd.DataFrame], Awaitable[np.ndarray]],
+        max_wait_ms: float,
+        max_rows: int,
+        logger: Logger,
+    ) -> None:
+        """
+        Args:
+            predict_fn (Callable[[pd.DataFrame], Awaitable[np.ndarray]]): Coroutine function
+                predicting a batch
+            max_wait_ms (float): Longest time in milliseconds a request waits for others
+            max_rows (int): Number of pending rows which triggers a model call
+            logger (Logger): logger object
+        """
+        self.predict_fn = predict_fn
+        self.max_wait_s = max_wait_ms / 1000
+        self.max_rows = max_rows
+        self.logger = logger
+
+        self._pending: list[tuple[pd.DataFrame, asyncio.Future, bool]] = []
+        self._pending_rows = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+        self.full_batches = 0
+        self.fill_ratio_sum = 0.0
+
+    async def predict(self, df: pd.DataFrame, record_stats: bool = True) -> np.ndarray:
+        """
+        Predict the rows of one request as part of a batch
+
+        Args:
+            df (pd.DataFrame): Input data of the request
+            record_stats (bool, optional): Whether the request counts in the batch
+                stats, False for warm-up calls. Defaults to True.
+
+        Returns:
+            np.ndarray: Predictions for the rows of df
+        """
+        if len(df) >= self.max_rows:
+            if record_stats:
+                self._record_batch(n_requests=1, n_rows=len(df))
+            return await self.predict_fn(df)
+
+        if self._pending_rows + len(df) > self.max_rows:
+            self._flush()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((df, future, record_stats))
+        self._pending_rows += len(df)
+
+        if self._pending_rows >= self.max_rows:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_s, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        """
+        Start predicting all pending requests as one batch
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        n_rows, self._pending_rows = self._pending_rows, 0
+        if not pending:
+            return
+
+        n_recorded = sum(record_stats for _, _, record_stats in pending)
+        if n_recorded:
+            self._record_batch(n_requests=n_recorded, n_rows=n_rows)
+        task = asyncio.get_running_loop().create_task(self._predict_batch(pending))
+        # Keep a reference until the task is done so it is not garbage collected
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _predict_batch(
+        self, pending: list[tuple[pd.DataFrame, asyncio.Future, bool]]
+    ) -> None:
+        """
+        Predict a batch and hand each request its predictions
+
+        Args:
+            pending (list[tuple[pd.DataFrame, asyncio.Future, bool]]): Requests of the batch
+        """
+        try:
+            batch = pd.concat([df for df, _, _ in pending], ignore_index=True)
+            predictions = await self.predict_fn(batch)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.logger.error("Batch prediction failed", exc_info=True)
+            for _, future, _ in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offsets = np.cumsum([len(df) for df, _, _ in pending])[:-1]
+        for (_, future, _), request_predictions in zip(pending, np.split(predictions, offsets)):
+            if not future.done():
+                future.set_result(request_predictions)
+
+    def _record_batch(self, n_requests: int, n_rows: int) -> None:
+        """
+        Update the batch counters
+
+        Args:
+            n_requests (int): Number of requests in the batch
+            n_rows (int): Number of rows in the batch
+        """
+        self.batches += 1
+        self.requests += n_requests
+        self.rows += n_rows
+        self.full_batches += n_rows >= self.max_rows
+        self.fill_ratio_sum += min(n_rows / self.max_rows, 1.0)
+        self.logger.debug("Predicting batch of %s rows from %s requests", n_rows, n_requests)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Counters describing how full the batches are
+
+        Returns:
+            dict[str, Any]: Batch counters and averages
+        """
+        batches = max(self.batches, 1)
+        return {
+            "max_rows": self.max_rows,
+            "max_wait_ms": self.max_wait_s * 1000,
+            "batches": self.batches,
+            "full_batches": self.full_batches,
+            "requests": self.requests,
+            "rows": self.rows,
+            "mean_requests_per_batch": self.requests / batches,
+            "mean_rows_per_batch": self.rows / batches,
+            "mean_fill_ratio": self.fill_ratio_sum / batches,
+        }
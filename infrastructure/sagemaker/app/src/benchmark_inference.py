@@ -0,0 +1,84 @@
+"""
+Compares prediction latency of the mlflow pyfunc wrapper, the native
+inference path and the native path with flattened trees. Checks that pyfunc and
+native give the same predictions, and flat the same up to float32 rounding.
+
+Usage (from this directory):
+    python benchmark_inference.py --model-uri <MLFLOW_MODEL_URI>
+"""
+
+import time
+import statistics
+from typing import Any, Callable
+from functools import partial
+
+import click
+import numpy as np
+import mlflow
+import pandas as pd
+from native_model import NativeModel
+from synthetic_data import create_random_request
+
+
+@click.command()
+@click.option("--model-uri", type=str, required=True, help="URI to the mlflow model.")
+@click.option(
+    "--batch-size",
+    type=int,
+    multiple=True,
+    default=[1, 10, 100, 1_000, 10_000],
+    help="Number of rows per prediction call. Can be given multiple times.",
+)
+@click.option("--repeats", type=int, default=50, help="Number of timed calls per batch size.")
+@click.option("--seed", type=int, default=13371337, help="Random seed for the generated data.")
+def run_benchmark(model_uri: str, batch_size: tuple[int, ...], repeats: int, seed: int) -> None:
+    """
+    Time predictions of all inference modes on random requests, end to end and
+    for the model alone on the encoded features.
+    """
+    models = {
+        "pyfunc": mlflow.pyfunc.load_model(model_uri),
+        "native": NativeModel.load(model_uri),
+        "flat": NativeModel.load(model_uri, flat_max_rows=max(batch_size)),
+    }
+    print(f"{'rows':>6} {'mode':>7} {'median [ms]':>12} {'p95 [ms]':>9} {'model median [ms]':>18}")
+    for n_rows in batch_size:
+        df = pd.DataFrame(create_random_request(n_rows, seed)).drop(columns=["prediction_id"])
+        native_preds = models["native"].predict(df.copy())
+        np.testing.assert_array_equal(models["pyfunc"].predict(df.copy()), native_preds)
+        np.testing.assert_allclose(models["flat"].predict(df.copy()), native_preds, rtol=1e-5)
+        features = models["native"].transform(df.copy())
+        for mode, model in models.items():
+            timings = time_calls(lambda: model.predict(df.copy()), repeats)
+            p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+            model_median = "-"
+            if isinstance(model, NativeModel):
+                model_timings = time_calls(partial(model.predict_features, features), repeats)
+                model_median = f"{statistics.median(model_timings):.3f}"
+            print(
+                f"{n_rows:>6} {mode:>7} {statistics.median(timings):>12.3f} {p95:>9.3f} "
+                f"{model_median:>18}"
+            )
+
+
+def time_calls(fn: Callable[[], Any], repeats: int) -> list[float]:
+    """
+    Time repeated calls of a function
+
+    Args:
+        fn (Callable[[], Any]): Function to call
+        repeats (int): Number of calls
+
+    Returns:
+        list[float]: Milliseconds per call
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1e3)
+    return timings
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,213 @@
+"""
+Cold start benchmark of the prediction service. Each repeat starts fresh Python
+processes and measures:
+
+- import: importing the app's modules, before any settings are read
+- build: creating the app from the settings, mostly loading and warming up the model
+- model_load: the load and warm-up time of the default model version alone
+- first_ping: from starting gunicorn with one worker, as serve does, until /ping
+  reports ready, after the worker has warmed up
+
+Usage (from this directory):
+    python benchmark_startup.py --model-uri <MLFLOW_MODEL_URI> --inference-mode native
+    python benchmark_startup.py --model-uri <MLFLOW_MODEL_URI> --import-profile 15
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import statistics
+import subprocess
+from typing import Any
+from pathlib import Path
+
+import click
+import httpx
+
+SERVER_START_TIMEOUT_S = 300
+PING_INTERVAL_S = 0.01
+
+# Run in a fresh interpreter, prints the timings as JSON on its last line
+STARTUP_SCRIPT = """
+import sys, json, time
+start = time.perf_counter()
+import predictor
+imported = time.perf_counter()
+import app
+built = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - start,
+    "build_s": built - imported,
+    "model_load_s": app.app.prediction_handler.models.get().load_seconds,
+    "mlflow_imported": "mlflow" in sys.modules,
+    "modules": len(sys.modules),
+}))
+"""
+
+
+def measure_startup(env: dict[str, str]) -> dict[str, Any]:
+    """
+    Import the app's modules and build the app in a fresh interpreter
+
+    Args:
+        env (dict[str, str]): Environment of the interpreter
+
+    Returns:
+        dict[str, Any]: Import, build and model load seconds, whether mlflow was
+            imported and the number of loaded modules
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure_first_ping(env: dict[str, str]) -> float:
+    """
+    Start gunicorn with one worker and wait for the first answer to /ping
+
+    Args:
+        env (dict[str, str]): Environment of the server
+
+    Raises:
+        RuntimeError: If the server does not answer in time
+
+    Returns:
+        float: Seconds from starting the server until /ping answered
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "-k",
+            "uvicorn.workers.UvicornWorker",
+            "-b",
+            f"127.0.0.1:{port}",
+            "-w",
+            "1",
+            "wsgi:app",
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            while time.perf_counter() - start < SERVER_START_TIMEOUT_S and server.poll() is None:
+                try:
+                    if client.get("/ping").status_code == 204:
+                        return time.perf_counter() - start
+                except httpx.HTTPError:
+                    pass
+                time.sleep(PING_INTERVAL_S)
+    finally:
+        server.terminate()
+        server.wait()
+    raise RuntimeError("gunicorn did not answer /ping in time")
+
+
+def import_profile(env: dict[str, str], top: int) -> list[tuple[str, float]]:
+    """
+    Modules taking the longest to import, with everything they import themselves
+
+    Args:
+        env (dict[str, str]): Environment of the interpreter
+        top (int): Number of modules to return
+
+    Returns:
+        list[tuple[str, float]]: Module names and cumulative import seconds, slowest first
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import predictor"],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        name = name.strip()
+        # Top level packages only, their submodules are included in the cumulative time
+        if "." not in name:
+            times[name] = int(cumulative) / 1e6
+    return sorted(times.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+@click.command()
+@click.option("--model-uri", type=str, required=True, help="URI to the mlflow model.")
+@click.option(
+    "--inference-mode",
+    type=click.Choice(["pyfunc", "native"]),
+    default="native",
+    help="INFERENCE_MODE of the app.",
+)
+@click.option("--repeats", type=int, default=5, help="Number of cold starts per measurement.")
+@click.option(
+    "--import-profile",
+    "profile_top",
+    type=int,
+    default=0,
+    help="Also print the given number of slowest imports of the app.",
+)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help="File to write the results to as JSON.",
+)
+def benchmark(
+    model_uri: str, inference_mode: str, repeats: int, profile_top: int, output: Path | None
+) -> None:
+    """
+    Measure the cold start of the app and print the medians.
+    """
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [".", os.environ.get("PYTHONPATH")])),
+        "MLFLOW_MODEL_URI": model_uri,
+        "INFERENCE_MODE": inference_mode,
+    }
+    startups = [measure_startup(env) for _ in range(repeats)]
+    first_pings = [measure_first_ping(env) for _ in range(repeats)]
+
+    results = {
+        key: statistics.median(startup[key] for startup in startups)
+        for key in ("import_s", "build_s", "model_load_s")
+    }
+    results["first_ping_s"] = statistics.median(first_pings)
+    results["mlflow_imported"] = startups[0]["mlflow_imported"]
+    results["modules"] = startups[0]["modules"]
+    for key, value in results.items():
+        print(f"{key:>16} {value:.3f}" if isinstance(value, float) else f"{key:>16} {value}")
+
+    if profile_top > 0:
+        results["import_profile"] = import_profile(env, profile_top)
+        for name, seconds in results["import_profile"]:
+            print(f"{name:>32} {seconds:.3f} s")
+
+    if output is not None:
+        output.write_text(
+            json.dumps(
+                {"inference_mode": inference_mode, "repeats": repeats, "results": results},
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,220 @@
+"""
+Capture of the scored requests for monitoring. The handler hands the input rows,
+prediction ids, predictions and model version of each request to a bounded
+in-memory buffer, and a background thread regularly writes the buffer to Parquet
+files partitioned by the hour in which the requests were scored:
+
+    <directory>/capture_date=YYYY-MM-DD/capture_hour=HH/part-<pid>-<time>.parquet
+
+The files can be read with pandas.read_parquet, one file or a whole directory.
+Files are written under a hidden name and renamed when complete, so readers
+never see partial files. When the buffer is full, requests are dropped and counted.
+"""
+
+import os
+import time
+import threading
+from typing import Any
+from logging import Logger
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import metrics
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SECONDS_PER_HOUR = 3600
+
+
+class InferenceCapture:
+    """
+    Buffer of scored requests with a writer thread per process. record only
+    appends a reference to the request's data under a lock, all conversion and
+    disk access happens in the writer thread.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        max_buffered_rows: int,
+        flush_interval_s: float,
+        logger: Logger,
+    ) -> None:
+        """
+        Args:
+            directory (str | Path): Root directory of the Parquet files
+            max_buffered_rows (int): Largest number of rows waiting to be written,
+                further requests are dropped
+            flush_interval_s (float): Seconds between writes of the buffer
+            logger (Logger): logger object
+        """
+        self.directory = Path(directory)
+        self.max_buffered_rows = max_buffered_rows
+        self.flush_interval_s = flush_interval_s
+        self.logger = logger
+        self.written_rows = 0
+        self.written_files = 0
+        self.dropped_rows = 0
+        self.failed_rows = 0
+        self._reset()
+        # Forked workers start with an empty buffer and a writer thread of their own
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        """
+        Start with an empty buffer and no writer thread in the current process
+        """
+        self._lock = threading.Lock()
+        self._wake_up = threading.Event()
+        self._stopped = False
+        self._buffer: list[tuple[float, pd.DataFrame, list[Any], np.ndarray, str, str]] = []
+        self.buffered_rows = 0
+        self._writer: threading.Thread | None = None
+        self._writer_pid: int | None = None
+
+    def record(
+        self,
+        df: pd.DataFrame,
+        pred_ids: list[str | int],
+        preds: np.ndarray,
+        model_version: str,
+        model_uri: str,
+    ) -> bool:
+        """
+        Add a scored request to the buffer. Never blocks on disk.
+
+        Args:
+            df (pd.DataFrame): Input data without prediction ids, not modified afterwards
+            pred_ids (list[str | int]): Prediction ids of the rows
+            preds (np.ndarray): Predictions of the rows
+            model_version (str): Name of the version which made the predictions
+            model_uri (str): uri of that version
+
+        Returns:
+            bool: Whether the request was captured, False if the buffer is full
+        """
+        n_rows = len(pred_ids)
+        with self._lock:
+            if self._writer_pid != os.getpid():
+                self._start_writer()
+            if self.buffered_rows + n_rows > self.max_buffered_rows:
+                self.dropped_rows += n_rows
+                captured = False
+            else:
+                self._buffer.append((time.time(), df, pred_ids, preds, model_version, model_uri))
+                self.buffered_rows += n_rows
+                captured = True
+            if self.buffered_rows * 2 >= self.max_buffered_rows:
+                # Write early rather than drop the next requests
+                self._wake_up.set()
+        metrics.CAPTURED_ROWS.inc("captured" if captured else "dropped", n_rows)
+        return captured
+
+    def _start_writer(self) -> None:
+        """
+        Start the writer thread of the current process, called with the lock held
+        """
+        self._writer_pid = os.getpid()
+        self._writer = threading.Thread(
+            target=self._write_periodically, name="capture", daemon=True
+        )
+        self._writer.start()
+
+    def _write_periodically(self) -> None:
+        """
+        Write the buffer every flush_interval_s seconds or when it fills up, run
+        in the writer thread
+        """
+        while not self._stopped:
+            self._wake_up.wait(self.flush_interval_s)
+            self._wake_up.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the buffered requests, one file per hour in which they were scored
+        """
+        with self._lock:
+            batches, self._buffer = self._buffer, []
+            self.buffered_rows = 0
+        by_hour: dict[int, list] = {}
+        for batch in batches:
+            by_hour.setdefault(int(batch[0] // SECONDS_PER_HOUR), []).append(batch)
+        for hour, hour_batches in by_hour.items():
+            n_rows = sum(len(batch[2]) for batch in hour_batches)
+            try:
+                self.write(hour, hour_batches)
+            except Exception:  # pylint: disable=broad-exception-caught
+                self.logger.error("Failed to write %s captured rows", n_rows, exc_info=True)
+                self.failed_rows += n_rows
+                metrics.CAPTURED_ROWS.inc("failed", n_rows)
+            else:
+                self.written_rows += n_rows
+                self.written_files += 1
+                metrics.CAPTURED_ROWS.inc("written", n_rows)
+
+    def write(self, hour: int, batches: list[tuple]) -> Path:
+        """
+        Write the requests scored in one hour to a new Parquet file
+
+        Args:
+            hour (int): Hours since epoch
+            batches (list[tuple]): Buffered requests of that hour
+
+        Returns:
+            Path: The file
+        """
+        frames = []
+        for captured_at, df, pred_ids, preds, model_version, model_uri in batches:
+            n_rows = len(pred_ids)
+            frames.append(
+                df.assign(
+                    prediction_id=[str(pred_id) for pred_id in pred_ids],
+                    prediction=np.asarray(preds, dtype=np.float64),
+                    model_version=[model_version] * n_rows,
+                    model_uri=[model_uri] * n_rows,
+                    captured_at=pd.Timestamp(captured_at, unit="s", tz="UTC"),
+                )
+            )
+        table = pa.Table.from_pandas(pd.concat(frames, ignore_index=True), preserve_index=False)
+
+        partition = time.strftime(
+            "capture_date=%Y-%m-%d/capture_hour=%H", time.gmtime(hour * SECONDS_PER_HOUR)
+        )
+        directory = self.directory / partition
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"part-{os.getpid()}-{time.time_ns()}.parquet"
+        # Hidden until complete, readers skip names starting with a dot
+        tmp_path = directory / f".{name}"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, directory / name)
+        return directory / name
+
+    def stop(self) -> None:
+        """
+        Stop the writer thread and write what is left in the buffer
+        """
+        self._stopped = True
+        self._wake_up.set()
+        if self._writer is not None and self._writer_pid == os.getpid():
+            self._writer.join()
+        self.flush()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Buffer size and row counters of this worker
+
+        Returns:
+            dict[str, Any]: Capture stats
+        """
+        return {
+            "directory": str(self.directory),
+            "max_buffered_rows": self.max_buffered_rows,
+            "flush_interval_s": self.flush_interval_s,
+            "buffered_rows": self.buffered_rows,
+            "written_rows": self.written_rows,
+            "written_files": self.written_files,
+            "dropped_rows": self.dropped_rows,
+            "failed_rows": self.failed_rows,
+        }
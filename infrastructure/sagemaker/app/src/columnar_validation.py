@@ -0,0 +1,141 @@
+"""
+Single pass validation of JSON and MessagePack prediction requests into typed
+NumPy columns. Accepts the same bodies as PredictionPostAPIModel, but checks the
+field lengths before converting any values, converts each integer field with one
+NumPy call, and hands the columns to the dataframe without model_dump().
+"""
+
+from typing import Any
+
+import numpy as np
+import orjson
+from pydantic import TypeAdapter, ValidationError
+from serialization import STRING_FIELDS, INTEGER_FIELDS
+from routers.api_models import PredictionPostAPIModel
+
+FIELDS = list(PredictionPostAPIModel.model_fields)
+ID_FIELD = "prediction_id"
+# Element-wise validators, used for the fields or values NumPy can not convert by itself
+ID_ADAPTER = TypeAdapter(PredictionPostAPIModel.model_fields[ID_FIELD].annotation)
+INTEGER_ADAPTER = TypeAdapter(list[int])
+STRING_ADAPTER = TypeAdapter(list[str], config={"strict": True})
+
+
+class ColumnValidationError(ValueError):
+    """
+    Raised for a request body which does not match PredictionPostAPIModel,
+    naming the first offending field and value
+    """
+
+
+def _validate_with(adapter: TypeAdapter, field: str, values: list[Any]) -> list[Any]:
+    """
+    Validate the values of a field with pydantic
+
+    Args:
+        adapter (TypeAdapter): Validator of the field's values
+        field (str): Name of the field
+        values (list[Any]): Values of the field
+
+    Raises:
+        ColumnValidationError: At the first invalid value
+
+    Returns:
+        list[Any]: The validated values
+    """
+    try:
+        return adapter.validate_python(values)
+    except ValidationError as e:
+        error = e.errors()[0]
+        index = "".join(f"[{item}]" for item in error["loc"])
+        raise ColumnValidationError(f"{field}{index}: {error['msg']}") from e
+
+
+def _integer_column(field: str, values: list[Any]) -> np.ndarray:
+    """
+    Convert the values of an integer field to int64
+
+    Args:
+        field (str): Name of the field
+        values (list[Any]): Values of the field
+
+    Raises:
+        ColumnValidationError: If a value is not an integer or does not fit in int64
+
+    Returns:
+        np.ndarray: The column
+    """
+    try:
+        column = np.array(values)
+        if column.ndim == 1 and column.dtype.kind == "i":
+            return column.astype(np.int64, copy=False)
+    except (ValueError, TypeError):
+        pass
+    # Values which pydantic coerces, such as 5.0 or "5", or invalid ones
+    values = _validate_with(INTEGER_ADAPTER, field, values)
+    try:
+        return np.array(values, dtype=np.int64)
+    except OverflowError as e:
+        raise ColumnValidationError(f"{field}: values must fit in 64 bit integers") from e
+
+
+def validate_columns(data: Any) -> dict[str, np.ndarray]:
+    """
+    Validate a decoded request body into columns. All lengths are checked
+    before any values are converted, so a malformed body fails fast.
+
+    Args:
+        data (Any): Decoded body, one list per field of PredictionPostAPIModel
+
+    Raises:
+        ColumnValidationError: If a field is missing, is not a list, has another
+            length than prediction_id or has an invalid value
+
+    Returns:
+        dict[str, np.ndarray]: One column per field in the order of PredictionPostAPIModel,
+            int64 for integer fields and object for the others
+    """
+    if not isinstance(data, dict):
+        raise ColumnValidationError("Request body must be an object with one list per field")
+    missing_fields = [field for field in FIELDS if field not in data]
+    if missing_fields:
+        raise ColumnValidationError(f"Missing fields: {missing_fields}")
+    for field in FIELDS:
+        if not isinstance(data[field], list):
+            raise ColumnValidationError(f"{field}: must be a list")
+    n_rows = len(data[ID_FIELD])
+    for field in FIELDS:
+        if len(data[field]) != n_rows:
+            raise ColumnValidationError(
+                f"{field}: has {len(data[field])} values, {ID_FIELD} has {n_rows}. "
+                "All data arrays must be of same length."
+            )
+
+    columns = {
+        ID_FIELD: np.array(_validate_with(ID_ADAPTER, ID_FIELD, data[ID_FIELD]), dtype=object)
+    }
+    for field in FIELDS[1:]:
+        if field in INTEGER_FIELDS:
+            columns[field] = _integer_column(field, data[field])
+        elif field in STRING_FIELDS:
+            columns[field] = np.array(
+                _validate_with(STRING_ADAPTER, field, data[field]), dtype=object
+            )
+    return columns
+
+
+def parse_json_columns(body: bytes) -> dict[str, np.ndarray]:
+    """
+    Parse and validate a JSON request body
+
+    Args:
+        body (bytes): Request body
+
+    Raises:
+        orjson.JSONDecodeError: If the body is not valid UTF-8 encoded JSON
+        ColumnValidationError: If the body does not match PredictionPostAPIModel
+
+    Returns:
+        dict[str, np.ndarray]: One column per field
+    """
+    return validate_columns(orjson.loads(body))
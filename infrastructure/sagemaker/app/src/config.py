@@ -2,7 +2,9 @@
 Settings
 """
 
-from pydantic import Field
+from typing import Literal
+
+from pydantic import Field, PositiveInt
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -21,6 +23,279 @@ class AppSettings(BaseSettings):
     )
     """The URI to the model to use"""
 
+    model_version_name: str = Field(
+        validation_alias="MODEL_VERSION_NAME",
+        default="",
+    )
+    """Name under which requests select the model of MLFLOW_MODEL_URI. Empty to use the uri."""
+
+    model_max_versions: int = Field(
+        validation_alias="MODEL_MAX_VERSIONS",
+        default=2,
+        gt=0,
+    )
+    """Largest number of model versions loaded at once."""
+
+    model_manifest_path: str = Field(
+        validation_alias="MODEL_MANIFEST_PATH",
+        default="",
+    )
+    """JSON file listing the model versions to serve, watched by all workers. Takes
+    precedence over MLFLOW_MODEL_URI when it exists. Empty to disable."""
+
+    model_manifest_poll_s: float = Field(
+        validation_alias="MODEL_MANIFEST_POLL_S",
+        default=5.0,
+        gt=0,
+    )
+    """Seconds between checks of the model manifest for changes."""
+
+    artifact_cache_dir: str = Field(
+        validation_alias="ARTIFACT_CACHE_DIR",
+        default="",
+    )
+    """Directory of the local model artifact cache shared by all workers. Empty to
+    load the model straight from MLFLOW_MODEL_URI."""
+
+    inference_mode: Literal["pyfunc", "native"] = Field(
+        validation_alias="INFERENCE_MODE",
+        default="pyfunc",
+    )
+    """How to run the model. "pyfunc" goes through the mlflow pyfunc wrapper,
+    "native" unpacks the pipeline and calls the XGBoost booster directly."""
+
+    flat_trees_max_rows: int = Field(
+        validation_alias="FLAT_TREES_MAX_ROWS",
+        default=0,
+        ge=0,
+    )
+    """In native mode, largest batch predicted by evaluating the flattened XGBoost
+    trees with NumPy instead of calling XGBoost. 0 to always call XGBoost."""
+
+    model_threads: int = Field(
+        validation_alias="MODEL_THREADS",
+        default=0,
+        ge=0,
+    )
+    """XGBoost threads per model call in native mode. serve sets it, and OMP_NUM_THREADS
+    for pyfunc mode, from the CPUs left by the workers. 0 to keep XGBoost's default."""
+
+    warmup_batch_sizes: list[PositiveInt] = Field(
+        validation_alias="WARMUP_BATCH_SIZES",
+        default=[1, 8, 64, 256],
+        min_length=1,
+    )
+    """Numbers of synthetic rows each model is warmed up with when it is loaded, and
+    each worker before it reports ready, as a JSON list such as [1, 8, 64, 256]."""
+
+    shadow_model_uri: str = Field(
+        validation_alias="SHADOW_MODEL_URI",
+        default="",
+    )
+    """URI of a candidate model scoring a sample of requests in the background, to
+    compare with the default model before promoting it. Empty to disable."""
+
+    shadow_sample_rate: float = Field(
+        validation_alias="SHADOW_SAMPLE_RATE",
+        default=0.1,
+        ge=0,
+        le=1,
+    )
+    """Fraction of requests to the default model which the shadow model scores."""
+
+    shadow_cpu_budget: float = Field(
+        validation_alias="SHADOW_CPU_BUDGET",
+        default=0.1,
+        gt=0,
+    )
+    """Fraction of one CPU per worker the shadow model may use. Sampled requests are
+    skipped while it is spent."""
+
+    batching_enabled: bool = Field(
+        validation_alias="BATCHING_ENABLED",
+        default=False,
+    )
+    """Whether to coalesce concurrent requests into single model calls."""
+
+    batch_max_wait_ms: float = Field(
+        validation_alias="BATCH_MAX_WAIT_MS",
+        default=5.0,
+        gt=0,
+    )
+    """Longest time in milliseconds a request waits for others to join its batch."""
+
+    batch_max_rows: int = Field(
+        validation_alias="BATCH_MAX_ROWS",
+        default=256,
+        gt=0,
+    )
+    """Number of pending rows which triggers a batched model call."""
+
+    prediction_cache_enabled: bool = Field(
+        validation_alias="PREDICTION_CACHE_ENABLED",
+        default=False,
+    )
+    """Whether to cache predictions of repeated input rows."""
+
+    prediction_cache_max_size: int = Field(
+        validation_alias="PREDICTION_CACHE_MAX_SIZE",
+        default=100_000,
+        gt=0,
+    )
+    """Largest number of cached rows before the least recently used are evicted."""
+
+    prediction_cache_ttl_s: float = Field(
+        validation_alias="PREDICTION_CACHE_TTL_S",
+        default=3600.0,
+        gt=0,
+    )
+    """Seconds until a cached prediction expires."""
+
+    stream_chunk_rows: int = Field(
+        validation_alias="STREAM_CHUNK_ROWS",
+        default=1000,
+        gt=0,
+    )
+    """Number of rows per model call on the streaming scoring route."""
+
+    inference_workers: int = Field(
+        validation_alias="INFERENCE_WORKERS",
+        default=1,
+        ge=0,
+    )
+    """Number of threads running model calls off the event loop, 0 to run them on it."""
+
+    inference_max_in_flight: int = Field(
+        validation_alias="INFERENCE_MAX_IN_FLIGHT",
+        default=64,
+        gt=0,
+    )
+    """Largest number of prediction requests in progress at once. Further requests
+    are rejected with 503 until one finishes."""
+
+    admission_max_body_bytes: int = Field(
+        validation_alias="ADMISSION_MAX_BODY_BYTES",
+        default=5 * 1024 * 1024,
+        ge=0,
+    )
+    """Largest prediction request body, larger ones are rejected with 413. 0 for no limit."""
+
+    admission_max_rows: int = Field(
+        validation_alias="ADMISSION_MAX_ROWS",
+        default=0,
+        ge=0,
+    )
+    """Largest number of rows per prediction request, larger ones are rejected with 413.
+    0 for no limit."""
+
+    admission_max_in_flight_rows: int = Field(
+        validation_alias="ADMISSION_MAX_IN_FLIGHT_ROWS",
+        default=0,
+        ge=0,
+    )
+    """Largest number of rows in progress at once per worker. Further requests are
+    shed with 503 until rows are done. 0 for no limit."""
+
+    admission_max_queue_ms: float = Field(
+        validation_alias="ADMISSION_MAX_QUEUE_MS",
+        default=0.0,
+        ge=0,
+    )
+    """Longest time in milliseconds a request may wait in nginx and gunicorn before
+    the app gets it, longer waiting ones are shed with 503. 0 for no limit."""
+
+    request_deadline_ms: float = Field(
+        validation_alias="REQUEST_DEADLINE_MS",
+        default=0.0,
+        ge=0,
+    )
+    """Time in milliseconds after nginx passed a request on by which it must be
+    answered. Requests expected to finish later are shed with 503. 0 for no deadline."""
+
+    capture_dir: str = Field(
+        validation_alias="CAPTURE_DIR",
+        default="",
+    )
+    """Directory where the inputs, predictions and model version of scored requests
+    are written as Parquet files partitioned by hour, for monitoring. Empty to disable."""
+
+    capture_buffer_rows: int = Field(
+        validation_alias="CAPTURE_BUFFER_ROWS",
+        default=100_000,
+        gt=0,
+    )
+    """Largest number of captured rows per worker waiting to be written. Requests
+    arriving while the buffer is full are not captured."""
+
+    capture_flush_interval_s: float = Field(
+        validation_alias="CAPTURE_FLUSH_INTERVAL_S",
+        default=60.0,
+        gt=0,
+    )
+    """Seconds between writes of the captured rows, each write adding a new file."""
+
+    profile_dir: str = Field(
+        validation_alias="PROFILE_DIR",
+        default="/tmp/prediction-profiles",
+    )
+    """Directory where profiles of prediction requests are written, as collapsed stacks."""
+
+    profile_sample_every: int = Field(
+        validation_alias="PROFILE_SAMPLE_EVERY",
+        default=0,
+        ge=0,
+    )
+    """Profile one in this many prediction requests per worker. 0 for none."""
+
+    profile_slow_ms: float = Field(
+        validation_alias="PROFILE_SLOW_MS",
+        default=0.0,
+        ge=0,
+    )
+    """Write the profiles of prediction requests taking at least this many milliseconds.
+    Every request is then sampled while in progress. 0 for none."""
+
+    profile_interval_ms: float = Field(
+        validation_alias="PROFILE_INTERVAL_MS",
+        default=5.0,
+        gt=0,
+    )
+    """Milliseconds between stack samples of profiled requests."""
+
+    profile_max_files: int = Field(
+        validation_alias="PROFILE_MAX_FILES",
+        default=100,
+        ge=0,
+    )
+    """Largest number of profile files each worker writes."""
+
+    trace_exporter: Literal["none", "stdout", "file"] = Field(
+        validation_alias="TRACE_EXPORTER",
+        default="none",
+    )
+    """Where the spans of traced prediction requests go, as JSON lines. "none" to
+    turn tracing off."""
+
+    trace_file: str = Field(
+        validation_alias="TRACE_FILE",
+        default="/tmp/prediction-traces.jsonl",
+    )
+    """File the "file" trace exporter appends to, shared by all workers."""
+
+    trace_header: str = Field(
+        validation_alias="TRACE_HEADER",
+        default="traceparent",
+    )
+    """Request header with the trace id to continue, a W3C traceparent or a plain id.
+    Requests without it get a new trace id."""
+
+    metrics_dir: str = Field(
+        validation_alias="METRICS_DIR",
+        default="",
+    )
+    """Directory where each worker keeps its metrics, so that /metrics reports the
+    totals of all workers. Empty to report the metrics of the serving worker only."""
+
     model_config = SettingsConfigDict(
         case_sensitive=True, env_file=".env", env_file_encoding="utf-8"
     )
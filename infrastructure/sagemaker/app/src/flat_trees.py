@@ -0,0 +1,267 @@
+"""
+XGBoost tree ensembles flattened into contiguous node arrays, evaluated with
+NumPy for a whole batch and all trees at once. For the small batches of the
+prediction service this avoids the per-call overhead of the XGBoost predictor.
+
+Usage (from this directory), to export the trees of a logged model:
+    python flat_trees.py --model-uri <MLFLOW_MODEL_URI> --output trees.npz
+"""
+
+import json
+from typing import Any
+from pathlib import Path
+
+import click
+import numpy as np
+from scipy import sparse
+from xgboost import Booster
+
+# Objectives whose prediction is the sum of the leaf values plus base_score
+IDENTITY_OBJECTIVES = ("reg:squarederror", "reg:absoluteerror", "reg:pseudohubererror")
+
+
+class FlatTreeEnsemble:
+    """
+    The trees of a regression booster as arrays over all nodes of all trees.
+
+    Leaves point to themselves as both children, so that every row can take the
+    same number of steps, the depth of the deepest tree, and ends on its leaf.
+    A row goes to the left child if its feature value is below the threshold, or
+    if it is missing and the node's default direction is left.
+    """
+
+    def __init__(
+        self,
+        roots: np.ndarray,
+        features: np.ndarray,
+        thresholds: np.ndarray,
+        left: np.ndarray,
+        right: np.ndarray,
+        default_left: np.ndarray,
+        values: np.ndarray,
+        depth: int,
+        base_score: float,
+        n_features: int,
+    ) -> None:
+        """
+        Args:
+            roots (np.ndarray): Index of the root node of each tree
+            features (np.ndarray): Feature index of each node, 0 for leaves
+            thresholds (np.ndarray): Split threshold of each node, float32
+            left (np.ndarray): Index of the left child of each node
+            right (np.ndarray): Index of the right child of each node
+            default_left (np.ndarray): Whether missing values go left at each node
+            values (np.ndarray): Leaf value of each node, 0 for inner nodes
+            depth (int): Largest number of splits from a root to a leaf
+            base_score (float): Value added to the sum of the leaves
+            n_features (int): Number of input features
+        """
+        self.roots = roots
+        self.features = features
+        self.thresholds = thresholds
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.values = values
+        self.depth = depth
+        self.base_score = base_score
+        self.n_features = n_features
+
+    @classmethod
+    def from_booster(
+        cls, booster: Booster, iteration_range: tuple[int, int] = (0, 0)
+    ) -> "FlatTreeEnsemble":
+        """
+        Flatten the trees of a booster
+
+        Args:
+            booster (Booster): Trained gbtree booster with one output
+            iteration_range (tuple[int, int], optional): Trees to use, as in
+                Booster.inplace_predict. Defaults to all trees.
+
+        Raises:
+            ValueError: If the booster is not a single output gbtree regression model,
+                or has categorical splits
+
+        Returns:
+            FlatTreeEnsemble: The flattened trees
+        """
+        model = json.loads(booster.save_raw("json"))["learner"]
+        objective = model["objective"]["name"]
+        gradient_booster = model["gradient_booster"]
+        if objective not in IDENTITY_OBJECTIVES:
+            raise ValueError(f"Objective {objective} is not supported")
+        if gradient_booster["name"] != "gbtree":
+            raise ValueError(f"Booster {gradient_booster['name']} is not supported")
+        model_param = model["learner_model_param"]
+        tree_param = gradient_booster["model"]["gbtree_model_param"]
+        if int(model_param["num_target"]) > 1 or int(tree_param["num_parallel_tree"]) > 1:
+            raise ValueError("Only boosters with one tree per iteration and output are supported")
+
+        trees = gradient_booster["model"]["trees"]
+        start, end = iteration_range
+        trees = trees[start : end if end > 0 else len(trees)]
+
+        roots, features, thresholds, left, right, default_left, values = ([] for _ in range(7))
+        offset = 0
+        depth = 0
+        for tree in trees:
+            if any(tree["split_type"]):
+                raise ValueError("Categorical splits are not supported")
+            n_nodes = len(tree["left_children"])
+            node_ids = np.arange(n_nodes)
+            tree_left = np.asarray(tree["left_children"])
+            is_leaf = tree_left == -1
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, tree["split_indices"]))
+            thresholds.append(np.where(is_leaf, 0, tree["split_conditions"]))
+            left.append(np.where(is_leaf, node_ids, tree_left) + offset)
+            right.append(np.where(is_leaf, node_ids, tree["right_children"]) + offset)
+            default_left.append(np.asarray(tree["default_left"], dtype=bool))
+            # Leaves hold their value in split_conditions
+            values.append(np.where(is_leaf, tree["split_conditions"], 0))
+            depth = max(depth, _tree_depth(tree_left, np.asarray(tree["right_children"])))
+            offset += n_nodes
+
+        return cls(
+            roots=np.asarray(roots, dtype=np.int64),
+            features=np.concatenate(features).astype(np.int64),
+            thresholds=np.concatenate(thresholds).astype(np.float32),
+            left=np.concatenate(left).astype(np.int64),
+            right=np.concatenate(right).astype(np.int64),
+            default_left=np.concatenate(default_left),
+            values=np.concatenate(values).astype(np.float32),
+            depth=depth,
+            base_score=float(model_param["base_score"]),
+            n_features=int(model_param["num_feature"]),
+        )
+
+    def to_dense(self, features: Any) -> np.ndarray:
+        """
+        Dense float32 matrix with NaN for missing values. Entries which are not
+        stored in a sparse matrix are missing, as in XGBoost.
+
+        Args:
+            features (Any): Sparse or dense feature matrix
+
+        Returns:
+            np.ndarray: The dense matrix
+        """
+        if not sparse.issparse(features):
+            return np.asarray(features, dtype=np.float32)
+        features = features.tocsr()
+        dense = np.full((features.shape[0], self.n_features), np.nan, dtype=np.float32)
+        rows = np.repeat(np.arange(features.shape[0]), np.diff(features.indptr))
+        dense[rows, features.indices] = features.data
+        return dense
+
+    def predict(self, features: Any) -> np.ndarray:
+        """
+        Predict a batch with all trees at once
+
+        Args:
+            features (Any): Sparse or dense feature matrix, one row per prediction
+
+        Returns:
+            np.ndarray: One float32 prediction per row
+        """
+        dense = self.to_dense(features)
+        flat = dense.ravel()
+        # Position of each row's first value in flat, one row per prediction and tree
+        row_starts = (np.arange(dense.shape[0]) * dense.shape[1])[:, None]
+        nodes = np.broadcast_to(self.roots, (dense.shape[0], len(self.roots)))
+        for _ in range(self.depth):
+            values = flat[row_starts + self.features[nodes]]
+            go_left = np.where(
+                np.isnan(values), self.default_left[nodes], values < self.thresholds[nodes]
+            )
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.values[nodes].sum(axis=1, dtype=np.float32) + np.float32(self.base_score)
+
+    def save(self, path: str | Path) -> None:
+        """
+        Write the arrays to an .npz file
+
+        Args:
+            path (str | Path): Path of the file
+        """
+        np.savez(
+            path,
+            roots=self.roots,
+            features=self.features,
+            thresholds=self.thresholds,
+            left=self.left,
+            right=self.right,
+            default_left=self.default_left,
+            values=self.values,
+            depth=self.depth,
+            base_score=self.base_score,
+            n_features=self.n_features,
+        )
+
+    @classmethod
+    def load(cls, path: str | Path) -> "FlatTreeEnsemble":
+        """
+        Read the arrays written by save
+
+        Args:
+            path (str | Path): Path of the file
+
+        Returns:
+            FlatTreeEnsemble: The flattened trees
+        """
+        with np.load(path) as arrays:
+            return cls(
+                roots=arrays["roots"],
+                features=arrays["features"],
+                thresholds=arrays["thresholds"],
+                left=arrays["left"],
+                right=arrays["right"],
+                default_left=arrays["default_left"],
+                values=arrays["values"],
+                depth=int(arrays["depth"]),
+                base_score=float(arrays["base_score"]),
+                n_features=int(arrays["n_features"]),
+            )
+
+
+def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+    """
+    Largest number of splits from the root to a leaf
+
+    Args:
+        left (np.ndarray): Left child of each node, -1 for leaves
+        right (np.ndarray): Right child of each node, -1 for leaves
+
+    Returns:
+        int: The depth
+    """
+    depth = 0
+    level = [0]
+    while True:
+        level = [child for node in level if left[node] != -1 for child in (left[node], right[node])]
+        if not level:
+            return depth
+        depth += 1
+
+
+@click.command()
+@click.option("--model-uri", type=str, required=True, help="URI to the mlflow model.")
+@click.option(
+    "--output", type=click.Path(dir_okay=False, path_type=Path), required=True, help=".npz file."
+)
+def export(model_uri: str, output: Path) -> None:
+    """
+    Flatten the booster of a logged model and write it to a file.
+    """
+    # pylint: disable-next=import-outside-toplevel
+    from native_model import NativeModel
+
+    model = NativeModel.load(model_uri)
+    ensemble = FlatTreeEnsemble.from_booster(model.booster, model.iteration_range)
+    ensemble.save(output)
+    print(f"Wrote {len(ensemble.roots)} trees with {len(ensemble.values)} nodes to {output}")
+
+
+if __name__ == "__main__":
+    export()
@@ -0,0 +1,72 @@
+"""
+Gunicorn server hooks, reporting startup time and memory use of the master and
+the workers. Loaded by serve with gunicorn's -c python:gunicorn_conf.
+"""
+
+import gc
+import os
+import time
+from typing import Any
+
+from process_stats import memory_usage
+
+
+def seconds_since_start() -> float:
+    """
+    Seconds since serve started the server
+
+    Returns:
+        float: Elapsed time, 0 if the start time is unknown
+    """
+    start_time = os.environ.get("MODEL_SERVER_START_TIME")
+    if start_time is None:
+        return 0.0
+    return time.time() - float(start_time)
+
+
+def describe_memory() -> str:
+    """
+    Memory use of the current process for the logs
+
+    Returns:
+        str: RSS, PSS and shared memory
+    """
+    usage = memory_usage()
+    if not usage:
+        return "memory use unknown"
+    return "RSS {rss_mb:.0f} MB, PSS {pss_mb:.0f} MB, shared {shared_mb:.0f} MB".format(**usage)
+
+
+def when_ready(server: Any) -> None:
+    """
+    Called in the master before the workers are forked. With preload_app the app
+    and model are loaded at this point.
+
+    Args:
+        server (Any): The gunicorn arbiter
+    """
+    if server.cfg.preload_app:
+        # Move the objects loaded in the master out of reach of the garbage collector,
+        # so that collections in the workers do not write to their pages and copy them
+        gc.freeze()
+    server.log.info(
+        "Master ready %.2f s after start (preload_app=%s), %s",
+        seconds_since_start(),
+        server.cfg.preload_app,
+        describe_memory(),
+    )
+
+
+def post_worker_init(worker: Any) -> None:
+    """
+    Called in a worker once it has loaded the app
+
+    Args:
+        worker (Any): The gunicorn worker
+    """
+    worker.log.info(
+        "Worker %s ready %.2f s after start, %s",
+        worker.pid,
+        seconds_since_start(),
+        describe_memory(),
+    )
@@ -0,0 +1,162 @@
+"""
+Runs CPU-bound model calls off the event loop, with a bound on in-flight requests.
+The in-flight requests and the queue depth are exported as gauges.
+"""
+
+import time
+import asyncio
+import threading
+import contextvars
+from typing import Any, TypeVar, Callable
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+T = TypeVar("T")
+# Name prefix of the worker threads, by which the request profiler finds them
+THREAD_NAME_PREFIX = "inference"
+
+
+class InferenceQueueFull(Exception):
+    """
+    Raised when a request arrives while max_in_flight requests are already in progress
+    """
+
+
+class InferenceExecutor:
+    """
+    Thread pool for model calls, so that the event loop keeps accepting and parsing
+    requests while a model call runs. XGBoost releases the GIL while predicting.
+
+    Requests reserve a slot before they are parsed and release it when they are done.
+    When all max_in_flight slots are taken new requests are rejected right away
+    instead of queueing up. With max_workers 0 model calls run on the event loop.
+    """
+
+    def __init__(self, max_workers: int, max_in_flight: int) -> None:
+        """
+        Args:
+            max_workers (int): Number of threads running model calls, 0 to run them inline
+            max_in_flight (int): Largest number of requests in progress at once
+        """
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight
+        self._executor = (
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=THREAD_NAME_PREFIX)
+            if max_workers > 0
+            else None
+        )
+        self._lock = threading.Lock()
+
+        self.in_flight = 0
+        self.submitted = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def reserve_slot(self) -> None:
+        """
+        Reserve a slot for a request, to be released with release_slot
+
+        Raises:
+            InferenceQueueFull: If all slots are taken
+        """
+        if self.in_flight >= self.max_in_flight:
+            self.rejected += 1
+            raise InferenceQueueFull(
+                f"{self.in_flight} requests in progress, the limit is {self.max_in_flight}"
+            )
+        self.in_flight += 1
+        metrics.INFERENCE_IN_FLIGHT.set(self.in_flight)
+
+    def release_slot(self) -> None:
+        """
+        Release a slot reserved with reserve_slot
+        """
+        self.in_flight -= 1
+        metrics.INFERENCE_IN_FLIGHT.set(self.in_flight)
+
+    def _call(self, submitted_at: float, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Run fn in a worker thread, keeping track of running calls and of how
+        long calls waited for a free thread
+
+        Args:
+            submitted_at (float): time.perf_counter() when the call was submitted
+            fn (Callable[..., T]): Function to call
+
+        Returns:
+            T: Result of fn
+        """
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - submitted_at, "queue_wait")
+        with self._lock:
+            self.running += 1
+            metrics.INFERENCE_QUEUE_DEPTH.set(self.queue_depth)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Call fn with args in the thread pool, or inline if there are no workers
+
+        Args:
+            fn (Callable[..., T]): Function to call
+
+        Returns:
+            T: Result of fn
+        """
+        if self._executor is None:
+            self.completed += 1
+            return fn(*args)
+        with self._lock:
+            self.submitted += 1
+            metrics.INFERENCE_QUEUE_DEPTH.set(self.queue_depth)
+        try:
+            # In the caller's context, so that spans of the call join the request's trace
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                contextvars.copy_context().run,
+                self._call,
+                time.perf_counter(),
+                fn,
+                *args,
+            )
+        finally:
+            with self._lock:
+                self.submitted -= 1
+                metrics.INFERENCE_QUEUE_DEPTH.set(self.queue_depth)
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Number of model calls waiting for a free worker thread
+        """
+        return max(self.submitted - self.running, 0)
+
+    def shutdown(self) -> None:
+        """
+        Stop the worker threads after the running calls are done
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Executor counters and gauges
+
+        Returns:
+            dict[str, Any]: Limits, in-flight requests, queue depth and call counters
+        """
+        return {
+            "max_workers": self.max_workers,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
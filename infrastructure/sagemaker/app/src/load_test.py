@@ -0,0 +1,702 @@
+"""
+Load test of the prediction service. Replays request bodies against the app,
+either at a fixed rate or with a fixed number of concurrent clients, and reports
+throughput, latency percentiles and CPU time per request for each batch size.
+
+The app runs in this process (--target inprocess), in gunicorn workers started
+like serve does but without nginx (--target gunicorn), or is an already running
+server (--target <url>). The results are written as JSON, which the compare
+command turns into a table of two runs side by side. The sweep command runs the
+same load against gunicorn with each split of the CPUs between workers, inference
+threads and XGBoost threads, and reports the best one for each batch size.
+
+Usage (from this directory):
+    python load_test.py run --batch-size 1 --batch-size 100 --concurrency 8 --output run.json
+    python load_test.py run --target gunicorn --workers 4 --qps 200 --payloads bodies.jsonl
+    python load_test.py compare before.json after.json
+    python load_test.py sweep --batch-size 1 --batch-size 100 --max-p99-ms 50 --output sweep.json
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import platform
+import resource
+import subprocess
+from typing import Any, Callable, Awaitable
+from pathlib import Path
+from functools import partial
+from collections import defaultdict
+
+import click
+import httpx
+import numpy as np
+import orjson
+from topology import Topology, plan_topology, available_cpus
+from process_stats import cpu_seconds
+from synthetic_data import create_random_request
+
+# Settings of the app which change its performance, recorded with each run
+APP_SETTINGS = (
+    "INFERENCE_MODE",
+    "INFERENCE_WORKERS",
+    "INFERENCE_MAX_IN_FLIGHT",
+    "BATCHING_ENABLED",
+    "BATCH_MAX_WAIT_MS",
+    "BATCH_MAX_ROWS",
+    "PREDICTION_CACHE_ENABLED",
+    "MODEL_SERVER_WORKERS",
+    "MODEL_THREADS",
+    "OMP_NUM_THREADS",
+)
+SERVER_START_TIMEOUT_S = 300
+
+
+def read_payloads(path: Path) -> list[dict[str, list[Any]]]:
+    """
+    Read request bodies from a .jsonl file with one body per line, or a .json
+    file with one body such as integration-tests/data.json
+
+    Args:
+        path (Path): Path of the file
+
+    Returns:
+        list[dict[str, list[Any]]]: The request bodies
+    """
+    if path.suffix == ".json":
+        return [json.loads(path.read_text(encoding="utf-8"))]
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def generate_payloads(batch_size: int, n_payloads: int, seed: int) -> list[dict[str, list[Any]]]:
+    """
+    Random request bodies following the value ranges of create_new_data.py
+
+    Args:
+        batch_size (int): Number of rows per body
+        n_payloads (int): Number of different bodies
+        seed (int): Random seed
+
+    Returns:
+        list[dict[str, list[Any]]]: The request bodies
+    """
+    return [create_random_request(batch_size, seed + i) for i in range(n_payloads)]
+
+
+class RequestLog:
+    """
+    Rows, latency and status code of each request sent
+    """
+
+    def __init__(self) -> None:
+        self.rows: list[int] = []
+        self.latencies: list[float] = []
+        self.status_codes: list[int] = []
+
+    def add(self, rows: int, latency: float, status_code: int) -> None:
+        """
+        Record a request
+
+        Args:
+            rows (int): Number of rows of the request
+            latency (float): Seconds until the response was read
+            status_code (int): HTTP status, 0 if no response was received
+        """
+        self.rows.append(rows)
+        self.latencies.append(latency)
+        self.status_codes.append(status_code)
+
+
+def summarize(latencies: list[float], status_codes: list[int]) -> dict[str, Any]:
+    """
+    Request count, errors and latency percentiles of a set of requests
+
+    Args:
+        latencies (list[float]): Seconds per request
+        status_codes (list[int]): HTTP status per request
+
+    Returns:
+        dict[str, Any]: Summary, latencies in milliseconds
+    """
+    latencies_ms = np.asarray(latencies) * 1e3
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "requests": len(latencies),
+        "errors": sum(status != 200 for status in status_codes),
+        "latency_ms": {
+            "mean": float(latencies_ms.mean()),
+            "p50": float(p50),
+            "p95": float(p95),
+            "p99": float(p99),
+            "max": float(latencies_ms.max()),
+        },
+    }
+
+
+async def run_fixed_rate(
+    send: Callable[[int, float], Awaitable[None]], qps: float, duration_s: float
+) -> None:
+    """
+    Send requests at a fixed rate, whether or not earlier ones have finished.
+    Latencies count from the time a request was due, so that a server which falls
+    behind is not hidden by a client which waits for it.
+
+    Args:
+        send (Callable[[int, float], Awaitable[None]]): Sends request i, due at the given time
+        qps (float): Requests per second
+        duration_s (float): Seconds to send requests for
+    """
+    start = time.perf_counter()
+    tasks = []
+    for i in range(int(qps * duration_s)):
+        due = start + i / qps
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(i, due)))
+    await asyncio.gather(*tasks)
+
+
+async def run_closed_loop(
+    send: Callable[[int, float], Awaitable[None]], concurrency: int, duration_s: float
+) -> None:
+    """
+    Keep a fixed number of requests in flight, each client sending its next
+    request as soon as the previous one has finished
+
+    Args:
+        send (Callable[[int, float], Awaitable[None]]): Sends request i, due at the given time
+        concurrency (int): Number of concurrent clients
+        duration_s (float): Seconds to send requests for
+    """
+    deadline = time.perf_counter() + duration_s
+
+    async def client(client_id: int) -> None:
+        i = client_id
+        while time.perf_counter() < deadline:
+            await send(i, time.perf_counter())
+            i += concurrency
+
+    await asyncio.gather(*[client(client_id) for client_id in range(concurrency)])
+
+
+async def run_phase(
+    client: httpx.AsyncClient,
+    payloads: list[dict[str, list[Any]]],
+    qps: float | None,
+    concurrency: int,
+    duration_s: float,
+) -> RequestLog:
+    """
+    Send the payloads round robin for duration_s seconds
+
+    Args:
+        client (httpx.AsyncClient): Client connected to the app
+        payloads (list[dict[str, list[Any]]]): Request bodies
+        qps (float | None): Requests per second, None for a closed loop
+        concurrency (int): Number of concurrent clients of the closed loop
+        duration_s (float): Seconds to send requests for
+
+    Returns:
+        RequestLog: The requests sent
+    """
+    bodies = [(orjson.dumps(payload), len(payload["airline"])) for payload in payloads]
+    log = RequestLog()
+
+    async def send(i: int, due: float) -> None:
+        content, rows = bodies[i % len(bodies)]
+        try:
+            response = await client.post(
+                "/invocations", content=content, headers={"Content-Type": "application/json"}
+            )
+            status_code = response.status_code
+        except httpx.HTTPError:
+            status_code = 0
+        log.add(rows, time.perf_counter() - due, status_code)
+
+    if qps is None:
+        await run_closed_loop(send, concurrency, duration_s)
+    else:
+        await run_fixed_rate(send, qps, duration_s)
+    return log
+
+
+async def run_phases(
+    client_args: dict[str, Any],
+    measure_cpu: Callable[[], float] | None,
+    phases: dict[str, list[dict[str, list[Any]]]],
+    qps: float | None,
+    concurrency: int,
+    duration_s: float,
+    warmup_s: float,
+) -> list[dict[str, Any]]:
+    """
+    Run each phase after an untimed warm-up and summarize it
+
+    Args:
+        client_args (dict[str, Any]): Arguments of the httpx client reaching the app
+        measure_cpu (Callable[[], float] | None): CPU seconds used by the app so far,
+            None if unknown
+        phases (dict[str, list[dict[str, list[Any]]]]): Request bodies of each phase by name
+        qps (float | None): Requests per second, None for a closed loop
+        concurrency (int): Number of concurrent clients of the closed loop
+        duration_s (float): Seconds per phase
+        warmup_s (float): Untimed seconds before each phase
+
+    Returns:
+        list[dict[str, Any]]: Results of each phase
+    """
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(limits=limits, timeout=60, **client_args) as client:
+        results = []
+        for name, phase_payloads in phases.items():
+            if warmup_s > 0:
+                await run_phase(client, phase_payloads, qps, concurrency, warmup_s)
+            cpu_start = measure_cpu() if measure_cpu else None
+            start = time.perf_counter()
+            log = await run_phase(client, phase_payloads, qps, concurrency, duration_s)
+            elapsed = time.perf_counter() - start
+            cpu = measure_cpu() - cpu_start if measure_cpu else None
+
+            by_rows = defaultdict(lambda: ([], []))
+            for rows, latency, status_code in zip(log.rows, log.latencies, log.status_codes):
+                by_rows[rows][0].append(latency)
+                by_rows[rows][1].append(status_code)
+            results.append(
+                {
+                    "name": name,
+                    **summarize(log.latencies, log.status_codes),
+                    "seconds": elapsed,
+                    "throughput_rps": len(log.latencies) / elapsed,
+                    "rows_per_s": sum(log.rows) / elapsed,
+                    "cpu_ms_per_request": (
+                        cpu / len(log.latencies) * 1e3 if cpu is not None else None
+                    ),
+                    "by_rows": {str(rows): summarize(*by_rows[rows]) for rows in sorted(by_rows)},
+                }
+            )
+            print_phase(results[-1])
+        return results
+
+
+def free_port() -> int:
+    """
+    A free TCP port on localhost
+
+    Returns:
+        int: The port
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(
+    workers: int, port: int, environment: dict[str, str] | None = None
+) -> subprocess.Popen:
+    """
+    Start the app in gunicorn workers as serve does, listening on a TCP port
+
+    Args:
+        workers (int): Number of workers
+        port (int): Port to listen on
+        environment (dict[str, str] | None, optional): Variables to set for the
+            server on top of the current environment. Defaults to none.
+
+    Raises:
+        RuntimeError: If the server does not answer /ping in time
+
+    Returns:
+        subprocess.Popen: The gunicorn master
+    """
+    env = {**os.environ, **(environment or {}), "MODEL_SERVER_START_TIME": str(time.time())}
+    args = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "-k",
+        "uvicorn.workers.UvicornWorker",
+        "-b",
+        f"127.0.0.1:{port}",
+        "-w",
+        str(workers),
+        "-c",
+        "python:gunicorn_conf",
+    ]
+    if env.get("MODEL_SERVER_PRELOAD", "false").lower() == "true":
+        args.append("--preload")
+    server = subprocess.Popen([*args, "wsgi:app"], env=env)
+
+    deadline = time.monotonic() + SERVER_START_TIMEOUT_S
+    while time.monotonic() < deadline and server.poll() is None:
+        try:
+            # Every worker has to be up, not only the first one to answer
+            children = Path(f"/proc/{server.pid}/task/{server.pid}/children").read_text()
+            response = httpx.get(f"http://127.0.0.1:{port}/ping")
+            if response.status_code == 204 and len(children.split()) >= workers:
+                return server
+        except (httpx.HTTPError, OSError):
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("gunicorn did not start in time")
+
+
+def own_cpu_seconds() -> float:
+    """
+    CPU time used by this process
+
+    Returns:
+        float: User plus system time in seconds
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+@click.group()
+def cli() -> None:
+    """
+    Load test of the prediction service
+    """
+
+
+@cli.command()
+@click.option(
+    "--target",
+    type=str,
+    default="inprocess",
+    help="inprocess, gunicorn or the url of a running server.",
+)
+@click.option("--workers", type=int, default=2, help="Number of gunicorn workers.")
+@click.option(
+    "--payloads",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    default=None,
+    help="File of request bodies, .jsonl or .json. Defaults to generated bodies.",
+)
+@click.option(
+    "--batch-size",
+    type=int,
+    multiple=True,
+    default=[1, 10, 100],
+    help="Rows per generated request, one phase each. Can be given multiple times.",
+)
+@click.option(
+    "--qps", type=float, default=None, help="Fixed request rate. Defaults to a closed loop."
+)
+@click.option("--concurrency", type=int, default=8, help="Concurrent clients of the closed loop.")
+@click.option("--duration", type=float, default=10.0, help="Seconds per phase.")
+@click.option("--warmup", type=float, default=2.0, help="Untimed seconds before each phase.")
+@click.option("--seed", type=int, default=13371337, help="Random seed for the generated data.")
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help="File to write the results to as JSON.",
+)
+def run(
+    target: str,
+    workers: int,
+    payloads: Path | None,
+    batch_size: tuple[int, ...],
+    qps: float | None,
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    seed: int,
+    output: Path | None,
+) -> None:
+    """
+    Send requests, one phase per batch size or one phase for a payload file.
+    """
+    # Keep the request log of httpx out of the output
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if payloads is not None:
+        phases = {payloads.name: read_payloads(payloads)}
+    else:
+        phases = {f"rows_{n}": generate_payloads(n, 20, seed) for n in batch_size}
+
+    server = None
+    if target == "inprocess":
+        import wsgi  # pylint: disable=import-outside-toplevel
+
+        client_args = {"transport": httpx.ASGITransport(app=wsgi.app), "base_url": "http://app"}
+        measure_cpu = own_cpu_seconds
+    elif target == "gunicorn":
+        port = free_port()
+        server = start_gunicorn(workers, port)
+        client_args = {"base_url": f"http://127.0.0.1:{port}"}
+        measure_cpu = partial(cpu_seconds, server.pid)
+    else:
+        client_args = {"base_url": target}
+        measure_cpu = None
+
+    try:
+        results = asyncio.run(
+            run_phases(client_args, measure_cpu, phases, qps, concurrency, duration, warmup)
+        )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "target": target,
+        "workers": workers if target == "gunicorn" else None,
+        "load": {"qps": qps} if qps is not None else {"concurrency": concurrency},
+        "duration_s": duration,
+        "host": {"machine": platform.machine(), "cpus": os.cpu_count()},
+        "settings": {name: os.environ[name] for name in APP_SETTINGS if name in os.environ},
+        "phases": results,
+    }
+    if output is not None:
+        output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+def print_phase(phase: dict[str, Any]) -> None:
+    """
+    Print the summary of a phase
+
+    Args:
+        phase (dict[str, Any]): Results of the phase
+    """
+    latency = phase["latency_ms"]
+    cpu = phase["cpu_ms_per_request"]
+    print(
+        f"{phase['name']:>16} {phase['requests']:>7} req {phase['errors']:>5} err "
+        f"{phase['throughput_rps']:>9.1f} req/s  p50 {latency['p50']:>8.2f}  "
+        f"p95 {latency['p95']:>8.2f}  p99 {latency['p99']:>8.2f} ms  "
+        f"cpu {'-' if cpu is None else f'{cpu:.2f}'} ms/req"
+    )
+
+
+@cli.command()
+@click.argument("baseline", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.argument("candidate", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+def compare(baseline: Path, candidate: Path) -> None:
+    """
+    Print throughput, p99 latency and CPU per request of two runs side by side.
+    """
+    runs = [json.loads(path.read_text(encoding="utf-8")) for path in (baseline, candidate)]
+    phases = [{phase["name"]: phase for phase in report["phases"]} for report in runs]
+    print(f"{'phase':>16} {'req/s':>17} {'p99 [ms]':>17} {'cpu [ms/req]':>17}")
+    for name in phases[0]:
+        if name not in phases[1]:
+            continue
+        before, after = phases[0][name], phases[1][name]
+        cells = []
+        for key in ("throughput_rps", "p99", "cpu_ms_per_request"):
+            values = [
+                phase["latency_ms"][key] if key == "p99" else phase[key]
+                for phase in (before, after)
+            ]
+            if None in values:
+                cells.append(f"{'-':>17}")
+            else:
+                cells.append(f"{values[0]:>8.2f}{values[1]:>9.2f}")
+        print(f"{name:>16} {' '.join(cells)}")
+
+
+def candidate_topologies(cpus: int) -> list[Topology]:
+    """
+    Splits of the CPUs to compare: each power of two of XGBoost threads with one
+    or two inference threads per worker, the workers taking the remaining CPUs,
+    and the previous default of serve, one worker per CPU with XGBoost using all CPUs
+
+    Args:
+        cpus (int): Number of available CPUs
+
+    Returns:
+        list[Topology]: The topologies, without duplicates
+    """
+    candidates = {}
+    model_threads = 1
+    while model_threads <= cpus:
+        for inference_threads in (1, 2):
+            if inference_threads * model_threads <= cpus or model_threads == 1:
+                topology = plan_topology(
+                    cpus, inference_threads=inference_threads, model_threads=model_threads
+                )
+                candidates[str(topology)] = topology
+        model_threads *= 2
+    oversubscribed = Topology(workers=cpus, inference_threads=1, model_threads=cpus)
+    candidates.setdefault(str(oversubscribed), oversubscribed)
+    return list(candidates.values())
+
+
+def parse_topology(value: str) -> Topology:
+    """
+    Parse a topology given as workers,inference_threads,model_threads
+
+    Args:
+        value (str): The option value
+
+    Raises:
+        click.BadParameter: If the value is not three integers
+
+    Returns:
+        Topology: The topology
+    """
+    try:
+        workers, inference_threads, model_threads = (int(part) for part in value.split(","))
+    except ValueError as e:
+        raise click.BadParameter(
+            f"{value} is not of the form workers,inference_threads,model_threads"
+        ) from e
+    return Topology(workers, inference_threads, model_threads)
+
+
+def best_topologies(
+    runs: list[dict[str, Any]], max_p99_ms: float | None
+) -> dict[str, dict[str, Any]]:
+    """
+    Topology with the highest throughput and the one with the lowest p99 latency
+    per phase, among those without errors and, for throughput, within max_p99_ms
+
+    Args:
+        runs (list[dict[str, Any]]): Topology and phase results of each run
+        max_p99_ms (float | None): Latency objective, None for none
+
+    Returns:
+        dict[str, dict[str, Any]]: Per phase, the stats of the best topologies,
+            None where no run qualifies
+    """
+    best = {}
+    for name in [phase["name"] for phase in runs[0]["phases"]]:
+        results = [
+            (run["topology"], phase)
+            for run in runs
+            for phase in run["phases"]
+            if phase["name"] == name and phase["errors"] == 0
+        ]
+        within_objective = [
+            (topology, phase)
+            for topology, phase in results
+            if max_p99_ms is None or phase["latency_ms"]["p99"] <= max_p99_ms
+        ]
+        throughput = max(
+            within_objective, key=lambda result: result[1]["throughput_rps"], default=None
+        )
+        latency = min(results, key=lambda result: result[1]["latency_ms"]["p99"], default=None)
+        best[name] = {
+            "throughput": throughput[0] if throughput else None,
+            "latency": latency[0] if latency else None,
+        }
+    return best
+
+
+@cli.command()
+@click.option(
+    "--topology",
+    "topologies",
+    type=str,
+    multiple=True,
+    help="workers,inference_threads,model_threads to try. Can be given multiple times. "
+    "Defaults to splits of the available CPUs.",
+)
+@click.option(
+    "--batch-size",
+    type=int,
+    multiple=True,
+    default=[1, 100],
+    help="Rows per generated request, one phase each. Can be given multiple times.",
+)
+@click.option(
+    "--concurrency",
+    type=int,
+    default=None,
+    help="Concurrent clients of the closed loop. Defaults to twice the number of CPUs.",
+)
+@click.option("--duration", type=float, default=10.0, help="Seconds per phase.")
+@click.option("--warmup", type=float, default=2.0, help="Untimed seconds before each phase.")
+@click.option(
+    "--max-p99-ms",
+    type=float,
+    default=None,
+    help="Latency objective of the best throughput. Defaults to none.",
+)
+@click.option("--seed", type=int, default=13371337, help="Random seed for the generated data.")
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help="File to write the results to as JSON.",
+)
+def sweep(
+    topologies: tuple[str, ...],
+    batch_size: tuple[int, ...],
+    concurrency: int | None,
+    duration: float,
+    warmup: float,
+    max_p99_ms: float | None,
+    seed: int,
+    output: Path | None,
+) -> None:
+    """
+    Run the load against gunicorn with each topology and report the best ones.
+    """
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    cpus = available_cpus()
+    candidates = (
+        [parse_topology(value) for value in topologies]
+        if topologies
+        else candidate_topologies(cpus)
+    )
+    concurrency = concurrency or 2 * cpus
+    phases = {f"rows_{n}": generate_payloads(n, 20, seed) for n in batch_size}
+
+    runs = []
+    for topology in candidates:
+        print(topology)
+        port = free_port()
+        server = start_gunicorn(topology.workers, port, topology.environment())
+        try:
+            results = asyncio.run(
+                run_phases(
+                    {"base_url": f"http://127.0.0.1:{port}"},
+                    partial(cpu_seconds, server.pid),
+                    phases,
+                    None,
+                    concurrency,
+                    duration,
+                    warmup,
+                )
+            )
+        finally:
+            server.terminate()
+            server.wait()
+        runs.append({"topology": topology.stats(), "phases": results})
+
+    best = best_topologies(runs, max_p99_ms)
+    for name, topologies_by_goal in best.items():
+        for goal, stats in topologies_by_goal.items():
+            described = (
+                "no run qualifies"
+                if stats is None
+                else "{workers} workers, {inference_threads} inference threads, "
+                "{model_threads} model threads".format(**stats)
+            )
+            print(f"{name:>16} best {goal:>10}: {described}")
+
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "load": {"concurrency": concurrency},
+        "duration_s": duration,
+        "max_p99_ms": max_p99_ms,
+        "host": {"machine": platform.machine(), "cpus": os.cpu_count(), "available_cpus": cpus},
+        "settings": {name: os.environ[name] for name in APP_SETTINGS if name in os.environ},
+        "runs": runs,
+        "best": best,
+    }
+    if output is not None:
+        output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    cli()
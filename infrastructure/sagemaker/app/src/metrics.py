@@ -0,0 +1,611 @@
+"""
+Latency histograms, counters and gauges of the prediction service, in Prometheus
+text format.
+
+Each process keeps its values in memory and regularly copies them to its own
+memory-mapped file in a shared directory, so that /metrics can add up the values
+of all gunicorn workers. Gauges are only added up over the processes which are
+still running, like the livesum mode of prometheus_client. Without a directory
+only the current process is reported.
+"""
+
+import os
+import mmap
+import time
+import bisect
+import threading
+from array import array
+from typing import Any
+from pathlib import Path
+
+import numpy as np
+import tracing
+
+STAGES = (
+    "body_read",
+    "validation",
+    "dataframe",
+    "queue_wait",
+    "feature_engineering",
+    "vectorization",
+    "model",
+    "serialization",
+    "total",
+)
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+ROW_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1_000, 2_500, 5_000, 10_000, 50_000)
+ERROR_TYPES = (
+    "bad_request",
+    "not_found",
+    "not_acceptable",
+    "too_large",
+    "unavailable",
+    "client",
+    "internal",
+)
+ERROR_TYPE_BY_STATUS = {
+    400: "bad_request",
+    404: "not_found",
+    406: "not_acceptable",
+    413: "too_large",
+    503: "unavailable",
+}
+ADMISSION_DECISIONS = (
+    "admitted",
+    "shed_queue_time",
+    "shed_deadline",
+    "shed_in_flight_rows",
+    "shed_in_flight_requests",
+    "rejected_body_size",
+    "rejected_rows",
+)
+CAPTURE_OUTCOMES = ("captured", "dropped", "written", "failed")
+SHADOW_OUTCOMES = ("scored", "skipped_budget", "skipped_busy", "failed")
+# Relative difference between shadow and live predictions
+DELTA_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def process_alive(pid: int) -> bool:
+    """
+    Whether a process is running
+
+    Args:
+        pid (int): Process id
+
+    Returns:
+        bool: False if there is no process with that id
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def error_type(status_code: int) -> str:
+    """
+    Error type label of an HTTP status code
+
+    Args:
+        status_code (int): Status code of the failed request
+
+    Returns:
+        str: One of ERROR_TYPES
+    """
+    if status_code in ERROR_TYPE_BY_STATUS:
+        return ERROR_TYPE_BY_STATUS[status_code]
+    return "client" if status_code < 500 else "internal"
+
+
+class Histogram:
+    """
+    Histogram with one series per label value. Each series takes len(buckets) + 3
+    values: the bucket counts, the count above the last bucket, the sum and the count.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        buckets: tuple[float, ...],
+        label_name: str | None = None,
+        label_values: tuple[str, ...] = ("",),
+    ) -> None:
+        """
+        Args:
+            name (str): Metric name
+            documentation (str): Help text
+            buckets (tuple[float, ...]): Upper bounds of the buckets, ascending
+            label_name (str | None, optional): Name of the label. Defaults to no label.
+            label_values (tuple[str, ...], optional): Values of the label. Defaults to no label.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.label_name = label_name
+        self.label_values = label_values
+        self.series_size = len(buckets) + 3
+        self.sum_index = len(buckets) + 1
+        self.size = len(label_values) * self.series_size
+        self.registry: "MetricsRegistry | None" = None
+        self.offsets: dict[str, int] = {}
+
+    def bind(self, registry: "MetricsRegistry", offset: int) -> None:
+        """
+        Place the histogram's values in a registry
+
+        Args:
+            registry (MetricsRegistry): The registry
+            offset (int): Position of the first value
+        """
+        self.registry = registry
+        self.offsets = {
+            label_value: offset + i * self.series_size
+            for i, label_value in enumerate(self.label_values)
+        }
+
+    def observe(self, value: float, label_value: str = "") -> None:
+        """
+        Record one observation
+
+        Args:
+            value (float): Observed value
+            label_value (str, optional): Label value of the series. Defaults to no label.
+        """
+        offset = self.offsets[label_value]
+        values = self.registry.values
+        values[offset + bisect.bisect_left(self.buckets, value)] += 1
+        values[offset + self.sum_index] += value
+        values[offset + self.sum_index + 1] += 1
+
+    def observe_many(self, values: np.ndarray, label_value: str = "") -> None:
+        """
+        Record an observation per value
+
+        Args:
+            values (np.ndarray): Observed values
+            label_value (str, optional): Label value of the series. Defaults to no label.
+        """
+        offset = self.offsets[label_value]
+        registry_values = self.registry.values
+        counts = np.bincount(
+            np.searchsorted(self.buckets, values, side="left"), minlength=len(self.buckets) + 1
+        )
+        for i in np.flatnonzero(counts):
+            registry_values[offset + i] += int(counts[i])
+        registry_values[offset + self.sum_index] += float(np.sum(values))
+        registry_values[offset + self.sum_index + 1] += len(values)
+
+    def time(self, label_value: str = "") -> "Timer":
+        """
+        Context manager observing the seconds spent in its block
+
+        Args:
+            label_value (str, optional): Label value of the series. Defaults to no label.
+
+        Returns:
+            Timer: The context manager
+        """
+        return Timer(self, label_value)
+
+    def render(self, values: np.ndarray) -> list[str]:
+        """
+        Prometheus text format lines
+
+        Args:
+            values (np.ndarray): All values of the registry
+
+        Returns:
+            list[str]: HELP, TYPE and sample lines
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        n_buckets = len(self.buckets)
+        for label_value, offset in self.offsets.items():
+            labels = f'{self.label_name}="{label_value}",' if self.label_name else ""
+            cumulative = np.cumsum(values[offset : offset + n_buckets + 1])
+            for bound, count in zip([*map(repr, self.buckets), "+Inf"], cumulative):
+                lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {count:.0f}')
+            labels = f"{{{labels.rstrip(',')}}}" if labels else ""
+            lines.append(f"{self.name}_sum{labels} {float(values[offset + n_buckets + 1])!r}")
+            lines.append(f"{self.name}_count{labels} {values[offset + n_buckets + 2]:.0f}")
+        return lines
+
+
+class Counter:
+    """
+    Counter with one value per label value
+    """
+
+    def __init__(
+        self, name: str, documentation: str, label_name: str, label_values: tuple[str, ...]
+    ) -> None:
+        """
+        Args:
+            name (str): Metric name
+            documentation (str): Help text
+            label_name (str): Name of the label
+            label_values (tuple[str, ...]): Values of the label
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_name = label_name
+        self.label_values = label_values
+        self.size = len(label_values)
+        self.registry: "MetricsRegistry | None" = None
+        self.offsets: dict[str, int] = {}
+
+    def bind(self, registry: "MetricsRegistry", offset: int) -> None:
+        """
+        Place the counter's values in a registry
+
+        Args:
+            registry (MetricsRegistry): The registry
+            offset (int): Position of the first value
+        """
+        self.registry = registry
+        self.offsets = {label_value: offset + i for i, label_value in enumerate(self.label_values)}
+
+    def inc(self, label_value: str, amount: float = 1) -> None:
+        """
+        Increase the counter
+
+        Args:
+            label_value (str): Label value of the series
+            amount (float, optional): Increment. Defaults to 1.
+        """
+        self.registry.values[self.offsets[label_value]] += amount
+
+    def render(self, values: np.ndarray) -> list[str]:
+        """
+        Prometheus text format lines
+
+        Args:
+            values (np.ndarray): All values of the registry
+
+        Returns:
+            list[str]: HELP, TYPE and sample lines
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_value, offset in self.offsets.items():
+            lines.append(f'{self.name}{{{self.label_name}="{label_value}"}} {values[offset]:.0f}')
+        return lines
+
+
+class Gauge:
+    """
+    Gauge with one value per label value, reporting the sum over the live processes
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_name: str | None = None,
+        label_values: tuple[str, ...] = ("",),
+    ) -> None:
+        """
+        Args:
+            name (str): Metric name
+            documentation (str): Help text
+            label_name (str | None, optional): Name of the label. Defaults to no label.
+            label_values (tuple[str, ...], optional): Values of the label. Defaults to no label.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_name = label_name
+        self.label_values = label_values
+        self.size = len(label_values)
+        self.registry: "MetricsRegistry | None" = None
+        self.offsets: dict[str, int] = {}
+
+    def bind(self, registry: "MetricsRegistry", offset: int) -> None:
+        """
+        Place the gauge's values in a registry
+
+        Args:
+            registry (MetricsRegistry): The registry
+            offset (int): Position of the first value
+        """
+        self.registry = registry
+        self.offsets = {label_value: offset + i for i, label_value in enumerate(self.label_values)}
+
+    def set(self, value: float, label_value: str = "") -> None:
+        """
+        Set the gauge of the current process
+
+        Args:
+            value (float): Current value
+            label_value (str, optional): Label value of the series. Defaults to no label.
+        """
+        self.registry.values[self.offsets[label_value]] = value
+
+    def render(self, values: np.ndarray) -> list[str]:
+        """
+        Prometheus text format lines
+
+        Args:
+            values (np.ndarray): All values of the registry
+
+        Returns:
+            list[str]: HELP, TYPE and sample lines
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for label_value, offset in self.offsets.items():
+            labels = f'{{{self.label_name}="{label_value}"}}' if self.label_name else ""
+            lines.append(f"{self.name}{labels} {float(values[offset])!r}")
+        return lines
+
+
+class Timer:
+    """
+    Context manager observing the seconds spent in its block. Inside a traced
+    request the block is also a span, named after the label value.
+    """
+
+    __slots__ = ("histogram", "label_value", "start", "span")
+    traced = True
+
+    def __init__(self, histogram: Histogram, label_value: str) -> None:
+        self.histogram = histogram
+        self.label_value = label_value
+        self.start = 0.0
+        self.span: tracing.Span | None = None
+
+    def __enter__(self) -> "Timer":
+        if self.traced:
+            self.span = tracing.start_span(self.label_value)
+            if self.span is not None:
+                self.span.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, self.label_value)
+        if self.span is not None:
+            self.span.__exit__(exc_type, exc, traceback)
+
+
+class RequestTimer(Timer):
+    """
+    Timer of a whole request, which also counts the request's error if it fails.
+    The request's root span is started by its handler.
+    """
+
+    __slots__ = ("errors",)
+    traced = False
+
+    def __init__(self, histogram: Histogram, label_value: str, errors: Counter) -> None:
+        super().__init__(histogram, label_value)
+        self.errors = errors
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> None:
+        super().__exit__(exc_type, exc, traceback)
+        if exc is not None:
+            self.errors.inc(error_type(getattr(exc, "status_code", 500)))
+
+
+class MetricsRegistry:
+    """
+    Holds the values of all metrics of the current process in one list. When a
+    directory is set, a background thread copies the values once per second into
+    a file of the process, and /metrics adds up the files of all workers. The files
+    of exited processes count for histograms and counters but not for gauges.
+
+    Updates take no lock, to keep them cheap. Threads of one process can therefore
+    lose an update when they observe the same metric at the same moment, which is
+    rare and acceptable for monitoring.
+    """
+
+    flush_interval_s = 1.0
+
+    def __init__(self, metrics: list[Histogram | Counter | Gauge]) -> None:
+        """
+        Args:
+            metrics (list[Histogram | Counter | Gauge]): The metrics, in output order
+        """
+        self.metrics = metrics
+        self.size = 0
+        self.gauge_slots: list[int] = []
+        for metric in metrics:
+            metric.bind(self, self.size)
+            if isinstance(metric, Gauge):
+                self.gauge_slots.extend(range(self.size, self.size + metric.size))
+            self.size += metric.size
+        self.directory: Path | None = None
+        self._file: mmap.mmap | None = None
+        self._flusher_pid: int | None = None
+        self.reset()
+        # Forked workers start with values and a file of their own
+        os.register_at_fork(after_in_child=self.reset)
+
+    def set_directory(self, directory: str) -> None:
+        """
+        Share the values through files in a directory, one per process
+
+        Args:
+            directory (str): The directory, empty to keep values in memory only
+        """
+        self.directory = Path(directory) if directory else None
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Start with fresh values for the current process. A process reusing the
+        pid of an exited one continues from its values, keeping totals monotonic,
+        except for the gauges which start at 0.
+        """
+        self.values = [0.0] * self.size
+        self._file = None
+        if self.directory is None:
+            return
+
+        n_bytes = self.size * 8
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.directory / f"metrics_{os.getpid()}.bin", os.O_RDWR | os.O_CREAT)
+        try:
+            if os.fstat(fd).st_size != n_bytes:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, n_bytes)
+            self._file = mmap.mmap(fd, n_bytes)
+        finally:
+            os.close(fd)
+        self.values = memoryview(self._file).cast("d").tolist()
+        for slot in self.gauge_slots:
+            self.values[slot] = 0.0
+
+        if self._flusher_pid != os.getpid():
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_periodically, name="metrics", daemon=True).start()
+
+    def flush(self) -> None:
+        """
+        Copy the values of the current process to its file
+        """
+        if self._file is not None:
+            self._file[:] = array("d", self.values).tobytes()
+
+    def _flush_periodically(self) -> None:
+        """
+        Flush every flush_interval_s seconds, run in a daemon thread
+        """
+        while True:
+            time.sleep(self.flush_interval_s)
+            self.flush()
+
+    def collect(self) -> np.ndarray:
+        """
+        Values of all processes added up, those of gauges only over the live
+        processes. Values of other processes are at most flush_interval_s seconds old.
+
+        Returns:
+            np.ndarray: One value per slot
+        """
+        if self.directory is None:
+            return np.array(self.values, dtype=np.float64)
+        self.flush()
+        total = np.zeros(self.size, dtype=np.float64)
+        for path in self.directory.glob("metrics_*.bin"):
+            values = np.fromfile(path, dtype=np.float64)
+            if len(values) != self.size:
+                continue
+            if self.gauge_slots and not process_alive(int(path.stem.removeprefix("metrics_"))):
+                values[self.gauge_slots] = 0.0
+            total += values
+        return total
+
+    def render(self) -> str:
+        """
+        All metrics in Prometheus text format
+
+        Returns:
+            str: The exposition text
+        """
+        values = self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render(values))
+        return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "prediction_stage_seconds",
+    "Seconds spent per stage of a prediction request. feature_engineering and "
+    "vectorization are only measured in native inference mode, otherwise they are part of model.",
+    LATENCY_BUCKETS,
+    label_name="stage",
+    label_values=STAGES,
+)
+REQUEST_ROWS = Histogram(
+    "prediction_request_rows",
+    "Number of rows per prediction request",
+    ROW_BUCKETS,
+)
+ERRORS = Counter(
+    "prediction_errors_total",
+    "Failed prediction requests by error type",
+    label_name="type",
+    label_values=ERROR_TYPES,
+)
+ADMISSIONS = Counter(
+    "prediction_admissions_total",
+    "Admission decisions on prediction requests",
+    label_name="decision",
+    label_values=ADMISSION_DECISIONS,
+)
+SHADOW_STAGE_SECONDS = Histogram(
+    "prediction_shadow_stage_seconds",
+    "Seconds spent per stage when the shadow model scores a request, off the response path",
+    LATENCY_BUCKETS,
+    label_name="stage",
+    label_values=STAGES,
+)
+SHADOW_DELTA = Histogram(
+    "prediction_shadow_relative_delta",
+    "Absolute difference between the shadow and the live prediction of a row, "
+    "relative to the live prediction",
+    DELTA_BUCKETS,
+)
+SHADOW_REQUESTS = Counter(
+    "prediction_shadow_requests_total",
+    "Sampled requests by whether the shadow model scored them",
+    label_name="outcome",
+    label_values=SHADOW_OUTCOMES,
+)
+CAPTURED_ROWS = Counter(
+    "prediction_capture_rows_total",
+    "Rows of scored requests by whether they were captured, dropped because the "
+    "capture buffer was full, written to Parquet or failed to be written",
+    label_name="outcome",
+    label_values=CAPTURE_OUTCOMES,
+)
+INFERENCE_IN_FLIGHT = Gauge(
+    "prediction_inference_in_flight_requests",
+    "Prediction requests holding an inference slot, at most INFERENCE_MAX_IN_FLIGHT per worker",
+)
+INFERENCE_QUEUE_DEPTH = Gauge(
+    "prediction_inference_queue_depth",
+    "Model calls waiting for a free inference thread",
+)
+REGISTRY = MetricsRegistry(
+    [
+        STAGE_SECONDS,
+        REQUEST_ROWS,
+        ERRORS,
+        ADMISSIONS,
+        SHADOW_STAGE_SECONDS,
+        SHADOW_DELTA,
+        SHADOW_REQUESTS,
+        CAPTURED_ROWS,
+        INFERENCE_IN_FLIGHT,
+        INFERENCE_QUEUE_DEPTH,
+    ]
+)
+
+
+def time_request() -> RequestTimer:
+    """
+    Context manager timing a whole prediction request and counting its error if it fails
+
+    Returns:
+        RequestTimer: The context manager
+    """
+    return RequestTimer(STAGE_SECONDS, "total", ERRORS)
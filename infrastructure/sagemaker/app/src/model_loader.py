@@ -0,0 +1,194 @@
+"""
+Loading of the models a worker serves: through the artifact cache, as a pyfunc
+or native model, and warmed up at each warm-up batch size before use
+"""
+
+import time
+from typing import Any
+from logging import Logger
+
+import metrics
+from config import AppSettings
+from shadow import ShadowScorer
+from readiness import warmup_frames
+from native_model import NativeModel, ModelLoadError
+from process_stats import memory_usage
+from artifact_cache import ArtifactCache
+from model_registry import ModelVersion
+from prediction_cache import PredictionCache
+from inference_executor import InferenceExecutor
+
+
+class ModelLoader:
+    """
+    Creates the model versions and the shadow scorer of a worker
+    """
+
+    def __init__(
+        self,
+        settings: AppSettings,
+        executor: InferenceExecutor,
+        cache_fields: list[str],
+        trace_features: bool,
+        logger: Logger,
+    ) -> None:
+        """
+        Args:
+            settings (AppSettings): Object containing the inference settings
+            executor (InferenceExecutor): Executor running the model calls of the versions
+            cache_fields (list[str]): Input fields the prediction cache keys rows by
+            trace_features (bool): Whether native models trace their feature functions
+            logger (Logger): logger object
+        """
+        self.settings = settings
+        self.executor = executor
+        self.cache_fields = cache_fields
+        self.trace_features = trace_features
+        self.logger = logger
+        self.artifact_cache = (
+            ArtifactCache(settings.artifact_cache_dir, logger=logger)
+            if settings.artifact_cache_dir
+            else None
+        )
+        self.warmup_frames = warmup_frames(settings.warmup_batch_sizes)
+
+    def load_model(self, mlflow_model_uri: str, shadow: bool = False) -> Any:
+        """
+        Loads the pipeline from the mlflow uri, through the artifact cache if enabled
+
+        Args:
+            mlflow_model_uri (str): uri to the model
+            shadow (bool, optional): Whether it is the shadow model, which predicts
+                with one thread and records its stages in metrics.SHADOW_STAGE_SECONDS.
+                Defaults to False.
+
+        Raises:
+            ModelLoadError: If the model can not be downloaded or loaded
+
+        Returns:
+            Any: The model, with a predict method
+        """
+        self.logger.info(
+            "Loading mlflow model %s in %s mode", mlflow_model_uri, self.settings.inference_mode
+        )
+        # The shadow model runs outside of traces
+        trace_features = self.trace_features and not shadow
+        try:
+            model_path = mlflow_model_uri
+            if self.artifact_cache is not None:
+                model_path = str(self.artifact_cache.resolve(mlflow_model_uri))
+            if self.settings.inference_mode == "native":
+                model = NativeModel.load(
+                    model_path,
+                    flat_max_rows=self.settings.flat_trees_max_rows,
+                    model_threads=1 if shadow else self.settings.model_threads,
+                    stage_seconds=(
+                        metrics.SHADOW_STAGE_SECONDS if shadow else metrics.STAGE_SECONDS
+                    ),
+                    trace_features=trace_features,
+                )
+                if trace_features:
+                    self.logger.info("Tracing feature functions %s", model.traced_functions)
+            else:
+                # Only the pyfunc mode needs mlflow on local models, which takes a while to import
+                import mlflow  # pylint: disable=import-outside-toplevel
+
+                model = mlflow.pyfunc.load_model(model_path)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.logger.error(
+                msg=f"Failed to load model {mlflow_model_uri}.",
+                exc_info=True,
+            )
+            raise ModelLoadError(str(e)) from e
+        return model
+
+    def warm_up_model(self, model: Any) -> float:
+        """
+        Predict the synthetic rows of each warm-up batch size with a freshly loaded model
+
+        Args:
+            model (Any): Model with a predict method
+
+        Returns:
+            float: Seconds spent warming up
+        """
+        start = time.perf_counter()
+        for df in self.warmup_frames.values():
+            model.predict(df)
+        return time.perf_counter() - start
+
+    def create_version(self, name: str, model_uri: str) -> ModelVersion:
+        """
+        Load a model, set up its cache and batcher, and warm it up at each warm-up
+        batch size. Blocks, so it runs in a thread when the server is up.
+
+        Args:
+            name (str): Name under which requests select the version
+            model_uri (str): uri to the model
+
+        Raises:
+            ModelLoadError: If the model can not be downloaded or loaded
+
+        Returns:
+            ModelVersion: The loaded version
+        """
+        start = time.perf_counter()
+        rss_before = memory_usage().get("rss_mb")
+        model = self.load_model(model_uri)
+
+        cache = None
+        if self.settings.prediction_cache_enabled:
+            cache = PredictionCache(
+                fields=self.cache_fields,
+                max_size=self.settings.prediction_cache_max_size,
+                ttl_s=self.settings.prediction_cache_ttl_s,
+            )
+            cache.bind(model_uri)
+
+        warmup_seconds = self.warm_up_model(model)
+        rss_after = memory_usage().get("rss_mb")
+        model_version = ModelVersion(
+            name=name,
+            model_uri=model_uri,
+            model=model,
+            executor=self.executor,
+            cache=cache,
+            load_seconds=time.perf_counter() - start,
+            warmup_seconds=warmup_seconds,
+            memory_mb=None if rss_before is None else max(rss_after - rss_before, 0.0),
+        )
+        if self.settings.batching_enabled:
+            model_version.enable_batching(
+                max_wait_ms=self.settings.batch_max_wait_ms,
+                max_rows=self.settings.batch_max_rows,
+                logger=self.logger,
+            )
+        return model_version
+
+    def create_shadow(self, model_uri: str) -> ShadowScorer:
+        """
+        Load and warm up the shadow model
+
+        Args:
+            model_uri (str): uri to the shadow model
+
+        Raises:
+            ModelLoadError: If the model can not be downloaded or loaded
+
+        Returns:
+            ShadowScorer: Scorer of sampled requests with the shadow model
+        """
+        model = self.load_model(model_uri, shadow=True)
+        self.warm_up_model(model)
+        self.logger.info(
+            "Shadow scoring %.1f%% of requests with %s",
+            self.settings.shadow_sample_rate * 100,
+            model_uri,
+        )
+        return ShadowScorer(
+            model=model,
+            model_uri=model_uri,
+            sample_rate=self.settings.shadow_sample_rate,
+            cpu_budget=self.settings.shadow_cpu_budget,
+            logger=self.logger,
+        )
@@ -0,0 +1,257 @@
+"""
+The model versions a worker serves, kept in line with the model manifest. The
+manifest is shared by all workers: a worker which loads or unloads a version
+writes it, and the others follow when they see it change.
+"""
+
+import os
+import time
+import asyncio
+from typing import Any
+from logging import Logger
+
+from config import AppSettings
+from readiness import Readiness
+from model_loader import ModelLoader
+from model_registry import ModelVersion, ModelRegistry, read_manifest, write_manifest
+
+
+class ModelManager:
+    """
+    Loads, swaps in and unloads the model versions of a worker
+    """
+
+    def __init__(self, settings: AppSettings, loader: ModelLoader, logger: Logger) -> None:
+        """
+        Loads the versions of the manifest if it exists, otherwise the model of
+        MLFLOW_MODEL_URI as the default version
+
+        Args:
+            settings (AppSettings): Object containing the model uri and manifest settings
+            loader (ModelLoader): Loader creating the versions
+            logger (Logger): logger object
+
+        Raises:
+            ModelLoadError: If a model can not be downloaded or loaded
+            ModelRegistryError: If the manifest lists more than MODEL_MAX_VERSIONS versions
+        """
+        self.loader = loader
+        self.logger = logger
+        self.registry = ModelRegistry(max_versions=settings.model_max_versions)
+        self.load_lock = asyncio.Lock()
+        self.warmup_concurrency = max(settings.inference_workers, 1)
+
+        self.manifest_path = settings.model_manifest_path
+        self.manifest_poll_s = settings.model_manifest_poll_s
+        self.manifest_mtime: int | None = None
+        self.manifest_task: asyncio.Task | None = None
+
+        if self.manifest_path and os.path.exists(self.manifest_path):
+            self.manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+            manifest = read_manifest(self.manifest_path)
+            self.registry.check_manifest(manifest)
+            for name, model_uri in manifest["versions"].items():
+                self.registry.add(
+                    loader.create_version(name, model_uri), make_default=name == manifest["default"]
+                )
+        else:
+            self.registry.add(
+                loader.create_version(
+                    settings.model_version_name or settings.mlflow_model_uri,
+                    settings.mlflow_model_uri,
+                ),
+                make_default=True,
+            )
+
+    def get(self, name: str | None = None) -> ModelVersion:
+        """
+        A loaded version
+
+        Args:
+            name (str | None, optional): Name of the version. Defaults to the default version.
+
+        Raises:
+            KeyError: If there is no version with that name
+
+        Returns:
+            ModelVersion: The version
+        """
+        return self.registry.get(name)
+
+    async def load_version(
+        self, name: str, model_uri: str, make_default: bool, check_capacity: bool = True
+    ) -> ModelVersion:
+        """
+        Load a version in a background thread and swap it in once it is warm.
+        Requests in flight finish with the version they started with. A version
+        which is already loaded from the same uri is not loaded again.
+
+        Args:
+            name (str): Name under which requests select the version
+            model_uri (str): uri to the model
+            make_default (bool): Whether to make it the default version
+            check_capacity (bool, optional): Whether to refuse loading more than
+                max_versions versions. Defaults to True.
+
+        Raises:
+            ModelRegistryError: If check_capacity is set and max_versions versions are loaded
+            ModelLoadError: If the model can not be downloaded or loaded
+
+        Returns:
+            ModelVersion: The loaded version
+        """
+        async with self.load_lock:
+            current = self.registry.versions.get(name)
+            if current is not None and current.model_uri == model_uri:
+                if make_default:
+                    self.registry.set_default(name)
+                return current
+            if check_capacity:
+                self.registry.check_capacity(name)
+            model_version = await asyncio.to_thread(self.loader.create_version, name, model_uri)
+            self.registry.add(model_version, make_default=make_default)
+            self.logger.info(
+                "Loaded model version %s from %s in %.2f s",
+                name,
+                model_uri,
+                model_version.load_seconds,
+            )
+            return model_version
+
+    async def add_version(self, name: str, model_uri: str, make_default: bool) -> ModelVersion:
+        """
+        Load a version and write the manifest, so that the other workers follow
+
+        Args:
+            name (str): Name under which requests select the version
+            model_uri (str): uri to the model
+            make_default (bool): Whether to make it the default version
+
+        Raises:
+            ModelRegistryError: If max_versions other versions are loaded
+            ModelLoadError: If the model can not be downloaded or loaded
+
+        Returns:
+            ModelVersion: The loaded version
+        """
+        model_version = await self.load_version(name, model_uri, make_default)
+        self.save_manifest()
+        return model_version
+
+    async def remove_version(self, name: str) -> None:
+        """
+        Unload a version and write the manifest, so that the other workers follow
+
+        Args:
+            name (str): Name of the version
+
+        Raises:
+            KeyError: If there is no version with that name
+            ModelRegistryError: If it is the default version
+        """
+        async with self.load_lock:
+            self.registry.remove(name)
+            self.save_manifest()
+
+    async def apply_manifest(self, manifest: dict[str, Any]) -> None:
+        """
+        Load, swap in and unload versions to match a manifest
+
+        Args:
+            manifest (dict[str, Any]): Manifest as returned by read_manifest
+
+        Raises:
+            ModelRegistryError: If the manifest lists more than max_versions versions
+        """
+        self.registry.check_manifest(manifest)
+        for name, model_uri in manifest["versions"].items():
+            await self.load_version(
+                name, model_uri, make_default=name == manifest["default"], check_capacity=False
+            )
+        for name in list(self.registry.versions):
+            if name not in manifest["versions"]:
+                self.registry.remove(name)
+                self.logger.info("Unloaded model version %s", name)
+
+    def save_manifest(self) -> None:
+        """
+        Write the resident versions to the manifest, so that the other workers follow
+        """
+        if not self.manifest_path:
+            return
+        write_manifest(self.manifest_path, self.registry.manifest())
+        self.manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+
+    async def start_manifest_watcher(self) -> None:
+        """
+        Start watching the manifest in the background
+        """
+        self.manifest_task = asyncio.get_running_loop().create_task(self.watch_manifest())
+
+    async def watch_manifest(self) -> None:
+        """
+        Apply the manifest whenever it changes
+        """
+        while True:
+            await asyncio.sleep(self.manifest_poll_s)
+            try:
+                mtime = os.stat(self.manifest_path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if mtime == self.manifest_mtime:
+                continue
+            self.manifest_mtime = mtime
+            self.logger.info("Model manifest %s changed", self.manifest_path)
+            try:
+                await self.apply_manifest(read_manifest(self.manifest_path))
+            except Exception:  # pylint: disable=broad-exception-caught
+                self.logger.error(
+                    "Failed to apply model manifest %s", self.manifest_path, exc_info=True
+                )
+
+    async def warm_up(self, readiness: Readiness) -> None:
+        """
+        Run the warm-up rows through the inference path of this worker, with the
+        default version, and report ready afterwards. Predicting in the worker
+        starts its inference threads and XGBoost's thread pool, which a model
+        loaded in the gunicorn master does not pass on to the forked workers.
+        Each batch size is predicted once per inference thread at the same time,
+        so that every thread is started.
+
+        Args:
+            readiness (Readiness): Readiness of the worker
+        """
+        readiness.set_warming_up()
+        batch_seconds = {}
+        try:
+            model_version = self.registry.get()
+            for n_rows, df in self.loader.warmup_frames.items():
+                start = time.perf_counter()
+                await asyncio.gather(
+                    *(
+                        model_version.run_model(df, record_stats=False)
+                        for _ in range(self.warmup_concurrency)
+                    )
+                )
+                batch_seconds[n_rows] = time.perf_counter() - start
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.logger.error("Warm-up failed, the worker stays unready", exc_info=True)
+            readiness.set_failed(e)
+            return
+        readiness.set_ready(batch_seconds)
+        self.logger.info(
+            "Worker %s warmed up in %.3f s (%s), ready %.2f s after loading started",
+            os.getpid(),
+            readiness.warmup_seconds,
+            ", ".join(
+                f"{n_rows} rows {seconds:.4f} s" for n_rows, seconds in batch_seconds.items()
+            ),
+            readiness.ready_at - readiness.started_at,
+        )
+
+    def stop(self) -> None:
+        """
+        Stop watching the manifest
+        """
+        if self.manifest_task is not None:
+            self.manifest_task.cancel()
@@ -0,0 +1,333 @@
+"""
+Model versions resident in a worker, and the manifest file through which all
+workers of a container agree on which versions to serve
+"""
+
+import os
+import json
+import time
+from typing import Any
+from logging import Logger
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import metrics
+from batching import MicroBatcher
+from native_model import NativeModel
+from prediction_cache import PredictionCache
+from inference_executor import InferenceExecutor
+
+
+class ModelVersion:
+    """
+    A loaded model predicting in the inference executor, with its own prediction
+    cache and micro-batcher if they are enabled
+    """
+
+    def __init__(
+        self,
+        name: str,
+        model_uri: str,
+        model: Any,
+        executor: InferenceExecutor,
+        cache: PredictionCache | None,
+        load_seconds: float,
+        warmup_seconds: float,
+        memory_mb: float | None,
+    ) -> None:
+        """
+        Args:
+            name (str): Name under which requests select the version
+            model_uri (str): uri to the model
+            model (Any): Loaded model with a predict method
+            executor (InferenceExecutor): Executor running the model calls
+            cache (PredictionCache | None): Cache of the model's predictions, if enabled
+            load_seconds (float): Time it took to load and warm up the model
+            warmup_seconds (float): Part of load_seconds spent warming up
+            memory_mb (float | None): Growth of the process RSS while loading and
+                warming up the model, None where it can not be measured
+        """
+        self.name = name
+        self.model_uri = model_uri
+        self.model = model
+        self.executor = executor
+        self.batcher: MicroBatcher | None = None
+        self.cache = cache
+        self.load_seconds = load_seconds
+        self.warmup_seconds = warmup_seconds
+        self.memory_mb = memory_mb
+        self.loaded_at = time.time()
+        self.requests = 0
+
+    def enable_batching(self, max_wait_ms: float, max_rows: int, logger: Logger) -> None:
+        """
+        Coalesce the model calls of concurrent requests
+
+        Args:
+            max_wait_ms (float): Longest time in milliseconds a request waits for others
+            max_rows (int): Number of pending rows which triggers a model call
+            logger (Logger): logger object
+        """
+        self.batcher = MicroBatcher(
+            predict_fn=self.call_model, max_wait_ms=max_wait_ms, max_rows=max_rows, logger=logger
+        )
+
+    def predict_now(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Predict with the model in the calling thread, recording the time spent in
+        it. Native models record their stages themselves.
+
+        Args:
+            df (pd.DataFrame): Input data without prediction ids
+
+        Returns:
+            np.ndarray: One prediction per row
+        """
+        if isinstance(self.model, NativeModel):
+            return self.model.predict(df)
+        with metrics.STAGE_SECONDS.time("model"):
+            return self.model.predict(df)
+
+    async def call_model(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Predict with the model in the inference executor
+
+        Args:
+            df (pd.DataFrame): Input data without prediction ids
+
+        Returns:
+            np.ndarray: One prediction per row
+        """
+        return await self.executor.run(self.predict_now, df)
+
+    async def run_model(self, df: pd.DataFrame, record_stats: bool = True) -> np.ndarray:
+        """
+        Predict with the model, as part of a batch if batching is enabled
+
+        Args:
+            df (pd.DataFrame): Input data without prediction ids
+            record_stats (bool, optional): Whether the call counts in the batch stats,
+                False for the warm-up. Defaults to True.
+
+        Returns:
+            np.ndarray: One prediction per row
+        """
+        if self.batcher is not None:
+            return await self.batcher.predict(df, record_stats=record_stats)
+        return await self.call_model(df)
+
+    async def predict(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Predict the rows of a request. If the prediction cache is enabled only
+        rows which are not cached are passed on to the model.
+
+        Args:
+            df (pd.DataFrame): Input data without prediction ids
+
+        Returns:
+            np.ndarray: One prediction per row
+        """
+        if self.cache is None:
+            return await self.run_model(df)
+
+        keys = self.cache.keys(df)
+        preds, missing = self.cache.get_many(keys)
+        if len(missing) > 0:
+            missing_preds = await self.run_model(df.iloc[missing].reset_index(drop=True))
+            preds[missing] = missing_preds
+            self.cache.put_many([keys[i] for i in missing], missing_preds)
+        return preds
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Description of the version
+
+        Returns:
+            dict[str, Any]: uri, load and warm-up time, memory and request counters
+        """
+        return {
+            "model_uri": self.model_uri,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "memory_mb": self.memory_mb,
+            "requests": self.requests,
+        }
+
+
+class ModelRegistryError(ValueError):
+    """
+    Raised for changes the registry can not make
+    """
+
+
+class ModelRegistry:
+    """
+    The model versions loaded in this worker, one of which is the default.
+
+    Versions are swapped in by replacing a dict entry, so requests which already
+    picked a version finish with it while new requests get the new one. The old
+    model is freed once the last of those requests is done.
+    """
+
+    def __init__(self, max_versions: int) -> None:
+        """
+        Args:
+            max_versions (int): Largest number of resident versions
+        """
+        self.max_versions = max_versions
+        self.versions: dict[str, ModelVersion] = {}
+        self.default_name: str | None = None
+
+    def get(self, name: str | None = None) -> ModelVersion:
+        """
+        A resident version
+
+        Args:
+            name (str | None, optional): Name of the version. Defaults to the default version.
+
+        Raises:
+            KeyError: If there is no version with that name
+
+        Returns:
+            ModelVersion: The version
+        """
+        return self.versions[self.default_name if name is None else name]
+
+    def check_capacity(self, name: str) -> None:
+        """
+        Check that a version can be added
+
+        Args:
+            name (str): Name of the version to add
+
+        Raises:
+            ModelRegistryError: If max_versions other versions are resident
+        """
+        if name not in self.versions and len(self.versions) >= self.max_versions:
+            raise ModelRegistryError(
+                f"{len(self.versions)} versions are loaded, the limit is {self.max_versions}. "
+                "Unload a version first."
+            )
+
+    def check_manifest(self, manifest: dict[str, Any]) -> None:
+        """
+        Check that the versions of a manifest fit in the registry
+
+        Args:
+            manifest (dict[str, Any]): Manifest as returned by read_manifest
+
+        Raises:
+            ModelRegistryError: If the manifest lists more than max_versions versions
+        """
+        if len(manifest["versions"]) > self.max_versions:
+            raise ModelRegistryError(
+                f"Manifest lists {len(manifest['versions'])} versions, "
+                f"the limit is {self.max_versions}"
+            )
+
+    def add(self, model_version: ModelVersion, make_default: bool = False) -> None:
+        """
+        Add a version, replacing any version with the same name. The number of
+        versions is not checked here, see check_capacity.
+
+        Args:
+            model_version (ModelVersion): The loaded version
+            make_default (bool, optional): Whether to make it the default. Defaults to False.
+        """
+        self.versions[model_version.name] = model_version
+        if make_default or self.default_name is None:
+            self.default_name = model_version.name
+
+    def set_default(self, name: str) -> None:
+        """
+        Make a resident version the default
+
+        Args:
+            name (str): Name of the version
+
+        Raises:
+            KeyError: If there is no version with that name
+        """
+        if name not in self.versions:
+            raise KeyError(name)
+        self.default_name = name
+
+    def remove(self, name: str) -> None:
+        """
+        Unload a version
+
+        Args:
+            name (str): Name of the version
+
+        Raises:
+            KeyError: If there is no version with that name
+            ModelRegistryError: If it is the default version
+        """
+        if name not in self.versions:
+            raise KeyError(name)
+        if name == self.default_name:
+            raise ModelRegistryError("The default version can not be unloaded")
+        del self.versions[name]
+
+    def manifest(self) -> dict[str, Any]:
+        """
+        The resident versions in manifest form
+
+        Returns:
+            dict[str, Any]: Default version name and the uri of each version
+        """
+        return {
+            "default": self.default_name,
+            "versions": {name: version.model_uri for name, version in self.versions.items()},
+        }
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Description of all resident versions
+
+        Returns:
+            dict[str, Any]: Default version name and per-version stats
+        """
+        return {
+            "pid": os.getpid(),
+            "default": self.default_name,
+            "max_versions": self.max_versions,
+            "versions": {name: version.stats() for name, version in self.versions.items()},
+        }
+
+
+def read_manifest(path: str | Path) -> dict[str, Any]:
+    """
+    Read a model manifest, {"default": <name>, "versions": {<name>: <model uri>, ...}}
+
+    Args:
+        path (str | Path): Path of the manifest
+
+    Raises:
+        ValueError: If the manifest is malformed
+
+    Returns:
+        dict[str, Any]: The manifest
+    """
+    manifest = json.loads(Path(path).read_text(encoding="utf-8"))
+    if not isinstance(manifest.get("versions"), dict) or not manifest["versions"]:
+        raise ValueError(f"Manifest {path} must map at least one version name to a model uri")
+    if manifest.get("default") not in manifest["versions"]:
+        raise ValueError(f"Default version of manifest {path} is not one of its versions")
+    return manifest
+
+
+def write_manifest(path: str | Path, manifest: dict[str, Any]) -> None:
+    """
+    Atomically replace a model manifest
+
+    Args:
+        path (str | Path): Path of the manifest
+        manifest (dict[str, Any]): The manifest
+    """
+    path = Path(path)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    tmp_path.replace(path)
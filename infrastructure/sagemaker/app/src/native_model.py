@@ -0,0 +1,279 @@
+"""
+Direct inference on the logged sklearn pipeline, bypassing the mlflow pyfunc wrapper.
+Models on local disk are loaded without importing mlflow, which takes about a
+second of the service's startup.
+"""
+
+import sys
+import copy
+import types
+import pickle
+from typing import Any
+from pathlib import Path
+from urllib.parse import urlparse
+
+import yaml
+import numpy as np
+import pandas as pd
+import metrics
+import tracing
+from xgboost import XGBRegressor
+from flat_trees import FlatTreeEnsemble
+
+
+class ModelLoadError(Exception):
+    """
+    Raised for a model which can not be loaded
+    """
+
+
+def local_model_path(model_uri: str) -> Path | None:
+    """
+    Directory of a model on local disk
+
+    Args:
+        model_uri (str): uri to the model, a file:// uri or a path
+
+    Returns:
+        Path | None: The directory, None if the model is not on local disk
+    """
+    parsed = urlparse(model_uri)
+    if parsed.scheme == "file":
+        return Path(parsed.path)
+    if parsed.scheme == "" and Path(model_uri).is_dir():
+        return Path(model_uri)
+    return None
+
+
+def logged_code_modules(code_path: Path) -> list[str]:
+    """
+    Names of the modules in the code logged with a model, and of their submodules
+    which are imported
+
+    Args:
+        code_path (Path): Directory of the logged code
+
+    Returns:
+        list[str]: Module names as in sys.modules
+    """
+    top_level = {path.stem for path in code_path.glob("*.py")} | {
+        path.parent.name for path in code_path.glob("*/__init__.py")
+    }
+    return [
+        name
+        for name in list(sys.modules)
+        if name in top_level or name.split(".", 1)[0] in top_level
+    ]
+
+
+def load_sklearn_model(model_uri: str) -> Any:
+    """
+    Load the sklearn flavor of an mlflow model as mlflow.sklearn.load_model does.
+    Remote models are loaded with mlflow, local ones are unpickled directly.
+
+    Args:
+        model_uri (str): uri to the model
+
+    Raises:
+        ModelLoadError: If the model has no sklearn flavor
+
+    Returns:
+        Any: The fitted sklearn model
+    """
+    model_path = local_model_path(model_uri)
+    if model_path is None:
+        import mlflow  # pylint: disable=import-outside-toplevel
+
+        return mlflow.sklearn.load_model(model_uri)
+
+    with open(model_path / "MLmodel", encoding="utf-8") as f:
+        flavor = yaml.safe_load(f).get("flavors", {}).get("sklearn")
+    if flavor is None:
+        raise ModelLoadError(f"Model {model_uri} has no sklearn flavor")
+    if flavor.get("serialization_format", "pickle") not in ("pickle", "cloudpickle"):
+        raise ModelLoadError(
+            f"Model {model_uri} has unsupported serialization format "
+            f"{flavor['serialization_format']}"
+        )
+    # Code logged with the model, such as custom transformers, is importable while
+    # unpickling like with mlflow. Modules of the same name imported for another
+    # model are evicted, so that each model gets the code it was logged with.
+    code_path = str(model_path / flavor["code"]) if flavor.get("code") else None
+    if code_path is not None:
+        for module in logged_code_modules(Path(code_path)):
+            sys.modules.pop(module, None)
+        sys.path.insert(0, code_path)
+    try:
+        # cloudpickle writes standard pickles, which import cloudpickle where they need it
+        with open(model_path / flavor["pickled_model"], "rb") as f:
+            return pickle.load(f)
+    finally:
+        if code_path is not None:
+            sys.path.remove(code_path)
+
+
+class NativeModel:
+    """
+    Unpacks the logged pipeline (preprocessing, encoder, model) once and
+    predicts with XGBoost's in-place prediction on the encoded matrix.
+    Pipelines ending in any other model are predicted with the model's own
+    predict method. Batches of up to flat_max_rows rows are predicted with the
+    booster flattened into a FlatTreeEnsemble, which has less overhead per call.
+    The time spent in feature engineering (all steps but the last transformer),
+    vectorization (the last transformer) and the model is recorded in
+    metrics.STAGE_SECONDS, or in another histogram with the same stages.
+    With trace_features set, the feature functions called by the pipeline's
+    FunctionTransformers add spans to traced requests.
+    """
+
+    def __init__(
+        self,
+        pipeline: Any,
+        flat_max_rows: int = 0,
+        model_threads: int = 0,
+        stage_seconds: metrics.Histogram = metrics.STAGE_SECONDS,
+        trace_features: bool = False,
+    ) -> None:
+        """
+        Args:
+            pipeline (Any): Fitted sklearn pipeline with the model as last step
+            flat_max_rows (int, optional): Largest batch predicted with the flattened
+                trees. Defaults to 0, always using XGBoost.
+            model_threads (int, optional): XGBoost threads per prediction. Defaults
+                to 0, keeping the booster's setting.
+            stage_seconds (metrics.Histogram, optional): Histogram recording the time
+                per stage. Defaults to metrics.STAGE_SECONDS.
+            trace_features (bool, optional): Whether to trace the functions of
+                tracing.FEATURE_FUNCTIONS. Defaults to False.
+        """
+        self.stage_seconds = stage_seconds
+        *transformers, self.estimator = [step for _, step in pipeline.steps]
+        self.traced_functions: list[str] = []
+        if trace_features:
+            transformers = [self._trace_transformer(step) for step in transformers]
+        self.transformers = transformers
+        self.transformer_stages = ["feature_engineering"] * (len(transformers) - 1) + [
+            "vectorization"
+        ]
+
+        self.booster = None
+        if isinstance(self.estimator, XGBRegressor):
+            self.booster = self.estimator.get_booster()
+            try:
+                self.iteration_range = (0, self.estimator.best_iteration + 1)
+            except AttributeError:
+                # No early stopping used, predict with all trees
+                self.iteration_range = (0, 0)
+            if model_threads > 0:
+                self.booster.set_param({"nthread": model_threads})
+
+        self.flat_max_rows = flat_max_rows
+        self.flat_trees = None
+        if self.booster is not None and flat_max_rows > 0:
+            self.flat_trees = FlatTreeEnsemble.from_booster(self.booster, self.iteration_range)
+
+    def _trace_transformer(self, transformer: Any) -> Any:
+        """
+        Copy of a FunctionTransformer calling a copy of its function with the
+        feature functions traced. The fitted pipeline and the feature engineering
+        module stay as they are, so other models loaded from them are not traced.
+
+        Args:
+            transformer (Any): Step of the pipeline
+
+        Returns:
+            Any: The traced copy, or the step itself if it does not call a Python function
+        """
+        if not isinstance(getattr(transformer, "func", None), types.FunctionType):
+            return transformer
+        func, traced_names = tracing.trace_module_functions(
+            transformer.func, tracing.FEATURE_FUNCTIONS
+        )
+        if not traced_names:
+            return transformer
+        transformer = copy.copy(transformer)
+        transformer.func = func
+        self.traced_functions += traced_names
+        return transformer
+
+    @classmethod
+    def load(
+        cls,
+        mlflow_model_uri: str,
+        flat_max_rows: int = 0,
+        model_threads: int = 0,
+        stage_seconds: metrics.Histogram = metrics.STAGE_SECONDS,
+        trace_features: bool = False,
+    ) -> "NativeModel":
+        """
+        Load the sklearn flavor of the mlflow model and unpack it, without mlflow
+        if it is on local disk
+
+        Args:
+            mlflow_model_uri (str): uri to the model
+            flat_max_rows (int, optional): Largest batch predicted with the flattened
+                trees. Defaults to 0, always using XGBoost.
+            model_threads (int, optional): XGBoost threads per prediction. Defaults
+                to 0, keeping the booster's setting.
+            stage_seconds (metrics.Histogram, optional): Histogram recording the time
+                per stage. Defaults to metrics.STAGE_SECONDS.
+            trace_features (bool, optional): Whether to trace the functions of
+                tracing.FEATURE_FUNCTIONS. Defaults to False.
+
+        Returns:
+            NativeModel: The unpacked model
+        """
+        return cls(
+            load_sklearn_model(mlflow_model_uri),
+            flat_max_rows=flat_max_rows,
+            model_threads=model_threads,
+            stage_seconds=stage_seconds,
+            trace_features=trace_features,
+        )
+
+    def transform(self, df: pd.DataFrame) -> Any:
+        """
+        Run all pipeline steps except the model
+
+        Args:
+            df (pd.DataFrame): Raw input data
+
+        Returns:
+            Any: The encoded feature matrix
+        """
+        features = df
+        for stage, transformer in zip(self.transformer_stages, self.transformers):
+            with self.stage_seconds.time(stage):
+                features = transformer.transform(features)
+        return features
+
+    def predict(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Predict on raw input data
+
+        Args:
+            df (pd.DataFrame): Raw input data
+
+        Returns:
+            np.ndarray: One prediction per row
+        """
+        return self.predict_features(self.transform(df))
+
+    def predict_features(self, features: Any) -> np.ndarray:
+        """
+        Predict on an encoded feature matrix
+
+        Args:
+            features (Any): Output of transform
+
+        Returns:
+            np.ndarray: One prediction per row
+        """
+        with self.stage_seconds.time("model"):
+            if self.booster is None:
+                return self.estimator.predict(features)
+            if self.flat_trees is not None and features.shape[0] <= self.flat_max_rows:
+                return self.flat_trees.predict(features)
+            return self.booster.inplace_predict(
+                features, iteration_range=self.iteration_range, missing=self.estimator.missing
+            )
@@ -0,0 +1,128 @@
+"""
+In-process cache of predictions for repeated input rows
+"""
+
+import time
+from typing import Any, Hashable
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache mapping input rows to predictions of one model.
+
+    Rows are keyed by the tuple of their input field values in a fixed field
+    order. Entries expire ttl_s seconds after they were stored, and the least
+    recently used entry is evicted when max_size is reached. The cache is bound
+    to a model uri and is cleared when a different model is bound.
+    """
+
+    def __init__(self, fields: list[str], max_size: int, ttl_s: float) -> None:
+        """
+        Args:
+            fields (list[str]): Input fields making up the key, in key order
+            max_size (int): Largest number of cached rows
+            ttl_s (float): Seconds until a cached prediction expires
+        """
+        self.fields = fields
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self.model_uri: str | None = None
+        self._entries: OrderedDict[Hashable, tuple[float, float]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def bind(self, model_uri: str) -> None:
+        """
+        Bind the cache to a model, dropping all entries if the model changed
+
+        Args:
+            model_uri (str): uri of the model producing the cached predictions
+        """
+        if model_uri != self.model_uri:
+            self._entries.clear()
+            self.model_uri = model_uri
+
+    def keys(self, df: pd.DataFrame) -> list[Hashable]:
+        """
+        Canonical keys of the rows in df
+
+        Args:
+            df (pd.DataFrame): Input data holding all key fields
+
+        Returns:
+            list[Hashable]: One key per row
+        """
+        return list(df[self.fields].itertuples(index=False, name=None))
+
+    def get_many(self, keys: list[Hashable]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Look up the predictions of the given keys
+
+        Args:
+            keys (list[Hashable]): Row keys
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Predictions (NaN where missing) and
+                the positions of the keys that were not found
+        """
+        now = time.monotonic()
+        predictions = np.full(len(keys), np.nan, dtype=np.float64)
+        missing = []
+        for i, key in enumerate(keys):
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                missing.append(i)
+                continue
+            self._entries.move_to_end(key)
+            predictions[i] = entry[0]
+
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+        return predictions, np.array(missing, dtype=np.intp)
+
+    def put_many(self, keys: list[Hashable], predictions: np.ndarray) -> None:
+        """
+        Store predictions, evicting the least recently used entries if full
+
+        Args:
+            keys (list[Hashable]): Row keys
+            predictions (np.ndarray): One prediction per key
+        """
+        expires_at = time.monotonic() + self.ttl_s
+        for key, prediction in zip(keys, predictions.tolist()):
+            self._entries[key] = (prediction, expires_at)
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Cache counters
+
+        Returns:
+            dict[str, Any]: Size, limits and hit/miss counters
+        """
+        lookups = max(self.hits + self.misses, 1)
+        return {
+            "model_uri": self.model_uri,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
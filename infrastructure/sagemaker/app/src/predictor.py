@@ -5,7 +5,7 @@ Code for the FastAPI app
 import asyncio
 import logging
 
-import uvicorn
+import metrics
 from config import AppSettings
 from fastapi import FastAPI
 from routers import predict, internal
@@ -28,24 +28,31 @@ class FlightPricePredictionApp(FastAPI):
         self.settings = settings
 
         self.add_event_handler("shutdown", self.stop_svc)
+        metrics.REGISTRY.set_directory(self.settings.metrics_dir)
 
         self.include_router(internal.router)
-        self.include_router(
-            predict.Handler(
-                mlflow_model_uri=self.settings.mlflow_model_uri, logger=self.logger
-            ).router
+        self.prediction_handler = predict.Handler(
+            settings=self.settings,
+            logger=self.logger,
         )
+        self.include_router(self.prediction_handler.router)
+        # Read by the status checks of the internal router
+        self.state.readiness = self.prediction_handler.readiness
 
     def stop_svc(self) -> None:
         """
         Method for stopping the service
         """
         self.logger.info("Got a Signal. Shutting down.")
+        self.prediction_handler.shutdown()
 
     def run(self) -> None:
         """
         Method for serving the app
         """
+        # Only needed when the app serves itself, gunicorn brings its own worker
+        import uvicorn  # pylint: disable=import-outside-toplevel
+
         config = uvicorn.Config(
             app=self,
             host="0.0.0.0",
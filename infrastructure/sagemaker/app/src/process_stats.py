@@ -0,0 +1,51 @@
+"""
+Memory and CPU use of processes
+"""
+
+import os
+
+
+def memory_usage() -> dict[str, float]:
+    """
+    Memory use of the current process in MB. PSS splits pages shared with other
+    processes between them, so the PSS of all workers adds up to their real footprint.
+
+    Returns:
+        dict[str, float]: RSS, PSS and shared memory, empty where /proc is not available
+    """
+    values = {}
+    try:
+        with open("/proc/self/smaps_rollup", encoding="utf-8") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty"):
+                    values[key] = int(value.split()[0]) / 1024
+    except OSError:
+        return {}
+    return {
+        "rss_mb": values["Rss"],
+        "pss_mb": values["Pss"],
+        "shared_mb": values["Shared_Clean"] + values["Shared_Dirty"],
+    }
+
+
+def cpu_seconds(pid: int) -> float:
+    """
+    CPU time used by a process and, recursively, its live child processes
+
+    Args:
+        pid (int): Process id
+
+    Returns:
+        float: User plus system time in seconds, 0 where /proc is not available
+    """
+    try:
+        with open(f"/proc/{pid}/stat", encoding="utf-8") as f:
+            # Fields after the parenthesised command name, which may contain spaces
+            fields = f.read().rpartition(")")[2].split()
+        with open(f"/proc/{pid}/task/{pid}/children", encoding="utf-8") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        return 0.0
+    seconds = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    return seconds + sum(cpu_seconds(child) for child in children)
@@ -0,0 +1,321 @@
+"""
+Sampled profiling of prediction requests, to see which Python frames a slow
+request spent its time in. A thread takes the stacks of the event loop thread
+and the inference threads every few milliseconds while profiled requests are in
+progress. The stacks of a request which was sampled, one in sample_every, or
+which took at least slow_ms are written to a file in the collapsed stack format
+of flame graph tools, one line per stack with frames separated by semicolons and
+followed by the number of samples:
+
+    <directory>/<time>-<pid>-<request number>-<reason>-<milliseconds>ms.collapsed
+
+The samples include other requests in progress at the same time. Files are
+written in a thread, so that the response of the request is not held up by it.
+When profiling is off, requests only pay for an empty context manager.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+import contextlib
+from typing import Any
+from logging import Logger
+from pathlib import Path
+from collections import Counter
+
+from inference_executor import THREAD_NAME_PREFIX
+
+NO_PROFILE = contextlib.nullcontext()
+
+
+def collapse_stack(thread_name: str, frame: Any) -> str:
+    """
+    A stack in collapsed form, rooted at the thread name
+
+    Args:
+        thread_name (str): Name of the thread
+        frame (Any): Innermost frame of the thread
+
+    Returns:
+        str: Frames from the outermost to the innermost, separated by semicolons
+    """
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        filename = "/".join(Path(code.co_filename).parts[-2:])
+        frames.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    frames.append(thread_name)
+    return ";".join(reversed(frames))
+
+
+class RequestProfile:
+    """
+    Stack samples of one request, taken while it is in progress
+    """
+
+    def __init__(self, profiler: "RequestProfiler", number: int, sampled: bool) -> None:
+        """
+        Args:
+            profiler (RequestProfiler): Profiler taking the samples
+            number (int): Number of the request in this worker
+            sampled (bool): Whether the request was sampled, otherwise it is only
+                kept if it is slow
+        """
+        self.profiler = profiler
+        self.number = number
+        self.sampled = sampled
+        self.thread_id = threading.get_ident()
+        self.stacks: Counter[str] = Counter()
+        self.start = 0.0
+
+    def __enter__(self) -> "RequestProfile":
+        self.start = time.perf_counter()
+        self.profiler.add(self)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.profiler.remove(self)
+        self.profiler.finish(self, time.perf_counter() - self.start)
+
+
+class RequestProfiler:
+    """
+    Profiles one in sample_every requests and keeps the profiles of requests
+    taking at least slow_ms. With slow_ms set every request is sampled while
+    in progress, as it is only known at the end whether it is slow.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        sample_every: int,
+        slow_ms: float,
+        interval_ms: float,
+        max_files: int,
+        logger: Logger,
+    ) -> None:
+        """
+        Args:
+            directory (str | Path): Directory of the profile files
+            sample_every (int): Profile one in this many requests, 0 for none
+            slow_ms (float): Keep the profiles of requests taking at least this
+                many milliseconds, 0 for none
+            interval_ms (float): Milliseconds between stack samples
+            max_files (int): Largest number of files this worker writes, further
+                profiles are discarded
+            logger (Logger): logger object
+        """
+        self.directory = Path(directory)
+        self.sample_every = sample_every
+        self.slow_ms = slow_ms
+        self.interval_ms = interval_ms
+        self.max_files = max_files
+        self.logger = logger
+        self.requests = 0
+        self.profiled = 0
+        self.written_files = 0
+        self.discarded = 0
+        self.samples = 0
+        self._reset()
+        # Forked workers start without profiles and with a sampler thread of their own
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        """
+        Start without profiles in progress and no sampler thread in the current process
+        """
+        self._lock = threading.Lock()
+        self._active: list[RequestProfile] = []
+        self._wake_up = threading.Event()
+        self._sampler: threading.Thread | None = None
+        self._sampler_pid: int | None = None
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Whether any request is profiled
+        """
+        return self.sample_every > 0 or self.slow_ms > 0
+
+    def configure(self, sample_every: int | None = None, slow_ms: float | None = None) -> None:
+        """
+        Change the selection of profiled requests
+
+        Args:
+            sample_every (int | None, optional): Profile one in this many requests,
+                0 for none. Defaults to no change.
+            slow_ms (float | None, optional): Keep the profiles of requests taking at
+                least this many milliseconds, 0 for none. Defaults to no change.
+        """
+        if sample_every is not None:
+            self.sample_every = sample_every
+        if slow_ms is not None:
+            self.slow_ms = slow_ms
+        self.logger.info(
+            "Profiling one in %s requests and requests slower than %s ms in worker %s",
+            self.sample_every,
+            self.slow_ms,
+            os.getpid(),
+        )
+
+    def profile(self) -> contextlib.AbstractContextManager:
+        """
+        Context manager around a request, profiling it if it is selected
+
+        Returns:
+            contextlib.AbstractContextManager: The profile, or an empty context manager
+        """
+        if not self.enabled:
+            return NO_PROFILE
+        self.requests += 1
+        sampled = self.sample_every > 0 and self.requests % self.sample_every == 0
+        if not sampled and self.slow_ms <= 0:
+            return NO_PROFILE
+        return RequestProfile(self, self.requests, sampled)
+
+    def add(self, profile: RequestProfile) -> None:
+        """
+        Start sampling the stacks for a profile
+
+        Args:
+            profile (RequestProfile): Profile of a request which starts
+        """
+        with self._lock:
+            if self._sampler_pid != os.getpid():
+                self._sampler_pid = os.getpid()
+                self._sampler = threading.Thread(
+                    target=self._sample_periodically, name="profiler", daemon=True
+                )
+                self._sampler.start()
+            self._active.append(profile)
+        self._wake_up.set()
+
+    def remove(self, profile: RequestProfile) -> None:
+        """
+        Stop sampling the stacks for a profile
+
+        Args:
+            profile (RequestProfile): Profile of a request which is done
+        """
+        with self._lock:
+            self._active.remove(profile)
+
+    def _sample_periodically(self) -> None:
+        """
+        Take samples while profiles are in progress, run in the sampler thread
+        """
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._wake_up.clear()
+            self._wake_up.wait()
+            time.sleep(self.interval_ms / 1000)
+            self.sample()
+
+    def sample(self) -> None:
+        """
+        Add the current stacks of the event loop threads of the profiled requests
+        and of the inference threads to the profiles in progress
+        """
+        with self._lock:
+            active = list(self._active)
+        if not active:
+            return
+        frames = sys._current_frames()  # pylint: disable=protected-access
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        thread_ids = {profile.thread_id for profile in active} | {
+            ident for ident, name in names.items() if name.startswith(THREAD_NAME_PREFIX)
+        }
+        stacks = [
+            collapse_stack(names.get(ident, str(ident)), frames[ident])
+            for ident in thread_ids
+            if ident in frames
+        ]
+        self.samples += 1
+        # Under the lock, so that profiles which are done no longer change
+        with self._lock:
+            for profile in self._active:
+                profile.stacks.update(stacks)
+
+    def finish(self, profile: RequestProfile, seconds: float) -> Path | None:
+        """
+        Write the profile of a request if it was sampled or is slow. On the event
+        loop the file is written by a thread of the loop's default executor.
+
+        Args:
+            profile (RequestProfile): Profile of a request which is done
+            seconds (float): Duration of the request
+
+        Returns:
+            Path | None: The file, None if the profile is not kept
+        """
+        milliseconds = seconds * 1000
+        slow = 0 < self.slow_ms <= milliseconds
+        if not (profile.sampled or slow):
+            return None
+        self.profiled += 1
+        if not profile.stacks or self.written_files >= self.max_files:
+            self.discarded += 1
+            return None
+        reason = "slow" if slow else "sampled"
+        name = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        path = self.directory / (
+            f"{name}-{os.getpid()}-{profile.number}-{reason}-{milliseconds:.0f}ms.collapsed"
+        )
+        content = "".join(f"{stack} {count}\n" for stack, count in profile.stacks.items())
+        # Counted before it is written, so that files written at once stay within max_files
+        self.written_files += 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.write(path, content)
+        else:
+            loop.run_in_executor(None, self.write, path, content)
+        return path
+
+    def write(self, path: Path, content: str) -> bool:
+        """
+        Write a profile file
+
+        Args:
+            path (Path): The file
+            content (str): Collapsed stacks
+
+        Returns:
+            bool: Whether the file was written
+        """
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path.write_text(content, encoding="utf-8")
+        except OSError:
+            self.logger.error("Failed to write profile %s", path, exc_info=True)
+            with self._lock:
+                self.written_files -= 1
+                self.discarded += 1
+            return False
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Settings and counters of this worker
+
+        Returns:
+            dict[str, Any]: Profiler stats
+        """
+        return {
+            "pid": os.getpid(),
+            "directory": str(self.directory),
+            "sample_every": self.sample_every,
+            "slow_ms": self.slow_ms,
+            "interval_ms": self.interval_ms,
+            "max_files": self.max_files,
+            "requests": self.requests,
+            "in_progress": len(self._active),
+            "samples": self.samples,
+            "profiled": self.profiled,
+            "written_files": self.written_files,
+            "discarded": self.discarded,
+        }
@@ -0,0 +1,108 @@
+"""
+Readiness of a worker to take prediction requests. A worker is ready once its
+models are loaded and it has run a warm-up pass through its own inference path,
+so that the first real requests do not pay for first-call allocations: the
+inference threads, XGBoost's thread pool and the buffers of each batch size.
+With preload_app the models are loaded in the gunicorn master, but threads are
+not inherited by forked workers, so every worker warms up after it starts.
+"""
+
+import time
+from typing import Any
+
+import pandas as pd
+from synthetic_data import create_random_request
+
+STATES = ("loading", "warming_up", "ready", "failed", "stopping")
+
+
+def warmup_frames(batch_sizes: list[int]) -> dict[int, pd.DataFrame]:
+    """
+    Synthetic input data in the request schema, one frame per batch size
+
+    Args:
+        batch_sizes (list[int]): Numbers of rows
+
+    Returns:
+        dict[int, pd.DataFrame]: Input data without prediction ids by number of rows
+    """
+    return {
+        n_rows: pd.DataFrame(create_random_request(n_rows=n_rows, seed=n_rows)).drop(
+            columns=["prediction_id"]
+        )
+        for n_rows in batch_sizes
+    }
+
+
+class Readiness:
+    """
+    State of the worker from startup to shutdown, with the duration of its warm-up
+    """
+
+    def __init__(self) -> None:
+        self.state = "loading"
+        self.started_at = time.time()
+        self.ready_at: float | None = None
+        self.warmup_seconds: float | None = None
+        self.warmup_batch_seconds: dict[int, float] = {}
+        self.error: str | None = None
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether the worker should get prediction requests
+        """
+        return self.state == "ready"
+
+    def set_warming_up(self) -> None:
+        """
+        The models are loaded and the warm-up pass starts
+        """
+        self.state = "warming_up"
+
+    def set_ready(self, batch_seconds: dict[int, float]) -> None:
+        """
+        The warm-up pass is done
+
+        Args:
+            batch_seconds (dict[int, float]): Seconds of the warm-up call per batch size
+        """
+        self.warmup_batch_seconds = batch_seconds
+        self.warmup_seconds = sum(batch_seconds.values())
+        self.ready_at = time.time()
+        self.state = "ready"
+
+    def set_failed(self, error: Exception) -> None:
+        """
+        The warm-up pass failed, the worker stays unready
+
+        Args:
+            error (Exception): The reason
+        """
+        self.error = repr(error)
+        self.state = "failed"
+
+    def set_stopping(self) -> None:
+        """
+        The worker shuts down and should get no further requests
+        """
+        self.state = "stopping"
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Description of the readiness
+
+        Returns:
+            dict[str, Any]: State, seconds from the start of loading the models
+                to ready, and warm-up seconds in total and per batch size
+        """
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "startup_seconds": (None if self.ready_at is None else self.ready_at - self.started_at),
+            "warmup_seconds": self.warmup_seconds,
+            "warmup_batch_seconds": {
+                str(n_rows): seconds for n_rows, seconds in self.warmup_batch_seconds.items()
+            },
+            "error": self.error,
+        }
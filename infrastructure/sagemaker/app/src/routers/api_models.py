@@ -2,7 +2,7 @@
 Data models
 """
 
-from pydantic import BaseModel
+from pydantic import Field, BaseModel
 
 
 class PredictionPostAPIModel(BaseModel):
@@ -24,3 +24,43 @@ class PredictionPostAPIModel(BaseModel):
     arrival_min: list[int]
     duration_hours: list[int]
     duration_min: list[int]
+
+
+class PredictionRowAPIModel(BaseModel):
+    """
+    Data model for a single row of streamed prediction service input
+    """
+
+    prediction_id: str | int
+    airline: str
+    source: str
+    destination: str
+    total_stops: int
+    date: int
+    month: int
+    year: int
+    dep_hours: int
+    dep_min: int
+    arrival_hours: int
+    arrival_min: int
+    duration_hours: int
+    duration_min: int
+
+
+class ModelVersionAPIModel(BaseModel):
+    """
+    Data model for loading a model version
+    """
+
+    model_uri: str
+    name: str | None = None
+    default: bool = False
+
+
+class ProfilingAPIModel(BaseModel):
+    """
+    Data model for changing which prediction requests are profiled
+    """
+
+    sample_every: int | None = Field(default=None, ge=0)
+    slow_ms: float | None = Field(default=None, ge=0)
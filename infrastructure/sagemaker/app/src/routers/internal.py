@@ -4,23 +4,52 @@ Routes for checking status.
 
 from http import HTTPStatus
 
-from fastapi import APIRouter
+import metrics
+from fastapi import Request, APIRouter
+from fastapi.responses import Response, JSONResponse, PlainTextResponse
 
 router = APIRouter()
 
 
+def readiness_response(req: Request) -> Response:
+    """
+    Empty response if the worker is ready, its readiness with 503 otherwise
+
+    Args:
+        req (Request): Status check request
+
+    Returns:
+        Response: 204 when ready, 503 while the model is loading or warming up,
+            after the warm-up failed and during shutdown
+    """
+    readiness = req.app.state.readiness
+    if readiness.ready:
+        return Response(status_code=HTTPStatus.NO_CONTENT)
+    return JSONResponse(content=readiness.stats(), status_code=HTTPStatus.SERVICE_UNAVAILABLE)
+
+
 @router.get("/ping", status_code=HTTPStatus.NO_CONTENT)
-async def ping() -> None:
+async def ping(req: Request) -> Response:
+    """
+    Service healthy check by SageMaker, which only sends requests once the model is warm
+    """
+    return readiness_response(req)
+
+
+@router.get("/metrics", status_code=HTTPStatus.OK)
+async def prometheus_metrics() -> PlainTextResponse:
     """
-    Service alive check by SageMaker
+    Latency histograms and error counters of all workers in Prometheus text format
     """
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 
 @router.get("/internal/ready", status_code=HTTPStatus.NO_CONTENT)
-async def ready() -> None:
+async def ready(req: Request) -> Response:
     """
-    Service ready after startup check by Kubernetes
+    Service ready after startup check by Kubernetes, once the model is loaded and warm
     """
+    return readiness_response(req)
 
 
 @router.get("/internal/live", status_code=HTTPStatus.NO_CONTENT)
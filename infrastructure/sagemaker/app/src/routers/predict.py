@@ -2,16 +2,37 @@
 A FastAPI wrapper around the prediction model
 """
 
+import time
 from http import HTTPStatus
 from json import JSONDecodeError
 from logging import Logger
+from functools import partial
 
-import mlflow
+import numpy as np
 import pandas as pd
+import metrics
+import streaming
+import serialization
+import columnar_validation
+from config import AppSettings
+from shadow import ShadowScorer
+from capture import InferenceCapture
 from fastapi import Request, APIRouter, HTTPException, status
-from fastapi.responses import JSONResponse
+from tracing import TRACE_ID_HEADER, Tracer
+from admission import REQUEST_START_HEADER, AdmissionRejected, AdmissionController
+from profiling import RequestProfiler
+from readiness import Readiness
+from model_loader import ModelLoader
+from native_model import ModelLoadError
+from model_manager import ModelManager
+from model_registry import ModelVersion, ModelRegistryError
+from fastapi.responses import Response, JSONResponse
+from inference_executor import InferenceExecutor, InferenceQueueFull
+from starlette.background import BackgroundTask
 
-from .api_models import PredictionPostAPIModel
+from .api_models import ProfilingAPIModel, ModelVersionAPIModel, PredictionPostAPIModel
+
+MODEL_VERSION_HEADER = "X-Model-Version"
 
 
 class Handler:
@@ -19,15 +40,101 @@ class Handler:
     A FastAPI wrapper around the prediction model
     """
 
-    def __init__(self, mlflow_model_uri: str, logger: Logger) -> None:
+    def __init__(self, settings: AppSettings, logger: Logger) -> None:
         """
         Args:
-            mlflow_model_uri (str): URI to the mlflow model
+            settings (AppSettings): Object containing model uri and inference settings
             logger (Logger): logger object
         """
         self.router = APIRouter()
         self.logger = logger
-        self.mlflow_model_uri = mlflow_model_uri
+
+        self.executor = InferenceExecutor(
+            max_workers=settings.inference_workers,
+            max_in_flight=settings.inference_max_in_flight,
+        )
+        self.router.add_api_route(
+            "/internal/inference",
+            self.inference_stats,
+            methods=["GET"],
+            status_code=HTTPStatus.OK,
+        )
+
+        self.admission = AdmissionController(
+            max_body_bytes=settings.admission_max_body_bytes,
+            max_rows=settings.admission_max_rows,
+            max_in_flight_rows=settings.admission_max_in_flight_rows,
+            max_queue_ms=settings.admission_max_queue_ms,
+            deadline_ms=settings.request_deadline_ms,
+        )
+        self.router.add_api_route(
+            "/internal/admission",
+            self.admission_stats,
+            methods=["GET"],
+            status_code=HTTPStatus.OK,
+        )
+
+        self.profiler = RequestProfiler(
+            settings.profile_dir,
+            sample_every=settings.profile_sample_every,
+            slow_ms=settings.profile_slow_ms,
+            interval_ms=settings.profile_interval_ms,
+            max_files=settings.profile_max_files,
+            logger=self.logger,
+        )
+        self.router.add_api_route(
+            "/internal/profiling",
+            self.profiling_stats,
+            methods=["GET"],
+            status_code=HTTPStatus.OK,
+        )
+        self.router.add_api_route(
+            "/internal/profiling",
+            self.configure_profiling,
+            methods=["POST"],
+            status_code=HTTPStatus.OK,
+        )
+
+        self.tracer = Tracer.create(settings.trace_exporter, settings.trace_file, self.logger)
+        self.trace_header = settings.trace_header
+
+        self.settings = settings
+        self.shadow: ShadowScorer | None = None
+        self.capture = None
+        if settings.capture_dir:
+            self.capture = InferenceCapture(
+                settings.capture_dir,
+                max_buffered_rows=settings.capture_buffer_rows,
+                flush_interval_s=settings.capture_flush_interval_s,
+                logger=self.logger,
+            )
+            self.router.add_api_route(
+                "/internal/capture",
+                self.capture_stats,
+                methods=["GET"],
+                status_code=HTTPStatus.OK,
+            )
+        self.readiness = Readiness()
+        self.router.add_api_route(
+            "/internal/readiness",
+            self.readiness_stats,
+            methods=["GET"],
+            status_code=HTTPStatus.OK,
+        )
+        if settings.batching_enabled:
+            self.router.add_api_route(
+                "/internal/batching",
+                self.batching_stats,
+                methods=["GET"],
+                status_code=HTTPStatus.OK,
+            )
+        if settings.prediction_cache_enabled:
+            self.router.add_api_route(
+                "/internal/cache",
+                self.cache_stats,
+                methods=["GET"],
+                status_code=HTTPStatus.OK,
+            )
 
         self.router.add_api_route(
             "/invocations",
@@ -36,48 +143,150 @@ class Handler:
             status_code=HTTPStatus.OK,
         )
 
-        self.load_model(self.mlflow_model_uri)
+        # Chunks of streamed requests are admitted like requests, so they fit in ADMISSION_MAX_ROWS
+        self.stream_chunk_rows = min(
+            settings.stream_chunk_rows, settings.admission_max_rows or settings.stream_chunk_rows
+        )
+        self.router.add_api_route(
+            "/invocations/stream",
+            self.predict_stream,
+            methods=["POST"],
+            status_code=HTTPStatus.OK,
+        )
 
-    def load_model(self, mlflow_model_uri: str) -> None:
+        loader = ModelLoader(
+            settings,
+            executor=self.executor,
+            cache_fields=[
+                field for field in PredictionPostAPIModel.model_fields if field != "prediction_id"
+            ],
+            trace_features=self.tracer.enabled,
+            logger=self.logger,
+        )
+        self.models = ModelManager(settings, loader=loader, logger=self.logger)
+        self.router.add_api_route(
+            "/internal/models",
+            self.models_stats,
+            methods=["GET"],
+            status_code=HTTPStatus.OK,
+        )
+        self.router.add_api_route(
+            "/internal/models",
+            self.add_model_version,
+            methods=["POST"],
+            status_code=HTTPStatus.OK,
+        )
+        self.router.add_api_route(
+            "/internal/models/{name:path}",
+            self.remove_model_version,
+            methods=["DELETE"],
+            status_code=HTTPStatus.NO_CONTENT,
+        )
+
+        if settings.model_manifest_path:
+            self.router.add_event_handler("startup", self.models.start_manifest_watcher)
+
+        if settings.shadow_model_uri:
+            self.shadow = loader.create_shadow(settings.shadow_model_uri)
+            self.router.add_api_route(
+                "/internal/shadow",
+                self.shadow_stats,
+                methods=["GET"],
+                status_code=HTTPStatus.OK,
+            )
+        # After the manifest watcher, so that the worker is only ready once all of it is up
+        self.router.add_event_handler("startup", self.warm_up)
+
+    async def warm_up(self) -> None:
+        """
+        Warm up the inference path of this worker and report ready afterwards.
+        Runs before the worker accepts connections.
         """
-        Loads the pipeline from the mlflow uri
+        await self.models.warm_up(self.readiness)
+
+    def select_version(self, req: Request) -> ModelVersion:
+        """
+        The model version named in the request's version header, or the default version
 
         Args:
-            mlflow_model_uri (str): uri to the model
+            req (Request): Prediction request
 
         Raises:
-            e: MlflowException
+            HTTPException: If the requested version is not loaded
+
+        Returns:
+            ModelVersion: The version to predict with
         """
-        self.logger.info("Loading mlflow model")
+        name = req.headers.get(MODEL_VERSION_HEADER)
         try:
-            self.model = mlflow.pyfunc.load_model(mlflow_model_uri)
-        except mlflow.MlflowException as e:
-            self.logger.error(
-                msg="Failed to load model. Exiting.",
-                exc_info=True,
-            )
-            raise e
+            model_version = self.models.get(name)
+        except KeyError as e:
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND,
+                detail=f"Model version {name} is not loaded. "
+                f"Loaded: {list(self.models.registry.versions)}",
+            ) from e
+        model_version.requests += 1
+        return model_version
 
-    async def predict(self, req: Request) -> JSONResponse:
+    def reserve_slot(self) -> None:
         """
-        Method for predicting the flight price given a request with
-        data.
+        Reserve an inference slot for a request
+
+        Raises:
+            HTTPException: If max_in_flight requests are already in progress
+        """
+        try:
+            self.executor.reserve_slot()
+        except InferenceQueueFull as e:
+            self.admission.count_shed("shed_in_flight_requests")
+            self.logger.warning("Rejecting request: %s", e)
+            raise HTTPException(
+                status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                detail="Too many requests in progress, try again later",
+                headers={"Retry-After": "1"},
+            ) from e
+
+    def shed(self, e: AdmissionRejected) -> HTTPException:
+        """
+        Response for a request which was not admitted. Requests shed because
+        of load get a Retry-After header.
 
         Args:
-            req (Request): _description_
+            e (AdmissionRejected): Reason the request was not admitted
+
+        Returns:
+            HTTPException: Exception to raise
+        """
+        self.logger.warning("Rejecting request: %s", e)
+        return HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": "1"} if e.retry else None,
+        )
+
+    def parse_model_body(self, body: bytes, media_type: str) -> pd.DataFrame:
+        """
+        Parse and validate a JSON or MessagePack body with the fields of PredictionPostAPIModel
+
+        Args:
+            body (bytes): Request body
+            media_type (str): serialization.JSON or serialization.MSGPACK
 
         Raises:
-            HTTPException: _description_
-            HTTPException: _description_
-            HTTPException: _description_
-            HTTPException: _description_
+            HTTPException: If the body can not be parsed or fails validation
 
         Returns:
-            dict[str, list[dict[str, Any]]]: _description_
+            pd.DataFrame: Request data including prediction ids
         """
-        body = await req.body()
         try:
-            data = PredictionPostAPIModel.model_validate_json(body)
+            with metrics.STAGE_SECONDS.time("validation"):
+                if media_type == serialization.MSGPACK:
+                    columns = columnar_validation.validate_columns(
+                        serialization.decode_msgpack(body)
+                    )
+                else:
+                    columns = columnar_validation.parse_json_columns(body)
         except UnicodeDecodeError as e:
             self.logger.error(
                 msg="Failed to deserialize JSON body, data is not UTF-8 encoded",
@@ -97,36 +306,422 @@ class Handler:
                 detail=f"Request body must be valid UTF-8 encoded JSON. Details: {str(e)}",
             ) from e
         except ValueError as e:
-            self.logger.error(
-                msg="Failed to deserialize JSON body",
-                exc_info=True,
-            )
+            self.logger.error("Request body validation failed: %s", e)
             raise HTTPException(
                 status_code=HTTPStatus.BAD_REQUEST,
-                detail="Request body validation failed",
+                detail=f"Request body validation failed. Details: {str(e)}",
             ) from e
-        pred_ids = data.prediction_id
+        with metrics.STAGE_SECONDS.time("dataframe"):
+            return pd.DataFrame(columns, copy=False)
+
+    def parse_table_body(self, body: bytes, media_type: str) -> pd.DataFrame:
+        """
+        Parse and validate an Arrow IPC or CSV body
+
+        Args:
+            body (bytes): Request body
+            media_type (str): serialization.ARROW or serialization.CSV
+
+        Raises:
+            HTTPException: If the body can not be parsed or fails validation
+
+        Returns:
+            pd.DataFrame: Request data including prediction ids
+        """
         try:
-            df = pd.DataFrame(data.model_dump())
-        except ValueError as e:
+            with metrics.STAGE_SECONDS.time("validation"):
+                if media_type == serialization.ARROW:
+                    return serialization.decode_arrow(body)
+                return serialization.decode_csv(body)
+        except (ValueError, TypeError) as e:
             self.logger.error(
-                "Incorrect input data. All data arrays must be of same length.", exc_info=True
+                msg=f"Failed to deserialize {media_type} body",
+                exc_info=True,
             )
             raise HTTPException(
                 status_code=HTTPStatus.BAD_REQUEST,
-                detail="Incorrect input data. All data arrays must be of same length.",
+                detail=f"Request body validation failed. Details: {str(e)}",
             ) from e
-        df = df.drop(columns=["prediction_id"])
-        preds = self.model.predict(df)
+
+    async def predict(self, req: Request) -> Response:
+        """
+        Method for predicting the flight price given a request with
+        data. The request format is picked from the Content-Type header
+        and the response format from the Accept header, both defaulting to JSON.
+        Accepting serialization.COLUMNAR_JSON returns the predictions as one list
+        instead of one object per prediction. The X-Model-Version header selects
+        a loaded model version other than the default. Requests to the default
+        version may also be scored by the shadow model, after their predictions are made.
+        With capture enabled, the inputs and predictions are kept for monitoring.
+        Selected requests are profiled. With tracing on, the request's spans continue
+        the trace of the trace header, and the response carries the trace id.
+
+        Args:
+            req (Request): Request with one list or column per input field
+
+        Raises:
+            HTTPException: If the body is invalid, the model version is not loaded,
+                or the request is not admitted
+
+        Returns:
+            Response: One prediction per prediction id
+        """
+        with (
+            self.tracer.trace("invocations", req.headers.get(self.trace_header)) as trace_span,
+            metrics.time_request(),
+            self.profiler.profile(),
+        ):
+            media_type = serialization.parse_content_type(req.headers.get("content-type"))
+            response_media_type = serialization.negotiate_accept(req.headers.get("accept"))
+
+            model_version = self.select_version(req)
+            trace_span.set_trace_attribute("model_version", model_version.name)
+            try:
+                waited = self.admission.check_arrival(
+                    req.headers.get(REQUEST_START_HEADER), req.headers.get("content-length")
+                )
+            except AdmissionRejected as e:
+                raise self.shed(e) from e
+            arrived = time.perf_counter()
+            self.reserve_slot()
+            try:
+                with metrics.STAGE_SECONDS.time("body_read"):
+                    body = await req.body()
+                try:
+                    self.admission.check_body_size(len(body))
+                except AdmissionRejected as e:
+                    raise self.shed(e) from e
+                if media_type in (serialization.JSON, serialization.MSGPACK):
+                    df = self.parse_model_body(body, media_type)
+                else:
+                    df = self.parse_table_body(body, media_type)
+                n_rows = len(df)
+                metrics.REQUEST_ROWS.observe(n_rows)
+                trace_span.set_trace_attribute("rows", n_rows)
+                admitted = time.perf_counter()
+                try:
+                    self.admission.admit(n_rows, waited + admitted - arrived)
+                except AdmissionRejected as e:
+                    raise self.shed(e) from e
+                try:
+                    pred_ids = df["prediction_id"].tolist()
+                    df = df.drop(columns=["prediction_id"])
+                    preds = await model_version.predict(df)
+                except BaseException:
+                    self.admission.release(n_rows)
+                    raise
+                self.admission.release(n_rows, time.perf_counter() - admitted)
+            finally:
+                self.executor.release_slot()
+            if self.capture is not None:
+                self.capture.record(
+                    df, pred_ids, preds, model_version.name, model_version.model_uri
+                )
+            if self.shadow is not None and model_version.name == self.models.registry.default_name:
+                self.shadow.submit(df, preds)
+
+            with metrics.STAGE_SECONDS.time("serialization"):
+                response = self.encode_response(response_media_type, pred_ids, preds, model_version)
+            if trace_span.trace_id is not None:
+                response.headers[TRACE_ID_HEADER] = trace_span.trace_id
+            return response
+
+    def encode_response(
+        self,
+        media_type: str,
+        pred_ids: list[str | int],
+        preds: np.ndarray,
+        model_version: ModelVersion,
+    ) -> Response:
+        """
+        Response with the predictions of a request
+
+        Args:
+            media_type (str): One of serialization.RESPONSE_MEDIA_TYPES
+            pred_ids (list[str | int]): Prediction ids of the request
+            preds (np.ndarray): Predictions in the order of pred_ids
+            model_version (ModelVersion): Version which made the predictions
+
+        Returns:
+            Response: The encoded predictions
+        """
+        if media_type != serialization.JSON:
+            return Response(
+                content=serialization.encode_predictions(
+                    media_type=media_type,
+                    pred_ids=pred_ids,
+                    preds=preds,
+                    model_name='flight-price-prediction',
+                    model_version=model_version.model_uri,
+                ),
+                media_type=media_type,
+                status_code=status.HTTP_200_OK,
+                headers={MODEL_VERSION_HEADER: model_version.name},
+            )
         predictions = [
             {
                 'model': 'flight-price-prediction',
-                'version': self.mlflow_model_uri,
+                'version': model_version.model_uri,
                 'prediction': {
-                    'ride_duration': pred.item(),
+                    'ride_duration': pred,
                     'ride_id': pred_id,
                 },
             }
-            for pred_id, pred in zip(pred_ids, preds)
+            for pred_id, pred in zip(pred_ids, preds.tolist())
         ]
-        return JSONResponse(content={"predictions": predictions}, status_code=status.HTTP_200_OK)
+        return JSONResponse(
+            content={"predictions": predictions},
+            status_code=status.HTTP_200_OK,
+            headers={MODEL_VERSION_HEADER: model_version.name},
+        )
+
+    async def predict_stream(self, req: Request) -> streaming.RequestStreamingResponse:
+        """
+        Scores a streamed body of NDJSON rows (default) or an Arrow IPC stream
+        (Content-Type application/vnd.apache.arrow.stream) in chunks, and streams
+        back the predictions of each chunk as soon as they are ready. The response
+        is NDJSON unless Arrow is preferred by the Accept header. Each chunk goes
+        through the row admission of /invocations. Invalid input, and chunks which
+        are not admitted, end an NDJSON response with an error line, and cut off an
+        Arrow response without end marker.
+
+        Args:
+            req (Request): Request with a streamed body
+
+        Raises:
+            HTTPException: If the model version is not loaded or the request is not admitted
+
+        Returns:
+            streaming.RequestStreamingResponse: Predictions in input order
+        """
+        model_version = self.select_version(req)
+        try:
+            self.admission.check_arrival(req.headers.get(REQUEST_START_HEADER), None)
+        except AdmissionRejected as e:
+            raise self.shed(e) from e
+        content_type = (req.headers.get("content-type") or "").split(";")[0].strip().lower()
+        if content_type == streaming.ARROW:
+            reader = streaming.ArrowReader()
+        else:
+            reader = streaming.NdjsonReader()
+        response_media_type = serialization.negotiate_accept(
+            req.headers.get("accept"),
+            supported=streaming.SUPPORTED_MEDIA_TYPES,
+            default=streaming.NDJSON,
+        )
+        if response_media_type == streaming.ARROW:
+            writer = streaming.ArrowWriter('flight-price-prediction', model_version.model_uri)
+        else:
+            writer = streaming.NdjsonWriter('flight-price-prediction', model_version.model_uri)
+
+        self.reserve_slot()
+        return streaming.RequestStreamingResponse(
+            streaming.score_stream(
+                body=req.stream(),
+                reader=reader,
+                writer=writer,
+                infer=partial(self.predict_chunk, model_version=model_version),
+                chunk_rows=self.stream_chunk_rows,
+            ),
+            media_type=writer.media_type,
+            status_code=status.HTTP_200_OK,
+            headers={MODEL_VERSION_HEADER: model_version.name},
+            background=BackgroundTask(self.executor.release_slot),
+        )
+
+    async def predict_chunk(self, df: pd.DataFrame, model_version: ModelVersion) -> np.ndarray:
+        """
+        Predict a chunk of a streamed request once its rows are admitted, as those
+        of a request which arrives now
+
+        Args:
+            df (pd.DataFrame): Input data without prediction ids
+            model_version (ModelVersion): Version to predict with
+
+        Raises:
+            ValueError: If the rows are not admitted, which ends the stream
+
+        Returns:
+            np.ndarray: One prediction per row
+        """
+        n_rows = len(df)
+        try:
+            self.admission.admit(n_rows, 0.0)
+        except AdmissionRejected as e:
+            self.logger.warning("Rejecting stream chunk: %s", e)
+            raise ValueError(f"Rows not admitted. Details: {e.detail}") from e
+        admitted = time.perf_counter()
+        try:
+            preds = await model_version.predict(df)
+        except BaseException:
+            self.admission.release(n_rows)
+            raise
+        self.admission.release(n_rows, time.perf_counter() - admitted)
+        return preds
+
+    async def inference_stats(self) -> JSONResponse:
+        """
+        Counters and gauges of the inference executor
+
+        Returns:
+            JSONResponse: Limits, model threads, in-flight requests, queue depth and
+                call counters
+        """
+        return JSONResponse(
+            content={**self.executor.stats(), "model_threads": self.settings.model_threads},
+            status_code=status.HTTP_200_OK,
+        )
+
+    async def admission_stats(self) -> JSONResponse:
+        """
+        Admission limits, rows in progress and decision counters of this worker
+
+        Returns:
+            JSONResponse: Admission stats
+        """
+        return JSONResponse(content=self.admission.stats(), status_code=status.HTTP_200_OK)
+
+    async def capture_stats(self) -> JSONResponse:
+        """
+        Buffer size and row counters of the inference capture in this worker
+
+        Returns:
+            JSONResponse: Capture stats
+        """
+        return JSONResponse(content=self.capture.stats(), status_code=status.HTTP_200_OK)
+
+    async def shadow_stats(self) -> JSONResponse:
+        """
+        Outcomes, latency and prediction differences of the shadow model in this worker
+
+        Returns:
+            JSONResponse: Shadow scoring stats
+        """
+        return JSONResponse(content=self.shadow.stats(), status_code=status.HTTP_200_OK)
+
+    def shutdown(self) -> None:
+        """
+        Report unready, stop the manifest watcher, the shadow scorer and the
+        inference executor, and write the captured requests and close the trace exporter
+        """
+        self.readiness.set_stopping()
+        self.models.stop()
+        if self.shadow is not None:
+            self.shadow.shutdown()
+        self.executor.shutdown()
+        if self.capture is not None:
+            self.capture.stop()
+        self.tracer.shutdown()
+
+    async def readiness_stats(self) -> JSONResponse:
+        """
+        Readiness and warm-up duration of this worker
+
+        Returns:
+            JSONResponse: State, seconds from start to ready and warm-up seconds per batch size
+        """
+        return JSONResponse(content=self.readiness.stats(), status_code=status.HTTP_200_OK)
+
+    async def profiling_stats(self) -> JSONResponse:
+        """
+        Settings and counters of the request profiler in this worker
+
+        Returns:
+            JSONResponse: Profiler stats
+        """
+        return JSONResponse(content=self.profiler.stats(), status_code=status.HTTP_200_OK)
+
+    async def configure_profiling(self, data: ProfilingAPIModel) -> JSONResponse:
+        """
+        Change which requests are profiled, in the worker which gets this request only
+
+        Args:
+            data (ProfilingAPIModel): Sampling rate and slow request threshold, None to keep
+
+        Returns:
+            JSONResponse: Profiler stats
+        """
+        self.profiler.configure(sample_every=data.sample_every, slow_ms=data.slow_ms)
+        return JSONResponse(content=self.profiler.stats(), status_code=status.HTTP_200_OK)
+
+    async def models_stats(self) -> JSONResponse:
+        """
+        The model versions loaded in this worker
+
+        Returns:
+            JSONResponse: Default version and uri, load time, memory and requests per version
+        """
+        return JSONResponse(content=self.models.registry.stats(), status_code=status.HTTP_200_OK)
+
+    async def add_model_version(self, data: ModelVersionAPIModel) -> JSONResponse:
+        """
+        Load a model version in the background and swap it in once it is warm,
+        replacing any version of the same name. Other workers follow through
+        the manifest, if one is configured.
+
+        Args:
+            data (ModelVersionAPIModel): uri, name and whether to make it the default
+
+        Raises:
+            HTTPException: If too many versions are loaded or the model can not be loaded
+
+        Returns:
+            JSONResponse: The loaded version
+        """
+        name = data.name or data.model_uri
+        try:
+            model_version = await self.models.add_version(name, data.model_uri, data.default)
+        except ModelRegistryError as e:
+            raise HTTPException(status_code=HTTPStatus.CONFLICT, detail=str(e)) from e
+        except ModelLoadError as e:
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail=f"Failed to load model {data.model_uri}. Details: {str(e)}",
+            ) from e
+        return JSONResponse(
+            content={"name": name, **model_version.stats()}, status_code=status.HTTP_200_OK
+        )
+
+    async def remove_model_version(self, name: str) -> Response:
+        """
+        Unload a model version. Other workers follow through the manifest, if
+        one is configured.
+
+        Args:
+            name (str): Name of the version
+
+        Raises:
+            HTTPException: If the version is not loaded or is the default version
+
+        Returns:
+            Response: Empty response
+        """
+        try:
+            await self.models.remove_version(name)
+        except KeyError as e:
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND, detail=f"Model version {name} is not loaded"
+            ) from e
+        except ModelRegistryError as e:
+            raise HTTPException(status_code=HTTPStatus.CONFLICT, detail=str(e)) from e
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+    async def batching_stats(self) -> JSONResponse:
+        """
+        Counters describing how full the coalesced batches of the default version are
+
+        Returns:
+            JSONResponse: Batch counters and averages
+        """
+        return JSONResponse(
+            content=self.models.get().batcher.stats(), status_code=status.HTTP_200_OK
+        )
+
+    async def cache_stats(self) -> JSONResponse:
+        """
+        Counters of the prediction cache of the default version
+
+        Returns:
+            JSONResponse: Cache size, limits and hit/miss counters
+        """
+        return JSONResponse(content=self.models.get().cache.stats(), status_code=status.HTTP_200_OK)
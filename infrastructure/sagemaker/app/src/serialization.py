@@ -0,0 +1,270 @@
+"""
+Request and response formats of the prediction service besides JSON:
+Arrow IPC streams, MessagePack and CSV, and columnar JSON responses.
+"""
+
+import io
+from typing import Any
+
+import numpy as np
+import orjson
+import pandas as pd
+import msgpack
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from routers.api_models import PredictionPostAPIModel
+
+JSON = "application/json"
+ARROW = "application/vnd.apache.arrow.stream"
+MSGPACK = "application/msgpack"
+CSV = "text/csv"
+COLUMNAR_JSON = "application/vnd.flight-price-prediction.columnar+json"
+
+MEDIA_TYPE_ALIASES = {
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+}
+# Arrow IPC files are decoded like streams, but responses are always streams
+REQUEST_MEDIA_TYPE_ALIASES = {
+    **MEDIA_TYPE_ALIASES,
+    "application/vnd.apache.arrow.file": ARROW,
+}
+REQUEST_MEDIA_TYPES = [JSON, ARROW, MSGPACK, CSV]
+# Request bodies are columnar JSON already, so columnar JSON is only a response format
+RESPONSE_MEDIA_TYPES = [*REQUEST_MEDIA_TYPES, COLUMNAR_JSON]
+
+INTEGER_FIELDS = [
+    name
+    for name, field in PredictionPostAPIModel.model_fields.items()
+    if field.annotation == list[int]
+]
+STRING_FIELDS = [
+    name
+    for name, field in PredictionPostAPIModel.model_fields.items()
+    if field.annotation == list[str]
+]
+
+
+def parse_content_type(content_type: str | None) -> str:
+    """
+    Media type of a Content-Type header. Bodies with a missing or any other
+    Content-Type, including COLUMNAR_JSON, are parsed as JSON, as before other
+    formats were supported.
+
+    Args:
+        content_type (str | None): Value of the Content-Type header
+
+    Returns:
+        str: One of REQUEST_MEDIA_TYPES
+    """
+    if not content_type:
+        return JSON
+    media_type = content_type.split(";")[0].strip().lower()
+    media_type = REQUEST_MEDIA_TYPE_ALIASES.get(media_type, media_type)
+    if media_type not in REQUEST_MEDIA_TYPES:
+        return JSON
+    return media_type
+
+
+def negotiate_accept(
+    accept: str | None, supported: list[str] | None = None, default: str = JSON
+) -> str:
+    """
+    Pick the response media type from an Accept header, respecting q-values.
+    A missing header, wildcards or only unsupported media types mean the default,
+    JSON unless given, as before other formats were supported.
+
+    Args:
+        accept (str | None): Value of the Accept header
+        supported (list[str] | None, optional): Media types to choose from.
+            Defaults to RESPONSE_MEDIA_TYPES.
+        default (str, optional): Media type of missing, wildcard or unmatched
+            headers. Defaults to JSON.
+
+    Returns:
+        str: One of supported, or default
+    """
+    supported = RESPONSE_MEDIA_TYPES if supported is None else supported
+    if not accept:
+        return default
+    candidates = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            candidates.append((-quality, position, media_type.lower()))
+
+    for _, _, media_type in sorted(candidates):
+        if media_type in ("*/*", "application/*"):
+            return default
+        media_type = MEDIA_TYPE_ALIASES.get(media_type, media_type)
+        if media_type in supported:
+            return media_type
+    return default
+
+
+def validate_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Check that a decoded table has all input fields with the expected types
+
+    Args:
+        df (pd.DataFrame): Decoded request data
+
+    Raises:
+        ValueError: If a field is missing, has missing values or the wrong type
+
+    Returns:
+        pd.DataFrame: The data with the input fields in the order of PredictionPostAPIModel
+    """
+    fields = list(PredictionPostAPIModel.model_fields)
+    missing_fields = [field for field in fields if field not in df.columns]
+    if missing_fields:
+        raise ValueError(f"Missing fields: {missing_fields}")
+    df = df[fields]
+    if df.isna().any().any():
+        raise ValueError(f"Missing values in fields: {df.columns[df.isna().any()].tolist()}")
+    for field in INTEGER_FIELDS:
+        if not pd.api.types.is_integer_dtype(df[field]):
+            raise ValueError(f"Field {field} must hold integers, got {df[field].dtype}")
+    for field in STRING_FIELDS:
+        if not pd.api.types.is_string_dtype(df[field]):
+            raise ValueError(f"Field {field} must hold strings, got {df[field].dtype}")
+    return df
+
+
+def decode_arrow(body: bytes) -> pd.DataFrame:
+    """
+    Decode an Arrow IPC stream into a dataframe. Integer columns are
+    converted without going through Python objects.
+
+    Args:
+        body (bytes): Arrow IPC stream with one column per input field
+
+    Returns:
+        pd.DataFrame: Validated request data
+    """
+    try:
+        table = pa.ipc.open_stream(body).read_all()
+    except pa.ArrowInvalid:
+        table = pa.ipc.open_file(pa.BufferReader(body)).read_all()
+    return validate_frame(table.to_pandas())
+
+
+def decode_csv(body: bytes) -> pd.DataFrame:
+    """
+    Decode a CSV table with a header row into a dataframe
+
+    Args:
+        body (bytes): CSV data with one column per input field
+
+    Returns:
+        pd.DataFrame: Validated request data
+    """
+    string_columns = {field: pa.string() for field in STRING_FIELDS}
+    table = pa_csv.read_csv(
+        io.BytesIO(body),
+        convert_options=pa_csv.ConvertOptions(column_types=string_columns),
+    )
+    return validate_frame(table.to_pandas())
+
+
+def decode_msgpack(body: bytes) -> dict[str, Any]:
+    """
+    Decode a MessagePack map with one list per input field
+
+    Args:
+        body (bytes): MessagePack data
+
+    Raises:
+        ValueError: If the body is not a MessagePack map
+
+    Returns:
+        dict[str, Any]: Request data, to be validated by PredictionPostAPIModel
+    """
+    data = msgpack.unpackb(body, raw=False)
+    if not isinstance(data, dict):
+        raise ValueError("MessagePack body must be a map of field names to lists")
+    return data
+
+
+def encode_predictions(
+    media_type: str,
+    pred_ids: list[str | int],
+    preds: np.ndarray,
+    model_name: str,
+    model_version: str,
+) -> bytes:
+    """
+    Encode predictions as Arrow IPC stream, MessagePack, CSV or columnar JSON.
+    Arrow and CSV responses hold one row per prediction, MessagePack responses
+    have the same structure as JSON responses. Columnar JSON responses hold one
+    list of prediction ids and one of predictions, with the model name and
+    version given once, and are written by orjson straight from the array.
+
+    Args:
+        media_type (str): One of ARROW, MSGPACK, CSV or COLUMNAR_JSON
+        pred_ids (list[str | int]): Prediction ids of the request
+        preds (np.ndarray): Predictions in the order of pred_ids
+        model_name (str): Name of the model
+        model_version (str): Version of the model
+
+    Returns:
+        bytes: Encoded response body
+    """
+    preds = preds.astype(np.float64, copy=False)
+    if media_type == COLUMNAR_JSON:
+        return orjson.dumps(
+            {
+                "prediction_id": pred_ids,
+                "prediction": preds,
+                "model": model_name,
+                "version": model_version,
+            },
+            option=orjson.OPT_SERIALIZE_NUMPY,
+        )
+
+    if media_type == MSGPACK:
+        predictions = [
+            {
+                'model': model_name,
+                'version': model_version,
+                'prediction': {
+                    'ride_duration': pred,
+                    'ride_id': pred_id,
+                },
+            }
+            for pred_id, pred in zip(pred_ids, preds.tolist())
+        ]
+        return msgpack.packb({"predictions": predictions})
+
+    try:
+        ride_ids = pa.array(pred_ids)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        ride_ids = pa.array([str(pred_id) for pred_id in pred_ids])
+    model_names = pa.array([model_name] * len(preds), type=pa.string())
+    model_versions = pa.array([model_version] * len(preds), type=pa.string())
+    if media_type == ARROW:
+        model_names = model_names.dictionary_encode()
+        model_versions = model_versions.dictionary_encode()
+    table = pa.table(
+        {
+            "ride_id": ride_ids,
+            "ride_duration": pa.array(preds),
+            "model": model_names,
+            "version": model_versions,
+        }
+    )
+
+    sink = pa.BufferOutputStream()
+    if media_type == CSV:
+        pa_csv.write_csv(table, sink)
+    else:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
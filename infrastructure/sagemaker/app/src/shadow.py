@@ -0,0 +1,209 @@
+"""
+Shadow scoring of a candidate model on a sample of live requests. The shadow model
+runs in a thread of its own after the live response is computed, so clients never
+wait for it, and its predictions are compared with those of the live model.
+"""
+
+import os
+import time
+import random
+import threading
+from typing import Any
+from logging import Logger
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import metrics
+from native_model import NativeModel
+
+# Seconds over which the shadow model may spend its CPU budget in a burst
+BUDGET_WINDOW_S = 1.0
+
+
+class ShadowScorer:
+    """
+    Scores a fraction of requests with a shadow model and records its latency
+    and the difference of its predictions to the live ones.
+
+    The shadow thread may use cpu_budget of one CPU. Time spent scoring is
+    taken from a budget which refills at cpu_budget seconds per second, up to
+    BUDGET_WINDOW_S seconds' worth. Sampled requests are skipped while the budget
+    is spent, or while max_pending requests are already waiting for the thread.
+    The shadow model should predict with one thread, so that the time spent
+    scoring bounds the CPU it uses.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        model_uri: str,
+        sample_rate: float,
+        cpu_budget: float,
+        logger: Logger,
+        max_pending: int = 2,
+        seed: int | None = None,
+    ) -> None:
+        """
+        Args:
+            model (Any): Shadow model with a predict method
+            model_uri (str): uri of the shadow model
+            sample_rate (float): Fraction of requests to score, between 0 and 1
+            cpu_budget (float): Fraction of one CPU the shadow model may use
+            logger (Logger): logger object
+            max_pending (int, optional): Largest number of requests waiting to be
+                scored. Defaults to 2.
+            seed (int | None, optional): Seed of the sampling, offset by the pid in
+                forked processes. Defaults to None.
+        """
+        self.model = model
+        self.model_uri = model_uri
+        self.sample_rate = sample_rate
+        self.cpu_budget = cpu_budget
+        self.logger = logger
+        self.max_pending = max_pending
+        self.seed = seed
+        self._random = random.Random(seed)
+        # Forked workers sample independently of the master and of each other
+        os.register_at_fork(after_in_child=self._reseed)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._lock = threading.Lock()
+
+        self.budget_s = cpu_budget * BUDGET_WINDOW_S
+        self.refilled_at = time.monotonic()
+        self.pending = 0
+        self.outcomes = dict.fromkeys(metrics.SHADOW_OUTCOMES, 0)
+        self.rows = 0
+        self.seconds = 0.0
+        self.sum_delta = 0.0
+        self.sum_abs_delta = 0.0
+        self.max_abs_delta = 0.0
+
+    def _reseed(self) -> None:
+        """
+        Seed the sampling anew in a forked process
+        """
+        self._random = random.Random(None if self.seed is None else self.seed + os.getpid())
+
+    def _count(self, outcome: str) -> None:
+        """
+        Count the outcome of a sampled request
+
+        Args:
+            outcome (str): One of metrics.SHADOW_OUTCOMES
+        """
+        self.outcomes[outcome] += 1
+        metrics.SHADOW_REQUESTS.inc(outcome)
+
+    def _refill(self) -> None:
+        """
+        Add the budget accrued since the last refill, called with the lock held
+        """
+        now = time.monotonic()
+        self.budget_s = min(
+            self.budget_s + (now - self.refilled_at) * self.cpu_budget,
+            self.cpu_budget * BUDGET_WINDOW_S,
+        )
+        self.refilled_at = now
+
+    def submit(self, df: pd.DataFrame, live_preds: np.ndarray) -> bool:
+        """
+        Score a request with the shadow model in the background, if it is sampled
+        and the budget allows. Returns right away.
+
+        Args:
+            df (pd.DataFrame): Input data without prediction ids, not modified afterwards
+            live_preds (np.ndarray): Predictions of the live model
+
+        Returns:
+            bool: Whether the request will be scored
+        """
+        if self.sample_rate <= 0 or self._random.random() >= self.sample_rate:
+            return False
+        with self._lock:
+            self._refill()
+            if self.pending >= self.max_pending:
+                skipped = "skipped_busy"
+            elif self.budget_s <= 0:
+                skipped = "skipped_budget"
+            else:
+                skipped = None
+                self.pending += 1
+        if skipped is not None:
+            self._count(skipped)
+            return False
+        self._executor.submit(self._score, df, live_preds)
+        return True
+
+    def _score(self, df: pd.DataFrame, live_preds: np.ndarray) -> None:
+        """
+        Predict with the shadow model and compare, run in the shadow thread
+
+        Args:
+            df (pd.DataFrame): Input data without prediction ids
+            live_preds (np.ndarray): Predictions of the live model
+        """
+        start = time.perf_counter()
+        try:
+            with metrics.SHADOW_STAGE_SECONDS.time("total"):
+                if isinstance(self.model, NativeModel):
+                    shadow_preds = self.model.predict(df)
+                else:
+                    with metrics.SHADOW_STAGE_SECONDS.time("model"):
+                        shadow_preds = self.model.predict(df)
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.logger.error("Shadow model %s failed", self.model_uri, exc_info=True)
+            self._count("failed")
+        else:
+            self.compare(np.asarray(live_preds), np.asarray(shadow_preds))
+            self._count("scored")
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.pending -= 1
+                self.budget_s -= elapsed
+                self.seconds += elapsed
+
+    def compare(self, live_preds: np.ndarray, shadow_preds: np.ndarray) -> None:
+        """
+        Record the differences between shadow and live predictions
+
+        Args:
+            live_preds (np.ndarray): Predictions of the live model
+            shadow_preds (np.ndarray): Predictions of the shadow model for the same rows
+        """
+        delta = shadow_preds.astype(np.float64) - live_preds
+        abs_delta = np.abs(delta)
+        metrics.SHADOW_DELTA.observe_many(abs_delta / np.maximum(np.abs(live_preds), 1.0))
+        self.rows += len(delta)
+        self.sum_delta += float(delta.sum())
+        self.sum_abs_delta += float(abs_delta.sum())
+        if len(delta) > 0:
+            self.max_abs_delta = max(self.max_abs_delta, float(abs_delta.max()))
+
+    def shutdown(self) -> None:
+        """
+        Stop the shadow thread without scoring the waiting requests
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Settings, outcomes and prediction differences of this worker
+
+        Returns:
+            dict[str, Any]: Shadow scoring stats, deltas as shadow minus live
+        """
+        done = self.outcomes["scored"] + self.outcomes["failed"]
+        return {
+            "model_uri": self.model_uri,
+            "sample_rate": self.sample_rate,
+            "cpu_budget": self.cpu_budget,
+            "pending": self.pending,
+            "outcomes": self.outcomes,
+            "rows": self.rows,
+            "mean_seconds": self.seconds / done if done else None,
+            "mean_delta": self.sum_delta / self.rows if self.rows else None,
+            "mean_abs_delta": self.sum_abs_delta / self.rows if self.rows else None,
+            "max_abs_delta": self.max_abs_delta,
+        }
@@ -0,0 +1,397 @@
+"""
+Incremental scoring of streamed request bodies, as NDJSON lines or Arrow IPC record batches
+"""
+
+import json
+import struct
+from typing import Any, Callable, Awaitable, AsyncIterator
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from serialization import validate_frame
+from starlette.types import Send, Scope, Receive
+from routers.api_models import PredictionRowAPIModel
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+
+NDJSON = "application/x-ndjson"
+ARROW = "application/vnd.apache.arrow.stream"
+SUPPORTED_MEDIA_TYPES = [NDJSON, ARROW]
+END_OF_ARROW_STREAM = b"\xff\xff\xff\xff\x00\x00\x00\x00"
+CONTINUATION = END_OF_ARROW_STREAM[:4]
+# Index of bodyLength among the fields of the Message flatbuffer table of Arrow IPC
+BODY_LENGTH_FIELD = 3
+
+
+def arrow_message_length(buffer: bytearray, offset: int) -> int | None:
+    """
+    Length of the encapsulated Arrow IPC message starting at offset, read from its
+    prefix and the body length in its flatbuffer metadata, without parsing it
+
+    Args:
+        buffer (bytearray): Received bytes
+        offset (int): Start of the message
+
+    Raises:
+        ValueError: If the prefix or the metadata are invalid
+
+    Returns:
+        int | None: Bytes of the message including its prefix, 0 for the end of the
+            stream, None while the prefix and metadata have not fully arrived
+    """
+    if len(buffer) < offset + 4:
+        return None
+    prefix = 8 if buffer[offset : offset + 4] == CONTINUATION else 4
+    if len(buffer) < offset + prefix:
+        return None
+    (metadata_length,) = struct.unpack_from("<i", buffer, offset + prefix - 4)
+    if metadata_length < 0:
+        raise ValueError("Invalid Arrow IPC message length")
+    if metadata_length == 0:
+        return 0
+    start = offset + prefix
+    if len(buffer) < start + metadata_length:
+        return None
+    try:
+        table = start + struct.unpack_from("<I", buffer, start)[0]
+        vtable = table - struct.unpack_from("<i", buffer, table)[0]
+        vtable_size = struct.unpack_from("<H", buffer, vtable)[0]
+        field = 4 + 2 * BODY_LENGTH_FIELD
+        field_offset = (
+            struct.unpack_from("<H", buffer, vtable + field)[0] if field < vtable_size else 0
+        )
+        body_length = (
+            struct.unpack_from("<q", buffer, table + field_offset)[0] if field_offset else 0
+        )
+    except struct.error as e:
+        raise ValueError("Invalid Arrow IPC message metadata") from e
+    if body_length < 0:
+        raise ValueError("Invalid Arrow IPC message body length")
+    return prefix + metadata_length + body_length
+
+
+class RequestStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for content which is generated while the request body is
+    still being read. Starlette's StreamingResponse listens for client disconnects
+    by reading from the request, which would consume the body meant for the content
+    generator. Here disconnects are instead noticed by Request.stream(). The
+    background task always runs, also when the response was cut short.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self.stream_response(send)
+        except ClientDisconnect:
+            return
+        finally:
+            if self.background is not None:
+                await self.background()
+
+
+class NdjsonReader:
+    """
+    Decodes a byte stream with one JSON object per line into validated rows
+    """
+
+    def __init__(self) -> None:
+        self._buffer = b""
+        self.line_number = 0
+
+    def _parse_lines(self, lines: list[bytes]) -> pd.DataFrame | None:
+        """
+        Validate lines with PredictionRowAPIModel, skipping blank lines
+
+        Args:
+            lines (list[bytes]): Complete lines
+
+        Raises:
+            ValueError: If a line is not a valid row, with its line number
+
+        Returns:
+            pd.DataFrame | None: The rows, or None if there were no rows
+        """
+        rows = []
+        for line in lines:
+            self.line_number += 1
+            if not line.strip():
+                continue
+            try:
+                rows.append(PredictionRowAPIModel.model_validate_json(line).model_dump())
+            except ValueError as e:
+                raise ValueError(f"Invalid row on line {self.line_number}: {str(e)}") from e
+        return pd.DataFrame(rows) if rows else None
+
+    def feed(self, data: bytes) -> list[pd.DataFrame]:
+        """
+        Decode all complete lines received so far
+
+        Args:
+            data (bytes): Next part of the body
+
+        Returns:
+            list[pd.DataFrame]: Rows of the complete lines
+        """
+        *lines, self._buffer = (self._buffer + data).split(b"\n")
+        df = self._parse_lines(lines)
+        return [df] if df is not None else []
+
+    def finish(self) -> list[pd.DataFrame]:
+        """
+        Decode the last line, which may lack a trailing newline
+
+        Returns:
+            list[pd.DataFrame]: Rows of the last line
+        """
+        df = self._parse_lines([self._buffer])
+        self._buffer = b""
+        return [df] if df is not None else []
+
+
+class ArrowReader:
+    """
+    Decodes an Arrow IPC stream message by message as the bytes arrive. Each
+    message is parsed once, when all of its bytes arrived, and dropped from the
+    buffer afterwards. Dictionary encoded columns are not supported.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self.schema: pa.Schema | None = None
+        self.finished = False
+
+    def feed(self, data: bytes) -> list[pd.DataFrame]:
+        """
+        Decode all complete record batches received so far
+
+        Args:
+            data (bytes): Next part of the body
+
+        Raises:
+            ValueError: If the stream holds an unsupported message or invalid data
+
+        Returns:
+            list[pd.DataFrame]: Validated rows of the complete record batches
+        """
+        self._buffer += data
+        frames = []
+        offset = 0
+        while not self.finished:
+            length = arrow_message_length(self._buffer, offset)
+            if length == 0:
+                self.finished = True
+                break
+            if length is None or len(self._buffer) < offset + length:
+                # The message is not complete yet
+                break
+            try:
+                message = pa.ipc.read_message(bytes(self._buffer[offset : offset + length]))
+            except (pa.ArrowInvalid, OSError) as e:
+                raise ValueError(f"Invalid Arrow IPC message: {str(e)}") from e
+            offset += length
+            if message.type == "schema":
+                self.schema = pa.ipc.read_schema(message)
+            elif message.type == "record batch" and self.schema is not None:
+                batch = pa.ipc.read_record_batch(message, self.schema)
+                frames.append(validate_frame(batch.to_pandas()))
+            else:
+                raise ValueError(f"Unsupported Arrow IPC message of type {message.type}")
+        del self._buffer[:offset]
+        return frames
+
+    def finish(self) -> list[pd.DataFrame]:
+        """
+        Check that the stream ended after a complete message
+
+        Raises:
+            ValueError: If the body ended in the middle of a message
+
+        Returns:
+            list[pd.DataFrame]: Always empty, all batches are returned by feed
+        """
+        if self._buffer and not self.finished:
+            raise ValueError("Arrow IPC stream ended in the middle of a message")
+        return []
+
+
+class NdjsonWriter:
+    """
+    Encodes predictions as one JSON object per line, in the format of
+    the entries of /invocations JSON responses
+    """
+
+    media_type = NDJSON
+
+    def __init__(self, model_name: str, model_version: str) -> None:
+        """
+        Args:
+            model_name (str): Name of the model
+            model_version (str): Version of the model
+        """
+        self.model_name = model_name
+        self.model_version = model_version
+
+    def write(self, pred_ids: list[Any], preds: np.ndarray) -> bytes:
+        """
+        Args:
+            pred_ids (list[Any]): Prediction ids of a chunk
+            preds (np.ndarray): Predictions of the chunk
+
+        Returns:
+            bytes: One line per prediction
+        """
+        lines = [
+            json.dumps(
+                {
+                    'model': self.model_name,
+                    'version': self.model_version,
+                    'prediction': {
+                        'ride_duration': pred,
+                        'ride_id': pred_id,
+                    },
+                }
+            )
+            for pred_id, pred in zip(pred_ids, preds.tolist())
+        ]
+        return ("\n".join(lines) + "\n").encode()
+
+    def error(self, detail: str) -> bytes:
+        """
+        Args:
+            detail (str): Error description
+
+        Returns:
+            bytes: A final line describing the error
+        """
+        return (json.dumps({"error": detail}) + "\n").encode()
+
+    def end(self) -> bytes:
+        """
+        Returns:
+            bytes: Nothing, NDJSON has no end marker
+        """
+        return b""
+
+
+class ArrowWriter:
+    """
+    Encodes predictions as an Arrow IPC stream with one record batch per chunk
+    """
+
+    media_type = ARROW
+    schema = pa.schema(
+        [
+            ("ride_id", pa.string()),
+            ("ride_duration", pa.float64()),
+            ("model", pa.string()),
+            ("version", pa.string()),
+        ]
+    )
+
+    def __init__(self, model_name: str, model_version: str) -> None:
+        """
+        Args:
+            model_name (str): Name of the model
+            model_version (str): Version of the model
+        """
+        self.model_name = model_name
+        self.model_version = model_version
+        self.started = False
+
+    def write(self, pred_ids: list[Any], preds: np.ndarray) -> bytes:
+        """
+        Args:
+            pred_ids (list[Any]): Prediction ids of a chunk, written as strings
+            preds (np.ndarray): Predictions of the chunk
+
+        Returns:
+            bytes: The schema (before the first batch) and a record batch
+        """
+        batch = pa.record_batch(
+            [
+                pa.array([str(pred_id) for pred_id in pred_ids], type=pa.string()),
+                pa.array(preds, type=pa.float64()),
+                pa.array([self.model_name] * len(preds), type=pa.string()),
+                pa.array([self.model_version] * len(preds), type=pa.string()),
+            ],
+            schema=self.schema,
+        )
+        header = b"" if self.started else self.schema.serialize().to_pybytes()
+        self.started = True
+        return header + batch.serialize().to_pybytes()
+
+    def error(self, detail: str) -> bytes:
+        """
+        Arrow streams can not carry errors, the stream is cut off without an end marker
+
+        Args:
+            detail (str): Error description
+
+        Returns:
+            bytes: Nothing
+        """
+        return b""
+
+    def end(self) -> bytes:
+        """
+        Returns:
+            bytes: The end of stream marker, preceded by the schema if nothing was written
+        """
+        header = b"" if self.started else self.schema.serialize().to_pybytes()
+        return header + END_OF_ARROW_STREAM
+
+
+async def score_stream(
+    body: AsyncIterator[bytes],
+    reader: NdjsonReader | ArrowReader,
+    writer: NdjsonWriter | ArrowWriter,
+    infer: Callable[[pd.DataFrame], Awaitable[np.ndarray]],
+    chunk_rows: int,
+) -> AsyncIterator[bytes]:
+    """
+    Read rows as they arrive, predict them in chunks of chunk_rows rows and
+    yield the encoded predictions of each chunk. Only one chunk (plus one
+    partially received message) is held in memory at a time.
+
+    Args:
+        body (AsyncIterator[bytes]): Request body stream
+        reader (NdjsonReader | ArrowReader): Decoder of the body
+        writer (NdjsonWriter | ArrowWriter): Encoder of the predictions
+        infer (Callable[[pd.DataFrame], Awaitable[np.ndarray]]): Predicts input data
+            without prediction ids
+        chunk_rows (int): Number of rows per model call
+
+    Yields:
+        bytes: Encoded predictions
+    """
+    pending: list[pd.DataFrame] = []
+    pending_rows = 0
+
+    async def score(df: pd.DataFrame) -> bytes:
+        preds = await infer(df.drop(columns=["prediction_id"]).reset_index(drop=True))
+        return writer.write(df["prediction_id"].tolist(), preds)
+
+    try:
+        finished = False
+        while not finished:
+            try:
+                data = await anext(body)
+                frames = reader.feed(data)
+            except StopAsyncIteration:
+                finished = True
+                frames = reader.finish()
+            for frame in frames:
+                pending.append(frame)
+                pending_rows += len(frame)
+            if pending_rows >= chunk_rows or (finished and pending_rows > 0):
+                df = pd.concat(pending, ignore_index=True)
+                n_scored = len(df) if finished else len(df) - len(df) % chunk_rows
+                for start in range(0, n_scored, chunk_rows):
+                    yield await score(df.iloc[start : start + chunk_rows])
+                rest = df.iloc[n_scored:]
+                pending, pending_rows = ([rest], len(rest)) if len(rest) else ([], 0)
+    except ValueError as e:
+        yield writer.error(str(e))
+        return
+    yield writer.end()
@@ -0,0 +1,57 @@
+"""
+Synthetic prediction requests, following the valid value ranges of
+create_new_data.py in the monitoring service.
+"""
+
+import random
+from typing import Any
+
+AIRLINES = [
+    "Air Asia",
+    "Air India",
+    "Indigo",
+    "Jet Airways",
+    "Multiple carriers",
+    "Multiple carriers Premium economy",
+    "Spice Jet",
+    "Truejet",
+    "Vistara",
+    "Vistara Premium economy",
+]
+SOURCES = ["Banglore", "Kolkata", "Chennai", "Delhi", "Mumbai"]
+DESTINATIONS = ["Banglore", "Kolkata", "Cochin", "Delhi", "Hyderabad", "New Delhi"]
+
+
+def create_random_request(n_rows: int, seed: int | None = None) -> dict[str, list[Any]]:
+    """
+    Create a request body with n_rows random flights, in the format of
+    PredictionPostAPIModel.
+
+    Args:
+        n_rows (int): Number of flights in the request
+        seed (int | None, optional): Random seed. Defaults to None.
+
+    Returns:
+        dict[str, list[Any]]: Request data with one list per field
+    """
+    rng = random.Random(seed)
+
+    def ints(start: int, stop: int) -> list[int]:
+        return [rng.randrange(start, stop) for _ in range(n_rows)]
+
+    return {
+        "prediction_id": [str(i) for i in range(n_rows)],
+        "airline": rng.choices(AIRLINES, k=n_rows),
+        "source": rng.choices(SOURCES, k=n_rows),
+        "destination": rng.choices(DESTINATIONS, k=n_rows),
+        "total_stops": ints(0, 5),
+        "date": ints(1, 28),
+        "month": ints(1, 13),
+        "year": ints(1990, 2050),
+        "dep_hours": ints(0, 24),
+        "dep_min": ints(0, 60),
+        "arrival_hours": ints(0, 24),
+        "arrival_min": ints(0, 60),
+        "duration_hours": ints(0, 24),
+        "duration_min": ints(0, 60),
+    }
@@ -0,0 +1,168 @@
+"""
+Split of the CPUs of the container between gunicorn workers, inference threads
+per worker and XGBoost threads per model call.
+
+By default XGBoost uses every CPU for each prediction, in every worker, so that
+one worker per CPU runs cpus * cpus threads under load. The plan keeps the product
+workers * inference threads * model threads at the number of available CPUs,
+preferring workers: prediction requests are small, so a model call gains little
+from more threads, while more workers also parallelize parsing and feature engineering.
+"""
+
+import os
+import math
+from typing import Any, Mapping
+
+WORKERS_ENV = "MODEL_SERVER_WORKERS"
+INFERENCE_THREADS_ENV = "INFERENCE_WORKERS"
+MODEL_THREADS_ENV = "MODEL_THREADS"
+
+
+class Topology:
+    """
+    Number of gunicorn workers, inference threads per worker and XGBoost threads per model call
+    """
+
+    def __init__(self, workers: int, inference_threads: int, model_threads: int) -> None:
+        """
+        Args:
+            workers (int): Number of gunicorn workers
+            inference_threads (int): Threads running model calls in each worker,
+                0 to run them on the event loop
+            model_threads (int): XGBoost nthread of each model call
+        """
+        self.workers = workers
+        self.inference_threads = inference_threads
+        self.model_threads = model_threads
+
+    def environment(self) -> dict[str, str]:
+        """
+        Environment variables passing the topology on to gunicorn and the app.
+        OMP_NUM_THREADS also bounds the OpenMP threads of models called through
+        the mlflow pyfunc wrapper.
+
+        Returns:
+            dict[str, str]: Variable names and values
+        """
+        return {
+            WORKERS_ENV: str(self.workers),
+            INFERENCE_THREADS_ENV: str(self.inference_threads),
+            MODEL_THREADS_ENV: str(self.model_threads),
+            "OMP_NUM_THREADS": str(self.model_threads),
+        }
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Description of the topology
+
+        Returns:
+            dict[str, Any]: Workers, threads and CPUs they take at most
+        """
+        return {
+            "workers": self.workers,
+            "inference_threads": self.inference_threads,
+            "model_threads": self.model_threads,
+            "cpus": self.workers * max(self.inference_threads, 1) * self.model_threads,
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"Topology(workers={self.workers}, inference_threads={self.inference_threads}, "
+            f"model_threads={self.model_threads})"
+        )
+
+
+def available_cpus() -> int:
+    """
+    Number of CPUs the process may use, bounded by its CPU affinity and by the
+    CPU quota of its cgroup, which is how container runtimes limit CPUs
+
+    Returns:
+        int: At least 1
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, max(math.ceil(quota), 1))
+    return cpus
+
+
+def _cgroup_cpu_quota() -> float | None:
+    """
+    CPU quota of the current cgroup, v2 or v1
+
+    Returns:
+        float | None: Quota in CPUs, None if there is no quota or no cgroup
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.max", encoding="utf-8") as f:
+            quota, period = f.read().split()
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", encoding="utf-8") as f:
+                quota = f.read().strip()
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", encoding="utf-8") as f:
+                period = f.read().strip()
+        except OSError:
+            return None
+    if quota in ("max", "-1"):
+        return None
+    return int(quota) / int(period)
+
+
+def plan_topology(
+    cpus: int,
+    workers: int | None = None,
+    inference_threads: int | None = None,
+    model_threads: int | None = None,
+) -> Topology:
+    """
+    Fill in the values which are not given, so that the workers, inference
+    threads and model threads together use about cpus CPUs
+
+    Args:
+        cpus (int): Number of available CPUs
+        workers (int | None, optional): Number of gunicorn workers. None or 0 for
+            what the other values leave, at least 1.
+        inference_threads (int | None, optional): Inference threads per worker.
+            Defaults to 1.
+        model_threads (int | None, optional): XGBoost threads per model call. None
+            or 0 for 1, or for what the given workers and inference threads leave.
+
+    Returns:
+        Topology: The topology
+    """
+    if inference_threads is None:
+        inference_threads = 1
+    # With 0 inference threads the model runs on the event loop, which is one thread as well
+    concurrent_calls = max(inference_threads, 1)
+    if not model_threads:
+        model_threads = 1 if not workers else max(cpus // (workers * concurrent_calls), 1)
+    if not workers:
+        workers = max(cpus // (concurrent_calls * model_threads), 1)
+    return Topology(workers, inference_threads, model_threads)
+
+
+def topology_from_environment(environ: Mapping[str, str] = os.environ) -> Topology:
+    """
+    Plan the topology for the available CPUs, taking the values which are set
+    in MODEL_SERVER_WORKERS, INFERENCE_WORKERS and MODEL_THREADS
+
+    Args:
+        environ (Mapping[str, str], optional): Environment. Defaults to os.environ.
+
+    Returns:
+        Topology: The topology
+    """
+    values = {
+        name: int(environ[variable]) if environ.get(variable) else None
+        for name, variable in (
+            ("workers", WORKERS_ENV),
+            ("inference_threads", INFERENCE_THREADS_ENV),
+            ("model_threads", MODEL_THREADS_ENV),
+        )
+    }
+    return plan_topology(available_cpus(), **values)
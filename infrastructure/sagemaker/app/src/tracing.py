@@ -0,0 +1,481 @@
+"""
+Trace spans of prediction requests. A request starts a trace, with the trace id
+of an incoming header if there is one, and every stage timed by metrics.Timer
+while it is in progress adds a span: body_read, validation, dataframe,
+feature_engineering, vectorization, model and serialization. In native mode the
+feature functions of the model's pipeline add spans of their own. The current
+span is kept in a context variable, which the inference executor passes on to
+its threads. Code running outside of a trace, like the shadow model or the
+warm-up, creates no spans.
+
+When the request is done, all spans of its trace are handed to an exporter, which
+writes them as JSON lines to stdout or to a file. Further exporters can be added
+to EXPORTERS. With tracing off, a stage only pays for reading the context variable.
+"""
+
+import os
+import re
+import abc
+import sys
+import json
+import time
+import types
+import random
+import functools
+import threading
+from typing import Any, TextIO, Callable, Iterable
+from logging import Logger
+from contextvars import ContextVar
+
+# Response header with the trace id of the request
+TRACE_ID_HEADER = "X-Trace-Id"
+# W3C trace context, version-trace id-parent span id-flags
+TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+# Trace ids taken as they are from other headers
+PLAIN_TRACE_ID = re.compile(r"^[A-Za-z0-9._:=-]{1,128}$")
+# Functions of the logged model's feature engineering module to trace
+FEATURE_FUNCTIONS = (
+    "create_weekday_feature",
+    "create_trip_ids",
+    "create_rounded_arrival_and_departure_times",
+    "create_total_duration_minutes",
+    "feature_selection",
+)
+
+_current_span: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+
+
+class Trace:
+    """
+    The spans of one request, with attributes shared by all of them
+    """
+
+    __slots__ = ("trace_id", "attributes", "spans")
+
+    def __init__(self, trace_id: str) -> None:
+        """
+        Args:
+            trace_id (str): Id of the trace
+        """
+        self.trace_id = trace_id
+        self.attributes: dict[str, Any] = {}
+        self.spans: list[Span] = []
+
+
+class Span:
+    """
+    A timed step of a request. Entering the span makes it the parent of the
+    spans started in its block, leaving it ends it.
+    """
+
+    __slots__ = (
+        "trace",
+        "name",
+        "span_id",
+        "parent_id",
+        "attributes",
+        "start_ns",
+        "end_ns",
+        "status",
+        "thread",
+        "_token",
+    )
+
+    def __init__(self, trace: Trace, name: str, parent_id: str | None) -> None:
+        """
+        Args:
+            trace (Trace): Trace the span belongs to
+            name (str): Name of the step
+            parent_id (str | None): Id of the parent span, None for the root span
+        """
+        self.trace = trace
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes: dict[str, Any] = {}
+        self.start_ns = 0
+        self.end_ns = 0
+        self.status = "ok"
+        self.thread = ""
+        self._token = None
+
+    @property
+    def trace_id(self) -> str:
+        """
+        Id of the span's trace
+        """
+        return self.trace.trace_id
+
+    def set_attribute(self, name: str, value: Any) -> None:
+        """
+        Describe the span
+
+        Args:
+            name (str): Name of the attribute
+            value (Any): JSON serializable value
+        """
+        self.attributes[name] = value
+
+    def set_trace_attribute(self, name: str, value: Any) -> None:
+        """
+        Describe all spans of the trace which do not set the attribute themselves
+
+        Args:
+            name (str): Name of the attribute
+            value (Any): JSON serializable value
+        """
+        self.trace.attributes[name] = value
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.time_ns()
+        self.thread = threading.current_thread().name
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> None:
+        self.end_ns = time.time_ns()
+        if exc is not None:
+            self.status = "error"
+            self.attributes.setdefault("error", type(exc).__name__)
+        _current_span.reset(self._token)
+        self.trace.spans.append(self)
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        The span as exported
+
+        Returns:
+            dict[str, Any]: Ids, name, times, status and attributes
+        """
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6,
+            "status": self.status,
+            "thread": self.thread,
+            "attributes": {**self.trace.attributes, **self.attributes},
+        }
+
+
+class NoSpan:
+    """
+    Stands in for a span when the request is not traced
+    """
+
+    trace_id = None
+
+    def set_attribute(self, name: str, value: Any) -> None:
+        """
+        Ignore the attribute
+        """
+
+    def set_trace_attribute(self, name: str, value: Any) -> None:
+        """
+        Ignore the attribute
+        """
+
+    def __enter__(self) -> "NoSpan":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> None:
+        pass
+
+
+NO_SPAN = NoSpan()
+
+
+def start_span(name: str) -> Span | None:
+    """
+    A child of the current span, to be entered by the caller
+
+    Args:
+        name (str): Name of the step
+
+    Returns:
+        Span | None: The span, None outside of a trace
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    return Span(parent.trace, name, parent.span_id)
+
+
+def parse_trace_header(value: str | None) -> tuple[str | None, str | None]:
+    """
+    Trace id and parent span id of an incoming trace header
+
+    Args:
+        value (str | None): A W3C traceparent, or a plain trace id
+
+    Returns:
+        tuple[str | None, str | None]: Trace id and parent span id, None for each
+            which is not given or is malformed
+    """
+    if not value:
+        return None, None
+    value = value.strip()
+    match = TRACEPARENT.match(value)
+    if match is not None:
+        return match.group(1), match.group(2)
+    if PLAIN_TRACE_ID.match(value):
+        return value, None
+    return None, None
+
+
+class SpanExporter(abc.ABC):
+    """
+    Receives the spans of each finished trace
+    """
+
+    @abc.abstractmethod
+    def export(self, spans: list[Span]) -> None:
+        """
+        Export the spans of a trace
+
+        Args:
+            spans (list[Span]): Spans in the order they ended, the root span last
+        """
+
+    def shutdown(self) -> None:
+        """
+        Release the exporter's resources
+        """
+
+
+class StreamSpanExporter(SpanExporter):
+    """
+    Writes each span as a line of JSON to a text stream
+    """
+
+    def __init__(self, stream: TextIO = sys.stdout) -> None:
+        """
+        Args:
+            stream (TextIO, optional): The stream. Defaults to sys.stdout.
+        """
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def export(self, spans: list[Span]) -> None:
+        lines = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+        with self._lock:
+            self.stream.write(lines)
+            self.stream.flush()
+
+
+class FileSpanExporter(SpanExporter):
+    """
+    Appends each span as a line of JSON to a file. The spans of a trace are
+    written with a single append, so that all workers can share the file.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Args:
+            path (str): Path of the file
+        """
+        self.path = path
+        self._fd: int | None = None
+        self._fd_pid: int | None = None
+
+    def export(self, spans: list[Span]) -> None:
+        if self._fd_pid != os.getpid():
+            # Opened in each worker, not inherited from the gunicorn master
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._fd_pid = os.getpid()
+        lines = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+        os.write(self._fd, lines.encode("utf-8"))
+
+    def shutdown(self) -> None:
+        if self._fd is not None and self._fd_pid == os.getpid():
+            os.close(self._fd)
+            self._fd = None
+
+
+EXPORTERS: dict[str, Callable[[str], SpanExporter]] = {
+    "stdout": lambda path: StreamSpanExporter(),
+    "file": FileSpanExporter,
+}
+
+
+class Tracer:
+    """
+    Starts a trace per request and exports its spans when the request is done
+    """
+
+    def __init__(self, exporter: SpanExporter | None, logger: Logger) -> None:
+        """
+        Args:
+            exporter (SpanExporter | None): Exporter of the finished traces, None
+                to turn tracing off
+            logger (Logger): logger object
+        """
+        self.exporter = exporter
+        self.logger = logger
+        self.traces = 0
+        self.failed_exports = 0
+
+    @classmethod
+    def create(cls, exporter: str, path: str, logger: Logger) -> "Tracer":
+        """
+        Tracer with one of EXPORTERS
+
+        Args:
+            exporter (str): Name of the exporter in EXPORTERS, "none" to turn tracing off
+            path (str): File of the exporters writing to one
+            logger (Logger): logger object
+
+        Returns:
+            Tracer: The tracer
+        """
+        if exporter == "none":
+            return cls(None, logger)
+        return cls(EXPORTERS[exporter](path), logger)
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Whether requests are traced
+        """
+        return self.exporter is not None
+
+    def trace(self, name: str, header: str | None = None) -> "Span | NoSpan":
+        """
+        Context manager around a request, starting its trace with the root span
+
+        Args:
+            name (str): Name of the root span
+            header (str | None, optional): Incoming trace header, see
+                parse_trace_header. Defaults to a new trace id.
+
+        Returns:
+            Span | NoSpan: The root span, NO_SPAN if tracing is off
+        """
+        if self.exporter is None:
+            return NO_SPAN
+        trace_id, parent_id = parse_trace_header(header)
+        return _RootSpan(
+            self, Trace(trace_id or f"{random.getrandbits(128):032x}"), name, parent_id
+        )
+
+    def export(self, trace: Trace) -> None:
+        """
+        Hand the spans of a finished trace to the exporter
+
+        Args:
+            trace (Trace): The trace
+        """
+        self.traces += 1
+        try:
+            self.exporter.export(trace.spans)
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.logger.error("Failed to export trace %s", trace.trace_id, exc_info=True)
+            self.failed_exports += 1
+
+    def shutdown(self) -> None:
+        """
+        Shut down the exporter
+        """
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+
+class _RootSpan(Span):
+    """
+    First span of a trace, recording the response status and exporting the trace when it ends
+    """
+
+    __slots__ = ("tracer",)
+
+    def __init__(self, tracer: Tracer, trace: Trace, name: str, parent_id: str | None) -> None:
+        super().__init__(trace, name, parent_id)
+        self.tracer = tracer
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> None:
+        self.attributes["status_code"] = 200 if exc is None else getattr(exc, "status_code", 500)
+        super().__exit__(exc_type, exc, traceback)
+        self.tracer.export(self.trace)
+
+
+def traced(name: str, function: Callable) -> Callable:
+    """
+    Wrap a function of data frames in a span, with the number of rows of its
+    first argument
+
+    Args:
+        name (str): Name of the span
+        function (Callable): The function
+
+    Returns:
+        Callable: The wrapped function
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        current = start_span(name)
+        if current is None:
+            return function(*args, **kwargs)
+        frame = args[0] if args else next(iter(kwargs.values()), None)
+        if hasattr(frame, "__len__"):
+            current.set_attribute("rows", len(frame))
+        with current:
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def _rebind(function: types.FunctionType, namespace: dict[str, Any]) -> types.FunctionType:
+    """
+    Copy of a function which looks up its globals in another namespace
+
+    Args:
+        function (types.FunctionType): The function
+        namespace (dict[str, Any]): Globals of the copy
+
+    Returns:
+        types.FunctionType: The copy
+    """
+    copy = types.FunctionType(
+        function.__code__,
+        namespace,
+        function.__name__,
+        function.__defaults__,
+        function.__closure__,
+    )
+    copy.__kwdefaults__ = function.__kwdefaults__
+    return functools.update_wrapper(copy, function)
+
+
+def trace_module_functions(
+    function: types.FunctionType, names: Iterable[str]
+) -> tuple[types.FunctionType, list[str]]:
+    """
+    Copy of a function in which the named functions of its module are traced,
+    also when they are called by other functions of the module. The copy, and
+    the module functions it calls, look up their globals in a copy of the
+    module's namespace with the named functions wrapped by traced. The module
+    itself, and other users of it, are not changed.
+
+    Args:
+        function (types.FunctionType): Entry point, such as the function of a
+            FunctionTransformer
+        names (Iterable[str]): Names of the module functions to trace
+
+    Returns:
+        tuple[types.FunctionType, list[str]]: The copy, and the names which were
+            found in the module and are traced
+    """
+    module_globals = function.__globals__
+    namespace = dict(module_globals)
+    for name, value in module_globals.items():
+        if isinstance(value, types.FunctionType) and value.__globals__ is module_globals:
+            namespace[name] = _rebind(value, namespace)
+    traced_names = [
+        name for name in names if isinstance(module_globals.get(name), types.FunctionType)
+    ]
+    for name in traced_names:
+        namespace[name] = traced(name, namespace[name])
+    return _rebind(function, namespace), traced_names
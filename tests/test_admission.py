@@ -0,0 +1,162 @@
+"""
+Unit tests for the admission control of prediction requests
+"""
+
+import time
+from http import HTTPStatus
+
+import pytest
+from admission import (
+    DEADLINE_PROBE_EVERY,
+    AdmissionRejected,
+    AdmissionController,
+    queue_seconds,
+)
+
+
+def create_controller(**limits: float) -> AdmissionController:
+    """
+    Controller with all checks disabled except the given ones
+    """
+    settings = {
+        "max_body_bytes": 0,
+        "max_rows": 0,
+        "max_in_flight_rows": 0,
+        "max_queue_ms": 0.0,
+        "deadline_ms": 0.0,
+    }
+    return AdmissionController(**{**settings, **limits})
+
+
+def request_start(seconds_ago: float) -> str:
+    """
+    X-Request-Start header of a request nginx passed on seconds_ago seconds ago
+    """
+    return f"t={time.time() - seconds_ago:.3f}"
+
+
+def rejection(call, *args) -> AdmissionRejected:
+    """
+    The rejection raised by a controller check
+    """
+    with pytest.raises(AdmissionRejected) as e:
+        call(*args)
+    return e.value
+
+
+def test_request_start_header_in_any_unit() -> None:
+    """
+    Seconds, milliseconds and microseconds since epoch give the same queue time
+    """
+    now = 1_700_000_010.0
+    for header in ("t=1700000000", "t=1700000000000", "1700000000000000"):
+        assert queue_seconds(header, now=now) == pytest.approx(10.0)
+    assert queue_seconds(None) is None
+    assert queue_seconds("t=soon") is None
+
+
+def test_request_waiting_too_long_is_shed() -> None:
+    """
+    Requests waiting longer than max_queue_ms, or past their deadline, are shed with Retry-After
+    """
+    queue_limited = create_controller(max_queue_ms=100)
+    assert queue_limited.check_arrival(request_start(0.01), None) < 0.1
+    e = rejection(queue_limited.check_arrival, request_start(0.5), None)
+    assert (e.decision, e.status_code, e.retry) == (
+        "shed_queue_time",
+        HTTPStatus.SERVICE_UNAVAILABLE,
+        True,
+    )
+
+    deadline_limited = create_controller(deadline_ms=100)
+    e = rejection(deadline_limited.check_arrival, request_start(0.5), None)
+    assert (e.decision, e.retry) == ("shed_deadline", True)
+
+
+def test_large_bodies_and_requests_are_rejected() -> None:
+    """
+    Bodies over max_body_bytes and requests over max_rows get 413 without Retry-After
+    """
+    controller = create_controller(max_body_bytes=1000, max_rows=10)
+    controller.check_arrival(None, "1000")
+
+    e = rejection(controller.check_arrival, None, "1001")
+    assert (e.decision, e.status_code, e.retry) == (
+        "rejected_body_size",
+        HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+        False,
+    )
+    assert rejection(controller.check_body_size, 5000).decision == "rejected_body_size"
+    assert rejection(controller.admit, 11, 0.0).decision == "rejected_rows"
+    assert controller.stats()["decisions"]["rejected_body_size"] == 2
+
+
+def test_rows_in_progress_are_limited() -> None:
+    """
+    A request is shed while its rows would exceed max_in_flight_rows, unless
+    nothing else is in progress
+    """
+    controller = create_controller(max_in_flight_rows=100)
+    controller.admit(150, 0.0)
+    controller.release(150, 0.01)
+    controller.admit(60, 0.0)
+
+    e = rejection(controller.admit, 50, 0.0)
+    assert (e.decision, e.retry) == ("shed_in_flight_rows", True)
+
+    controller.admit(40, 0.0)
+    assert controller.in_flight_rows == 100
+    controller.release(60)
+    controller.release(40)
+    assert controller.in_flight_rows == 0
+    assert controller.stats()["decisions"]["admitted"] == 3
+
+
+def test_requests_expected_to_miss_their_deadline_are_shed() -> None:
+    """
+    Requests are shed when the service time of their size does not fit in the
+    time left before the deadline
+    """
+    controller = create_controller(deadline_ms=1000)
+    controller.admit(10, 0.0)
+    controller.release(10, 0.4)
+    assert controller.estimate_seconds(10) == pytest.approx(0.4)
+
+    controller.admit(10, 0.5)
+    controller.release(10)
+    e = rejection(controller.admit, 10, 0.7)
+    assert (e.decision, e.retry) == ("shed_deadline", True)
+
+
+def test_large_requests_after_small_ones_are_served() -> None:
+    """
+    Sizes which were never served are not shed for their deadline, however slow
+    smaller requests were
+    """
+    controller = create_controller(deadline_ms=1000)
+    controller.admit(1, 0.0)
+    controller.release(1, 0.005)
+
+    assert controller.estimate_seconds(20_000) is None
+    for n_rows in (20_000, 50_000):
+        controller.admit(n_rows, 0.0)
+        controller.release(n_rows, 0.3)
+    assert controller.stats()["decisions"]["shed_deadline"] == 0
+
+
+def test_shed_sizes_are_measured_again() -> None:
+    """
+    One in DEADLINE_PROBE_EVERY requests of a size shed for its deadline is served,
+    so that its service time is measured again
+    """
+    controller = create_controller(deadline_ms=1000)
+    controller.admit(20_000, 0.0)
+    controller.release(20_000, 5.0)
+
+    for _ in range(DEADLINE_PROBE_EVERY - 1):
+        assert rejection(controller.admit, 20_000, 0.0).decision == "shed_deadline"
+    controller.admit(20_000, 0.0)
+    controller.release(20_000, 0.2)
+
+    assert controller.estimate_seconds(20_000) < 5.0
+    assert rejection(controller.admit, 20_000, 0.0).decision == "shed_deadline"
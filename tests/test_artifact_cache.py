@@ -0,0 +1,55 @@
+"""
+Unit tests for the content-addressed model artifact cache
+"""
+
+from pathlib import Path
+
+import pytest
+from artifact_cache import ArtifactCache, ArtifactCacheError, directory_digest
+
+
+def create_model_dir(path: Path) -> Path:
+    """
+    A model directory with a nested file, as a local artifact uri
+    """
+    (path / "data").mkdir(parents=True)
+    (path / "MLmodel").write_text("flavors: {}\n", encoding="utf-8")
+    (path / "data" / "model.xgb").write_bytes(bytes(range(256)) * 16)
+    return path
+
+
+def test_cached_model_is_found_by_uri(tmp_path) -> None:
+    """
+    A resolved model is stored under its digest and found again by a new cache object
+    """
+    model_dir = create_model_dir(tmp_path / "model")
+    model_uri = str(model_dir)
+
+    cached_path = ArtifactCache(tmp_path / "cache").resolve(model_uri)
+
+    assert cached_path.name == directory_digest(model_dir)
+    assert (cached_path / "data" / "model.xgb").read_bytes() == (
+        model_dir / "data" / "model.xgb"
+    ).read_bytes()
+    assert ArtifactCache(tmp_path / "cache").lookup(model_uri) == cached_path
+
+
+def test_corrupted_blob_is_downloaded_again(tmp_path) -> None:
+    """
+    Cached files which no longer match their digest fail the lookup, and
+    resolving the uri replaces them with a fresh download
+    """
+    model_dir = create_model_dir(tmp_path / "model")
+    model_uri = str(model_dir)
+    cache = ArtifactCache(tmp_path / "cache")
+    cached_path = cache.resolve(model_uri)
+
+    (cached_path / "data" / "model.xgb").write_bytes(b"truncated")
+    with pytest.raises(ArtifactCacheError):
+        cache.lookup(model_uri)
+
+    resolved_path = cache.resolve(model_uri)
+
+    assert resolved_path == cached_path
+    assert directory_digest(resolved_path) == directory_digest(model_dir)
+    assert cache.lookup(model_uri) == resolved_path
@@ -0,0 +1,138 @@
+"""
+Unit tests for the micro-batching of concurrent requests
+"""
+
+import asyncio
+import logging
+
+import numpy as np
+import pandas as pd
+from batching import MicroBatcher
+
+
+class RecordingModel:
+    """
+    Predicts the row values and records the size of each batch
+    """
+
+    def __init__(self) -> None:
+        self.batch_sizes: list[int] = []
+
+    async def predict(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        One prediction per row, equal to the row's value
+        """
+        self.batch_sizes.append(len(df))
+        await asyncio.sleep(0)
+        return df["value"].to_numpy(dtype=np.float64)
+
+
+def create_requests(sizes: list[int]) -> list[pd.DataFrame]:
+    """
+    Requests with consecutive values across all of them
+    """
+    offsets = np.cumsum([0] + sizes)
+    return [
+        pd.DataFrame({"value": np.arange(offsets[i], offsets[i + 1])}) for i in range(len(sizes))
+    ]
+
+
+async def predict_concurrently(
+    batcher: MicroBatcher, requests: list[pd.DataFrame], record_stats: bool = True
+) -> list[np.ndarray]:
+    """
+    Predict all requests at the same time
+    """
+    return await asyncio.gather(
+        *(batcher.predict(df, record_stats=record_stats) for df in requests)
+    )
+
+
+def test_each_request_gets_its_own_rows_in_order() -> None:
+    """
+    Concurrent requests are predicted in one call and get back their own predictions
+    """
+    model = RecordingModel()
+    requests = create_requests([3, 1, 5, 2])
+
+    async def run() -> list[np.ndarray]:
+        batcher = MicroBatcher(
+            model.predict, max_wait_ms=5, max_rows=100, logger=logging.getLogger()
+        )
+        return await predict_concurrently(batcher, requests)
+
+    results = asyncio.run(run())
+
+    assert model.batch_sizes == [11]
+    for df, predictions in zip(requests, results):
+        np.testing.assert_array_equal(predictions, df["value"].to_numpy(dtype=np.float64))
+
+
+def test_batches_never_exceed_max_rows() -> None:
+    """
+    A request which does not fit in the pending batch sends it off first, and
+    requests with at least max_rows rows are predicted alone
+    """
+    model = RecordingModel()
+    requests = create_requests([6, 3, 4, 8, 12, 1])
+
+    async def run() -> tuple[list[np.ndarray], dict]:
+        batcher = MicroBatcher(
+            model.predict, max_wait_ms=5, max_rows=10, logger=logging.getLogger()
+        )
+        results = await predict_concurrently(batcher, requests)
+        return results, batcher.stats()
+
+    results, stats = asyncio.run(run())
+
+    assert sorted(model.batch_sizes) == [4, 9, 9, 12]
+    assert stats["batches"] == 4
+    assert stats["rows"] == 34
+    assert stats["full_batches"] == 1
+    for df, predictions in zip(requests, results):
+        np.testing.assert_array_equal(predictions, df["value"].to_numpy(dtype=np.float64))
+
+
+def test_failed_batch_fails_all_its_requests() -> None:
+    """
+    Every request of a batch gets the exception of the model call
+    """
+
+    async def failing_predict(df: pd.DataFrame) -> np.ndarray:
+        raise RuntimeError("model failed")
+
+    async def run() -> list:
+        batcher = MicroBatcher(
+            failing_predict, max_wait_ms=5, max_rows=100, logger=logging.getLogger()
+        )
+        return await asyncio.gather(
+            *(batcher.predict(df) for df in create_requests([2, 2])), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_warm_up_calls_are_left_out_of_the_stats() -> None:
+    """
+    Requests predicted with record_stats=False do not count in the batch stats
+    """
+    model = RecordingModel()
+
+    async def run() -> dict:
+        batcher = MicroBatcher(
+            model.predict, max_wait_ms=5, max_rows=10, logger=logging.getLogger()
+        )
+        await predict_concurrently(batcher, create_requests([4, 20]), record_stats=False)
+        await predict_concurrently(batcher, create_requests([2, 3]))
+        return batcher.stats()
+
+    stats = asyncio.run(run())
+
+    assert len(model.batch_sizes) == 3
+    assert stats["batches"] == 1
+    assert stats["requests"] == 2
+    assert stats["rows"] == 5
+    assert stats["full_batches"] == 0
+    assert stats["mean_fill_ratio"] == 0.5
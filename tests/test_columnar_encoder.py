@@ -0,0 +1,84 @@
+"""
+Unit tests for the columnar encoder
+"""
+
+import pickle
+
+import numpy as np
+import pandas as pd
+from xgboost import XGBRegressor
+from sklearn.pipeline import make_pipeline
+from sklearn.feature_extraction import DictVectorizer
+
+from training.columnar_encoder import ColumnarEncoder
+from training.feature_engineering import feature_selection, feature_engineering
+
+
+def create_features(n_rows: int, seed: int) -> pd.DataFrame:
+    """
+    Random flight data after feature engineering and selection
+    """
+    rng = np.random.default_rng(seed)
+    cities = ["Banglore", "Kolkata", "Delhi", "New Delhi"]
+    df = pd.DataFrame(
+        {
+            "airline": rng.choice(["IndiGo", "Air India", "Jet Airways"], n_rows),
+            "source": rng.choice(cities, n_rows),
+            "destination": rng.choice(cities, n_rows),
+            "total_stops": rng.integers(0, 5, n_rows),
+            "date": rng.integers(1, 28, n_rows),
+            "month": rng.integers(1, 13, n_rows),
+            "year": rng.integers(1990, 2050, n_rows),
+            "dep_hours": rng.integers(0, 24, n_rows),
+            "dep_min": rng.integers(0, 60, n_rows),
+            "arrival_hours": rng.integers(0, 24, n_rows),
+            "arrival_min": rng.integers(0, 60, n_rows),
+            "duration_hours": rng.integers(0, 24, n_rows),
+            "duration_min": rng.integers(0, 60, n_rows),
+        }
+    )
+    return feature_selection(feature_engineering(df))
+
+
+def test_encoder_matches_dict_vectorizer() -> None:
+    """
+    Same features and sparsity structure as DictVectorizer on records,
+    also for unseen categories
+    """
+    train_df = create_features(500, seed=1)
+    test_df = create_features(100, seed=2)
+    test_df["airline"] = test_df["airline"].cat.add_categories("SAS")
+    test_df.loc[test_df.index[:5], "airline"] = "SAS"
+
+    vectorizer = DictVectorizer().fit(train_df.to_dict(orient="records"))
+    encoder = pickle.loads(pickle.dumps(ColumnarEncoder().fit(train_df)))
+
+    expected = vectorizer.transform(test_df.to_dict(orient="records"))
+    result = encoder.transform(test_df)
+    expected.sort_indices()
+    result.sort_indices()
+
+    assert list(encoder.get_feature_names_out()) == vectorizer.feature_names_
+    assert result.dtype == np.float32
+    np.testing.assert_array_equal(result.indptr, expected.indptr)
+    np.testing.assert_array_equal(result.indices, expected.indices)
+    np.testing.assert_array_equal(result.data, expected.data.astype(np.float32))
+
+
+def test_pipeline_predictions_match_dict_vectorizer() -> None:
+    """
+    An XGBoost model gives the same predictions with either encoder
+    """
+    train_df = create_features(500, seed=1)
+    test_df = create_features(100, seed=2)
+    y_train = np.random.default_rng(3).uniform(2000, 80000, len(train_df))
+    model_pars = {"n_estimators": 10, "max_depth": 6, "seed": 1991}
+
+    columnar = make_pipeline(ColumnarEncoder(), XGBRegressor(**model_pars))
+    columnar.fit(train_df, y_train)
+    records = make_pipeline(DictVectorizer(), XGBRegressor(**model_pars))
+    records.fit(train_df.to_dict(orient="records"), y_train)
+
+    np.testing.assert_array_equal(
+        columnar.predict(test_df), records.predict(test_df.to_dict(orient="records"))
+    )
@@ -0,0 +1,86 @@
+"""
+Unit tests for the single pass validation of request bodies into columns
+"""
+
+import numpy as np
+import pytest
+from synthetic_data import create_random_request
+from routers.api_models import PredictionPostAPIModel
+from columnar_validation import (
+    ColumnValidationError,
+    validate_columns,
+    parse_json_columns,
+)
+
+
+def test_columns_match_request_model() -> None:
+    """
+    A valid body gives the values of PredictionPostAPIModel, with int64 integer columns
+    """
+    data = create_random_request(20, seed=1)
+
+    columns = validate_columns(data)
+
+    expected = PredictionPostAPIModel(**data).model_dump()
+    assert list(columns) == list(expected)
+    for field, values in expected.items():
+        assert columns[field].tolist() == values
+    assert columns["total_stops"].dtype == np.int64
+    assert columns["airline"].dtype == object
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        ([True, False, 2], [1, 0, 2]),
+        ([1.0, 2, "3"], [1, 2, 3]),
+        (["4", "5", "6"], [4, 5, 6]),
+    ],
+)
+def test_integer_fields_are_coerced_like_pydantic(values, expected) -> None:
+    """
+    Booleans, whole floats and numeric strings become integers, as with PredictionPostAPIModel
+    """
+    data = create_random_request(3, seed=1)
+    data["total_stops"] = values
+
+    columns = validate_columns(data)
+
+    assert columns["total_stops"].tolist() == expected
+    assert columns["total_stops"].dtype == np.int64
+    assert PredictionPostAPIModel(**data).total_stops == expected
+
+
+@pytest.mark.parametrize(
+    "field, values, message",
+    [
+        ("total_stops", [1, 2.5, 3], r"^total_stops\[1\]: .*fractional part"),
+        ("year", [2024, None, 2024], r"^year\[1\]: Input should be a valid integer"),
+        ("dep_min", [1, 2, 2**63], r"^dep_min: values must fit in 64 bit integers"),
+        ("airline", ["IndiGo", "SpiceJet", True], r"^airline\[2\]: Input should be a valid string"),
+        ("source", "Delhi", r"^source: must be a list"),
+        ("date", [1, 2], r"^date: has 2 values, prediction_id has 3"),
+    ],
+)
+def test_invalid_values_name_field_and_position(field, values, message) -> None:
+    """
+    Errors name the first offending field, and the position of the value
+    """
+    data = create_random_request(3, seed=1)
+    data[field] = values
+
+    with pytest.raises(ColumnValidationError, match=message):
+        validate_columns(data)
+
+
+def test_missing_fields_and_non_object_bodies() -> None:
+    """
+    All missing fields are listed, and bodies other than objects are rejected
+    """
+    data = create_random_request(3, seed=1)
+    del data["month"], data["airline"]
+
+    with pytest.raises(ColumnValidationError, match=r"Missing fields: \['airline', 'month'\]"):
+        validate_columns(data)
+    with pytest.raises(ColumnValidationError, match="must be an object"):
+        parse_json_columns(b"[1, 2, 3]")
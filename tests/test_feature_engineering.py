@@ -0,0 +1,114 @@
+"""
+Unit tests for the vectorized feature engineering
+"""
+
+import numpy as np
+import pandas as pd
+
+from training import feature_engineering
+from training.feature_engineering import (
+    create_trip_ids,
+    create_weekday_feature,
+    _create_trip_ids_from_strings,
+    _create_weekday_feature_from_strings,
+    create_rounded_arrival_and_departure_times,
+    _create_rounded_arrival_and_departure_times_from_strings,
+)
+
+
+def create_test_data(n_rows: int) -> pd.DataFrame:
+    """
+    Random raw flight data, including out of range dates and times
+    """
+    rng = np.random.default_rng(1991)
+    df = pd.DataFrame(
+        {
+            "source": rng.choice(["Banglore", "New Delhi", "St petersburg"], n_rows),
+            "destination": rng.choice(["Kolkata", "New Delhi", "New York"], n_rows),
+            "date": rng.integers(-1, 35, n_rows),
+            "month": rng.integers(-1, 65, n_rows),
+            "year": rng.integers(1670, 2270, n_rows),
+            "dep_hours": rng.integers(-1, 26, n_rows),
+            "dep_min": rng.integers(-1, 62, n_rows),
+            "arrival_hours": rng.integers(0, 24, n_rows),
+            "arrival_min": rng.integers(0, 60, n_rows),
+        }
+    )
+    df.index = rng.permutation(n_rows)
+    return df
+
+
+def test_vectorized_features_match_string_implementation() -> None:
+    """
+    The vectorized features must be identical to the string based ones
+    """
+    df = create_test_data(5000)
+
+    pd.testing.assert_series_equal(
+        create_weekday_feature(df), _create_weekday_feature_from_strings(df)
+    )
+    pd.testing.assert_series_equal(create_trip_ids(df), _create_trip_ids_from_strings(df))
+    for vectorized, reference in zip(
+        create_rounded_arrival_and_departure_times(df),
+        _create_rounded_arrival_and_departure_times_from_strings(df),
+    ):
+        pd.testing.assert_series_equal(vectorized, reference)
+
+
+def test_rounded_times_keep_integer_dtype() -> None:
+    """
+    Valid times are rounded half to even and keep an integer dtype
+    """
+    df = pd.DataFrame(
+        {
+            "dep_hours": [4, 5, 23, 16],
+            "dep_min": [30, 30, 30, 29],
+            "arrival_hours": [0, 0, 0, 0],
+            "arrival_min": [0, 0, 0, 0],
+        }
+    )
+    dep_hours, _ = create_rounded_arrival_and_departure_times(df)
+
+    assert dep_hours.dtype == np.int32
+    assert dep_hours.tolist() == [4, 6, 0, 16]
+
+
+def test_lookup_tables_cover_whole_domain() -> None:
+    """
+    The weekday and rounded hour tables must match the string based features on
+    every year and minute of the day they cover, and just outside of them
+    """
+    years = np.arange(
+        feature_engineering.MIN_TIMESTAMP_YEAR - 1, feature_engineering.MAX_TIMESTAMP_YEAR + 2
+    )
+    dates = pd.DataFrame({"date": (years % 31) + 1, "month": years % 60, "year": years})
+    pd.testing.assert_series_equal(
+        create_weekday_feature(dates), _create_weekday_feature_from_strings(dates)
+    )
+
+    hours, minutes = np.divmod(np.arange(-60, 25 * 60), 60)
+    times = pd.DataFrame(
+        {
+            "dep_hours": hours,
+            "dep_min": minutes,
+            "arrival_hours": hours,
+            "arrival_min": 59 - minutes,
+        }
+    )
+    for vectorized, reference in zip(
+        create_rounded_arrival_and_departure_times(times),
+        _create_rounded_arrival_and_departure_times_from_strings(times),
+    ):
+        pd.testing.assert_series_equal(vectorized, reference)
+
+
+def test_trip_ids_of_large_frames_match_lookup(monkeypatch) -> None:
+    """
+    Trip ids of known and unknown cities are the same whether the frame is
+    looked up row by row or factorized
+    """
+    df = create_test_data(500)
+    looked_up = create_trip_ids(df)
+    monkeypatch.setattr(feature_engineering, "TRIP_ID_LOOKUP_MAX_ROWS", 0)
+    pd.testing.assert_series_equal(create_trip_ids(df), looked_up)
+    pd.testing.assert_series_equal(looked_up, _create_trip_ids_from_strings(df))
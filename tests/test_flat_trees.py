@@ -0,0 +1,71 @@
+"""
+Unit tests for the flattened tree evaluator
+"""
+
+import numpy as np
+import xgboost as xgb
+from scipy import sparse
+from flat_trees import FlatTreeEnsemble
+
+
+def create_data(n_rows: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Features with missing values whose target depends on which values are missing
+    """
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, 6)).astype(np.float32)
+    X[rng.random(X.shape) < 0.2] = np.nan
+    y = np.nansum(X[:, :3], axis=1) + np.where(np.isnan(X[:, 3]), 5.0, -np.nan_to_num(X[:, 3]))
+    y += np.where(np.isnan(X[:, 4]), -3.0, 2.0) + rng.normal(scale=0.1, size=n_rows)
+    return X, (y * 1000 + 20000).astype(np.float32)
+
+
+def train_booster() -> xgb.Booster:
+    """
+    A small regression booster with missing values in its training data
+    """
+    X, y = create_data(2000, seed=1)
+    return xgb.train(
+        {"max_depth": 5, "eta": 0.3, "seed": 1991},
+        xgb.DMatrix(X, label=y, missing=np.nan),
+        num_boost_round=30,
+    )
+
+
+def test_predictions_match_booster() -> None:
+    """
+    Dense rows with missing values, and sparse rows without the missing entries,
+    are predicted as by the booster, with both default directions in use
+    """
+    booster = train_booster()
+    ensemble = FlatTreeEnsemble.from_booster(booster)
+    inner_nodes = ensemble.left != np.arange(len(ensemble.left))
+    X, _ = create_data(500, seed=2)
+    # Values exactly on a split threshold go right
+    X[np.arange(10), ensemble.features[inner_nodes][:10]] = ensemble.thresholds[inner_nodes][:10]
+
+    expected = booster.inplace_predict(X, missing=np.nan)
+
+    assert ensemble.default_left[inner_nodes].any()
+    assert not ensemble.default_left[inner_nodes].all()
+    assert np.allclose(ensemble.predict(X), expected, rtol=1e-6)
+    # The NaNs are not stored in the sparse matrix, so they are missing
+    csr = sparse.csr_matrix(np.nan_to_num(X, nan=0.0))
+    assert np.allclose(ensemble.predict(csr), expected, rtol=1e-6)
+
+
+def test_iteration_range_and_saved_arrays(tmp_path) -> None:
+    """
+    A subset of the trees predicts as the booster does with the same iteration
+    range, also after saving and loading the arrays
+    """
+    booster = train_booster()
+    X, _ = create_data(100, seed=3)
+    ensemble = FlatTreeEnsemble.from_booster(booster, iteration_range=(0, 10))
+    ensemble.save(tmp_path / "trees.npz")
+
+    loaded = FlatTreeEnsemble.load(tmp_path / "trees.npz")
+
+    expected = booster.inplace_predict(X, iteration_range=(0, 10), missing=np.nan)
+    assert len(loaded.roots) == 10
+    assert np.allclose(loaded.predict(X), expected, rtol=1e-6)
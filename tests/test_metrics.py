@@ -0,0 +1,54 @@
+"""
+Unit tests for the metrics shared by the workers
+"""
+
+import subprocess
+
+import numpy as np
+import metrics
+from metrics import Gauge, Counter, MetricsRegistry
+from inference_executor import InferenceExecutor
+
+
+def exited_pid() -> int:
+    """
+    Id of a process which is no longer running
+    """
+    process = subprocess.Popen(["true"])
+    process.wait()
+    return process.pid
+
+
+def test_gauges_add_up_live_processes_only(tmp_path) -> None:
+    """
+    Counters add up the files of all processes, gauges those of running processes
+    """
+    gauge = Gauge("test_queue_depth", "Queue depth")
+    counter = Counter("test_requests_total", "Requests", label_name="outcome", label_values=("ok",))
+    registry = MetricsRegistry([counter, gauge])
+    registry.set_directory(str(tmp_path))
+    counter.inc("ok")
+    gauge.set(3)
+    for pid, values in ((exited_pid(), [2.0, 5.0]), (1, [4.0, 4.0])):
+        np.array(values).tofile(tmp_path / f"metrics_{pid}.bin")
+
+    text = registry.render()
+
+    assert 'test_requests_total{outcome="ok"} 7' in text
+    assert "# TYPE test_queue_depth gauge\ntest_queue_depth 7.0" in text
+
+
+def test_executor_exports_in_flight_requests() -> None:
+    """
+    Reserving and releasing inference slots updates the in-flight gauge
+    """
+    executor = InferenceExecutor(max_workers=0, max_in_flight=2)
+    slot = metrics.INFERENCE_IN_FLIGHT.offsets[""]
+
+    executor.reserve_slot()
+    executor.reserve_slot()
+    assert metrics.REGISTRY.values[slot] == 2
+    executor.release_slot()
+    assert metrics.REGISTRY.values[slot] == 1
+    executor.release_slot()
+    assert metrics.REGISTRY.values[slot] == 0
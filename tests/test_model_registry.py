@@ -0,0 +1,164 @@
+"""
+Unit tests for the model registry, its manifest and the model versions
+"""
+
+import json
+import asyncio
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+from model_registry import (
+    ModelVersion,
+    ModelRegistry,
+    ModelRegistryError,
+    read_manifest,
+    write_manifest,
+)
+from prediction_cache import PredictionCache
+from inference_executor import InferenceExecutor
+
+
+class RecordingModel:
+    """
+    Predicts twice the number of stops and records the rows of each call
+    """
+
+    def __init__(self) -> None:
+        self.calls: list[list[int]] = []
+
+    def predict(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        One prediction per row
+        """
+        self.calls.append(df["total_stops"].tolist())
+        return df["total_stops"].to_numpy(dtype=np.float64) * 2
+
+
+def create_version(
+    name: str, model_uri: str, model: RecordingModel | None = None, cache: bool = False
+) -> ModelVersion:
+    """
+    A version predicting in the event loop, without a model unless one is given
+    """
+    prediction_cache = None
+    if cache:
+        prediction_cache = PredictionCache(fields=["total_stops"], max_size=10, ttl_s=60.0)
+        prediction_cache.bind(model_uri)
+    return ModelVersion(
+        name=name,
+        model_uri=model_uri,
+        model=model,
+        executor=InferenceExecutor(max_workers=0, max_in_flight=1),
+        cache=prediction_cache,
+        load_seconds=0.0,
+        warmup_seconds=0.0,
+        memory_mb=None,
+    )
+
+
+def test_manifest_round_trip(tmp_path) -> None:
+    """
+    A registry's manifest read back from disk loads the same versions and default
+    """
+    registry = ModelRegistry(max_versions=2)
+    registry.add(create_version("blue", "runs:/blue/model"))
+    registry.add(create_version("green", "runs:/green/model"), make_default=True)
+    path = tmp_path / "manifest.json"
+
+    write_manifest(path, registry.manifest())
+    manifest = read_manifest(path)
+
+    assert manifest == {
+        "default": "green",
+        "versions": {"blue": "runs:/blue/model", "green": "runs:/green/model"},
+    }
+    assert list(tmp_path.iterdir()) == [path]
+
+    follower = ModelRegistry(max_versions=2)
+    follower.check_manifest(manifest)
+    for name, model_uri in manifest["versions"].items():
+        follower.add(create_version(name, model_uri), make_default=name == manifest["default"])
+    assert follower.manifest() == manifest
+
+
+@pytest.mark.parametrize(
+    "manifest",
+    [
+        {"default": "blue", "versions": {}},
+        {"default": "blue", "versions": ["runs:/blue/model"]},
+        {"default": "green", "versions": {"blue": "runs:/blue/model"}},
+    ],
+)
+def test_malformed_manifest_is_rejected(tmp_path, manifest) -> None:
+    """
+    Manifests without versions or with an unknown default raise ValueError
+    """
+    path = tmp_path / "manifest.json"
+    path.write_text(json.dumps(manifest), encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        read_manifest(path)
+
+
+def test_registry_limits_and_default() -> None:
+    """
+    The registry refuses more than max_versions versions and unloading the default
+    """
+    registry = ModelRegistry(max_versions=2)
+    registry.add(create_version("blue", "runs:/blue/model"))
+    registry.add(create_version("green", "runs:/green/model"))
+
+    assert registry.get().name == "blue"
+    registry.check_capacity("green")
+    with pytest.raises(ModelRegistryError):
+        registry.check_capacity("red")
+    with pytest.raises(ModelRegistryError):
+        registry.check_manifest({"default": "a", "versions": {"a": "1", "b": "2", "c": "3"}})
+    with pytest.raises(ModelRegistryError):
+        registry.remove("blue")
+
+    registry.set_default("green")
+    registry.remove("blue")
+    assert list(registry.versions) == ["green"]
+    with pytest.raises(KeyError):
+        registry.get("blue")
+
+
+def test_version_predicts_cache_misses_only() -> None:
+    """
+    With the cache enabled, only rows without a cached prediction reach the model
+    """
+    model = RecordingModel()
+    model_version = create_version("blue", "runs:/blue/model", model=model, cache=True)
+
+    first = asyncio.run(model_version.predict(pd.DataFrame({"total_stops": [0, 1]})))
+    second = asyncio.run(model_version.predict(pd.DataFrame({"total_stops": [1, 2, 0]})))
+
+    np.testing.assert_array_equal(first, [0.0, 2.0])
+    np.testing.assert_array_equal(second, [2.0, 4.0, 0.0])
+    assert model.calls == [[0, 1], [2]]
+
+
+def test_version_batches_concurrent_requests() -> None:
+    """
+    With batching enabled, concurrent requests share one model call
+    """
+    model = RecordingModel()
+    model_version = create_version("blue", "runs:/blue/model", model=model)
+    model_version.enable_batching(
+        max_wait_ms=50, max_rows=100, logger=logging.getLogger("test_model_registry")
+    )
+
+    async def predict_concurrently() -> list[np.ndarray]:
+        return await asyncio.gather(
+            model_version.predict(pd.DataFrame({"total_stops": [0, 1]})),
+            model_version.predict(pd.DataFrame({"total_stops": [2]})),
+        )
+
+    first, second = asyncio.run(predict_concurrently())
+
+    np.testing.assert_array_equal(first, [0.0, 2.0])
+    np.testing.assert_array_equal(second, [4.0])
+    assert model.calls == [[0, 1, 2]]
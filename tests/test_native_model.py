@@ -0,0 +1,54 @@
+"""
+Unit tests for loading logged models without mlflow
+"""
+
+import sys
+import pickle
+import importlib
+from pathlib import Path
+
+import yaml
+from native_model import load_sklearn_model
+
+MODULE = "logged_scaling"
+
+
+def log_model(model_path: Path, factor: int) -> None:
+    """
+    Log a function of a module in the model's code directory, scaling by factor
+    """
+    code_path = model_path / "code"
+    code_path.mkdir(parents=True)
+    (code_path / f"{MODULE}.py").write_text(
+        f"def scale(x):\n    return x * {factor}\n", encoding="utf-8"
+    )
+    sys.path.insert(0, str(code_path))
+    try:
+        module = importlib.import_module(MODULE)
+        (model_path / "model.pkl").write_bytes(pickle.dumps(module.scale))
+    finally:
+        sys.path.remove(str(code_path))
+        sys.modules.pop(MODULE)
+    flavor = {"code": "code", "pickled_model": "model.pkl", "serialization_format": "cloudpickle"}
+    (model_path / "MLmodel").write_text(
+        yaml.safe_dump({"flavors": {"sklearn": flavor}}), encoding="utf-8"
+    )
+
+
+def test_each_version_gets_its_logged_code(tmp_path) -> None:
+    """
+    A version whose logged code differs is not loaded against the modules of the
+    version loaded before it, and sys.path is left as it was
+    """
+    log_model(tmp_path / "v1", factor=1)
+    log_model(tmp_path / "v2", factor=2)
+    path_before = list(sys.path)
+
+    try:
+        v1 = load_sklearn_model(str(tmp_path / "v1"))
+        v2 = load_sklearn_model(str(tmp_path / "v2"))
+    finally:
+        sys.modules.pop(MODULE, None)
+
+    assert (v1(3), v2(3)) == (3, 6)
+    assert sys.path == path_before
@@ -0,0 +1,93 @@
+"""
+Unit tests for the prediction cache
+"""
+
+import types
+
+import numpy as np
+import pandas as pd
+import prediction_cache
+from prediction_cache import PredictionCache
+
+
+def create_rows(values: list[int]) -> pd.DataFrame:
+    """
+    Input rows keyed by an airline and a number of stops
+    """
+    return pd.DataFrame({"airline": ["IndiGo"] * len(values), "total_stops": values})
+
+
+def create_cache(max_size: int = 10, ttl_s: float = 60.0) -> PredictionCache:
+    """
+    Cache bound to a model
+    """
+    cache = PredictionCache(fields=["airline", "total_stops"], max_size=max_size, ttl_s=ttl_s)
+    cache.bind("runs:/model-a")
+    return cache
+
+
+def test_cached_rows_are_found_and_others_missing() -> None:
+    """
+    Stored predictions are returned by key, with the positions of unknown rows
+    """
+    cache = create_cache()
+    cache.put_many(cache.keys(create_rows([0, 1])), np.array([10.0, 11.0]))
+
+    predictions, missing = cache.get_many(cache.keys(create_rows([1, 2, 0])))
+
+    np.testing.assert_array_equal(predictions, [11.0, np.nan, 10.0])
+    np.testing.assert_array_equal(missing, [1])
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_rows_are_evicted() -> None:
+    """
+    Looking a row up keeps it, the least recently used row is evicted when full
+    """
+    cache = create_cache(max_size=2)
+    cache.put_many(cache.keys(create_rows([0, 1])), np.array([10.0, 11.0]))
+    cache.get_many(cache.keys(create_rows([0])))
+    cache.put_many(cache.keys(create_rows([2])), np.array([12.0]))
+
+    _, missing = cache.get_many(cache.keys(create_rows([0, 1, 2])))
+
+    np.testing.assert_array_equal(missing, [1])
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+
+
+def test_rows_expire_after_ttl(monkeypatch) -> None:
+    """
+    A row is dropped on the first lookup after its ttl ran out
+    """
+    now = [100.0]
+    monkeypatch.setattr(prediction_cache, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    cache = create_cache(ttl_s=5.0)
+    cache.put_many(cache.keys(create_rows([0])), np.array([10.0]))
+
+    now[0] = 104.0
+    _, missing = cache.get_many(cache.keys(create_rows([0])))
+    assert len(missing) == 0
+
+    now[0] = 105.0
+    _, missing = cache.get_many(cache.keys(create_rows([0])))
+    np.testing.assert_array_equal(missing, [0])
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_binding_another_model_clears_the_cache() -> None:
+    """
+    Rebinding the same model keeps the entries, binding a different one drops them
+    """
+    cache = create_cache()
+    cache.put_many(cache.keys(create_rows([0, 1])), np.array([10.0, 11.0]))
+
+    cache.bind("runs:/model-a")
+    assert cache.stats()["size"] == 2
+
+    cache.bind("runs:/model-b")
+    _, missing = cache.get_many(cache.keys(create_rows([0, 1])))
+    np.testing.assert_array_equal(missing, [0, 1])
+    assert cache.stats()["model_uri"] == "runs:/model-b"
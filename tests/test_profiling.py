@@ -0,0 +1,69 @@
+"""
+Unit tests for the sampled profiling of prediction requests
+"""
+
+import asyncio
+import logging
+import threading
+
+from profiling import RequestProfile, RequestProfiler
+
+
+def create_profiler(directory, max_files: int = 10) -> RequestProfiler:
+    """
+    Profiler of every request
+    """
+    return RequestProfiler(
+        directory,
+        sample_every=1,
+        slow_ms=0,
+        interval_ms=5,
+        max_files=max_files,
+        logger=logging.getLogger("test_profiling"),
+    )
+
+
+def create_profile(profiler: RequestProfiler, number: int) -> RequestProfile:
+    """
+    Sampled profile with one stack
+    """
+    profile = RequestProfile(profiler, number, sampled=True)
+    profile.stacks["MainThread;predict (routers/predict.py:1)"] = 3
+    return profile
+
+
+def test_profiles_are_written_off_the_event_loop(tmp_path) -> None:
+    """
+    Profiles finished on the event loop are written by another thread
+    """
+    profiler = create_profiler(tmp_path / "profiles")
+    writing_threads = []
+    write = profiler.write
+
+    def record_thread(*args) -> bool:
+        writing_threads.append(threading.current_thread())
+        return write(*args)
+
+    profiler.write = record_thread
+
+    async def finish_request():
+        path = profiler.finish(create_profile(profiler, 1), 0.02)
+        await asyncio.get_running_loop().shutdown_default_executor()
+        return path, threading.current_thread()
+
+    path, loop_thread = asyncio.run(finish_request())
+
+    assert path.read_text(encoding="utf-8") == "MainThread;predict (routers/predict.py:1) 3\n"
+    assert writing_threads and writing_threads[0] is not loop_thread
+
+
+def test_files_are_limited_to_max_files(tmp_path) -> None:
+    """
+    Profiles beyond max_files are discarded
+    """
+    profiler = create_profiler(tmp_path, max_files=1)
+
+    assert profiler.finish(create_profile(profiler, 1), 0.02) is not None
+    assert profiler.finish(create_profile(profiler, 2), 0.02) is None
+    assert profiler.stats()["written_files"] == 1
+    assert profiler.stats()["discarded"] == 1
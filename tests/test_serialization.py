@@ -0,0 +1,107 @@
+"""
+Unit tests for the request and response formats of the prediction service
+"""
+
+import io
+
+import numpy as np
+import orjson
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from streaming import NDJSON as STREAM_NDJSON
+from serialization import (
+    CSV,
+    JSON,
+    ARROW,
+    MSGPACK,
+    COLUMNAR_JSON,
+    REQUEST_MEDIA_TYPES,
+    RESPONSE_MEDIA_TYPES,
+    negotiate_accept,
+    encode_predictions,
+    parse_content_type,
+)
+from synthetic_data import create_random_request
+from columnar_validation import parse_json_columns
+
+
+def test_content_type_picks_request_format() -> None:
+    """
+    Parameters, case and aliases are ignored, anything unknown is parsed as JSON
+    """
+    assert parse_content_type(None) == JSON
+    assert parse_content_type("text/csv; charset=utf-8") == CSV
+    assert parse_content_type("Application/X-MsgPack") == MSGPACK
+    assert parse_content_type("application/vnd.apache.arrow.stream") == ARROW
+    assert parse_content_type("application/vnd.apache.arrow.file") == ARROW
+    assert parse_content_type("text/plain") == JSON
+
+
+def test_accept_respects_quality_and_order() -> None:
+    """
+    The supported media type with the highest q-value wins, ties go to the first one
+    """
+    assert negotiate_accept(None) == JSON
+    assert negotiate_accept("text/csv;q=0.5, application/msgpack") == MSGPACK
+    assert negotiate_accept("application/msgpack, text/csv") == MSGPACK
+    assert negotiate_accept("application/msgpack;q=0, text/csv;q=0.1") == CSV
+    assert negotiate_accept("application/vnd.msgpack") == MSGPACK
+    assert negotiate_accept(f"{COLUMNAR_JSON}, */*;q=0.1") == COLUMNAR_JSON
+    assert negotiate_accept("application/*") == JSON
+
+
+def test_accept_without_supported_media_type_means_json() -> None:
+    """
+    Unsupported media types, and Arrow files which are not written, fall back to JSON
+    """
+    assert negotiate_accept("text/html") == JSON
+    assert negotiate_accept("text/*") == JSON
+    assert negotiate_accept("application/vnd.apache.arrow.file") == JSON
+    assert negotiate_accept("text/html, application/xml;q=0.9") == JSON
+
+
+def test_predictions_are_encoded_one_row_each() -> None:
+    """
+    Arrow and CSV responses hold one row per prediction in request order
+    """
+    preds = np.array([1.5, 2.5, 3.5], dtype=np.float32)
+    pred_ids = ["a", "b", "c"]
+
+    arrow_body = encode_predictions(ARROW, pred_ids, preds, "flight-price-prediction", "v1")
+    table = pa.ipc.open_stream(arrow_body).read_all()
+    csv_body = encode_predictions(CSV, pred_ids, preds, "flight-price-prediction", "v1")
+    csv_table = pa_csv.read_csv(io.BytesIO(csv_body))
+
+    for decoded in (table, csv_table):
+        assert decoded.column("ride_id").to_pylist() == pred_ids
+        assert decoded.column("ride_duration").to_pylist() == [1.5, 2.5, 3.5]
+        assert decoded.column("version").to_pylist() == ["v1"] * 3
+
+
+def test_accept_picks_among_given_media_types() -> None:
+    """
+    The streaming route chooses between NDJSON and Arrow, defaulting to NDJSON
+    """
+    supported = [STREAM_NDJSON, ARROW]
+
+    assert negotiate_accept(None, supported, default=STREAM_NDJSON) == STREAM_NDJSON
+    assert negotiate_accept("*/*", supported, default=STREAM_NDJSON) == STREAM_NDJSON
+    assert negotiate_accept(ARROW, supported, default=STREAM_NDJSON) == ARROW
+    assert negotiate_accept(f"{ARROW};q=0.2, {STREAM_NDJSON}", supported, STREAM_NDJSON) == (
+        STREAM_NDJSON
+    )
+    # A media type which merely contains the Arrow one is not Arrow
+    assert negotiate_accept(f"{ARROW}-v2", supported, default=STREAM_NDJSON) == STREAM_NDJSON
+    assert negotiate_accept(CSV, supported, default=STREAM_NDJSON) == STREAM_NDJSON
+
+
+def test_columnar_json_is_a_response_format_only() -> None:
+    """
+    Columnar JSON may be accepted, a body sent as columnar JSON is read as JSON
+    """
+    body = orjson.dumps(create_random_request(3, seed=1))
+
+    assert COLUMNAR_JSON in RESPONSE_MEDIA_TYPES
+    assert COLUMNAR_JSON not in REQUEST_MEDIA_TYPES
+    assert parse_content_type(COLUMNAR_JSON) == JSON
+    assert len(parse_json_columns(body)["prediction_id"]) == 3
@@ -0,0 +1,43 @@
+"""
+Unit tests for the shadow scoring of sampled requests
+"""
+
+import os
+import logging
+
+from shadow import ShadowScorer
+
+
+def sampling_draws(scorer: ShadowScorer, n_draws: int = 20) -> list[float]:
+    """
+    The next random numbers deciding which requests are sampled
+    """
+    return [scorer._random.random() for _ in range(n_draws)]  # pylint: disable=protected-access
+
+
+def test_forked_workers_sample_independently() -> None:
+    """
+    A scorer created before forking samples differently in the child than in the parent
+    """
+    for seed in (None, 7):
+        scorer = ShadowScorer(
+            model=None,
+            model_uri="runs:/shadow/model",
+            sample_rate=0.1,
+            cpu_budget=0.1,
+            logger=logging.getLogger("test_shadow"),
+            seed=seed,
+        )
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            os.write(write_fd, repr(sampling_draws(scorer)).encode())
+            os._exit(0)  # pylint: disable=protected-access
+        os.close(write_fd)
+        with os.fdopen(read_fd) as f:
+            child_draws = f.read()
+        os.waitpid(pid, 0)
+        scorer.shutdown()
+
+        assert child_draws != repr(sampling_draws(scorer))
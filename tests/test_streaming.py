@@ -0,0 +1,122 @@
+"""
+Unit tests for the incremental readers of streamed request bodies
+"""
+
+import json
+
+import pandas as pd
+import pytest
+import pyarrow as pa
+from streaming import (
+    END_OF_ARROW_STREAM,
+    ArrowReader,
+    NdjsonReader,
+    arrow_message_length,
+)
+from synthetic_data import create_random_request
+
+
+def create_rows(n_rows: int) -> pd.DataFrame:
+    """
+    Valid input rows in the request schema
+    """
+    return pd.DataFrame(create_random_request(n_rows, seed=n_rows))
+
+
+def read_all(reader: NdjsonReader | ArrowReader, body: bytes, part_size: int) -> pd.DataFrame:
+    """
+    Feed a body in parts of part_size bytes and return all decoded rows
+    """
+    frames = []
+    for start in range(0, len(body), part_size):
+        frames += reader.feed(body[start : start + part_size])
+    frames += reader.finish()
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_ndjson_lines_split_across_parts() -> None:
+    """
+    Lines cut between parts are decoded once complete, blank lines are skipped
+    and the last line needs no newline
+    """
+    rows = create_rows(7)
+    lines = [json.dumps(row) for row in rows.to_dict(orient="records")]
+    body = ("\n".join(lines[:3]) + "\n\n" + "\n".join(lines[3:])).encode()
+
+    result = read_all(NdjsonReader(), body, part_size=37)
+
+    pd.testing.assert_frame_equal(result, rows)
+
+
+def test_ndjson_invalid_line_names_its_line_number() -> None:
+    """
+    A row failing validation raises ValueError with the line it is on
+    """
+    rows = create_rows(2).to_dict(orient="records")
+    rows[1]["total_stops"] = "many"
+    body = ("\n" + "\n".join(json.dumps(row) for row in rows) + "\n").encode()
+
+    with pytest.raises(ValueError, match="Invalid row on line 3"):
+        NdjsonReader().feed(body)
+
+
+def arrow_stream(rows: pd.DataFrame, batch_rows: int) -> bytes:
+    """
+    Arrow IPC stream of the rows in record batches of batch_rows rows
+    """
+    table = pa.Table.from_pandas(rows, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+@pytest.mark.parametrize("part_size", [1, 100, 1_000_000])
+def test_arrow_batches_split_across_parts(part_size: int) -> None:
+    """
+    Record batches are decoded as soon as their bytes arrived, in order
+    """
+    rows = create_rows(10)
+    body = arrow_stream(rows, batch_rows=3)
+
+    reader = ArrowReader()
+    result = read_all(reader, body, part_size=part_size)
+
+    pd.testing.assert_frame_equal(result, rows)
+    assert reader.finished
+
+
+def test_arrow_message_lengths_match_pyarrow() -> None:
+    """
+    The length read from a message's prefix and metadata is the number of bytes
+    pyarrow reads for it, and is only known once the metadata arrived
+    """
+    body = bytearray(arrow_stream(create_rows(10), batch_rows=4))
+    source = pa.BufferReader(bytes(body))
+    offset = 0
+    while True:
+        length = arrow_message_length(body, offset)
+        if length == 0:
+            break
+        assert arrow_message_length(body[: offset + 7], offset) is None
+        pa.ipc.read_message(source)
+        assert offset + length == source.tell()
+        offset += length
+    assert bytes(body[offset:]) == END_OF_ARROW_STREAM
+
+
+def test_arrow_stream_cut_off_mid_message() -> None:
+    """
+    A body ending inside a message raises ValueError when the stream is finished
+    """
+    table = pa.Table.from_pandas(create_rows(5), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    body = sink.getvalue().to_pybytes()
+
+    reader = ArrowReader()
+    reader.feed(body[: len(body) // 2])
+    with pytest.raises(ValueError, match="middle of a message"):
+        reader.finish()
@@ -0,0 +1,170 @@
+"""
+Unit tests for the tracing of prediction requests
+"""
+
+import json
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+import tracing
+from tracing import Span, Tracer, SpanExporter, FileSpanExporter, parse_trace_header
+
+from training import feature_engineering
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+class ListSpanExporter(SpanExporter):
+    """
+    Keeps the spans of each exported trace
+    """
+
+    def __init__(self) -> None:
+        self.traces: list[list[Span]] = []
+
+    def export(self, spans: list[Span]) -> None:
+        self.traces.append(list(spans))
+
+
+def create_flights() -> pd.DataFrame:
+    """
+    Raw flight data with all fields the feature engineering needs
+    """
+    return pd.DataFrame(
+        {
+            "airline": ["IndiGo", "Air India"],
+            "source": ["Banglore", "Kolkata"],
+            "destination": ["New Delhi", "Banglore"],
+            "total_stops": [0, 2],
+            "date": [24, 1],
+            "month": [3, 5],
+            "year": [2019, 2019],
+            "dep_hours": [22, 5],
+            "dep_min": [20, 50],
+            "arrival_hours": [1, 13],
+            "arrival_min": [10, 15],
+            "duration_hours": [2, 7],
+            "duration_min": [50, 25],
+        }
+    )
+
+
+def test_trace_headers() -> None:
+    """
+    W3C traceparents give the trace and parent span, plain ids the trace only
+    """
+    assert parse_trace_header(TRACEPARENT) == (
+        "0af7651916cd43dd8448eb211c80319c",
+        "b7ad6b7169203331",
+    )
+    assert parse_trace_header(" request-42 ") == ("request-42", None)
+    assert parse_trace_header("00-xyz-01") == ("00-xyz-01", None)
+    assert parse_trace_header("not a trace id") == (None, None)
+    assert parse_trace_header(None) == (None, None)
+
+
+def test_spans_continue_the_incoming_trace() -> None:
+    """
+    Spans started in the request, also in other threads given its context,
+    belong to the trace of the traceparent and nest under the root span
+    """
+    exporter = ListSpanExporter()
+    tracer = Tracer(exporter, logging.getLogger())
+
+    def stage(name: str) -> None:
+        with tracing.start_span(name):
+            pass
+
+    with tracer.trace("invocations", TRACEPARENT) as root:
+        root.set_trace_attribute("rows", 2)
+        stage("validation")
+        with ThreadPoolExecutor(1) as executor:
+            executor.submit(contextvars.copy_context().run, stage, "model").result()
+
+    (spans,) = exporter.traces
+    assert [span.name for span in spans] == ["validation", "model", "invocations"]
+    assert {span.trace_id for span in spans} == {"0af7651916cd43dd8448eb211c80319c"}
+    assert root.parent_id == "b7ad6b7169203331"
+    assert spans[0].parent_id == spans[1].parent_id == root.span_id
+    assert spans[1].thread != root.thread
+    assert all(span.to_dict()["attributes"]["rows"] == 2 for span in spans)
+    assert root.to_dict()["attributes"]["status_code"] == 200
+    assert tracing.start_span("outside") is None
+
+
+def test_failed_request_is_exported_with_its_status() -> None:
+    """
+    The root span records the HTTP status of the exception ending the request
+    """
+
+    class BadRequest(Exception):
+        status_code = 400
+
+    exporter = ListSpanExporter()
+    tracer = Tracer(exporter, logging.getLogger())
+
+    with pytest.raises(BadRequest):
+        with tracer.trace("invocations"):
+            raise BadRequest()
+
+    (root,) = exporter.traces[0]
+    assert len(root.trace_id) == 32
+    assert root.status == "error"
+    assert root.attributes == {"status_code": 400, "error": "BadRequest"}
+
+
+def test_disabled_tracer_and_abstract_exporter() -> None:
+    """
+    Without an exporter requests are not traced, and exporters must implement export
+    """
+    tracer = Tracer.create("none", "", logging.getLogger())
+    with tracer.trace("invocations", TRACEPARENT) as root:
+        assert root.trace_id is None
+        assert tracing.start_span("model") is None
+
+    with pytest.raises(TypeError):
+        SpanExporter()  # pylint: disable=abstract-class-instantiated
+
+
+def test_file_exporter_appends_json_lines(tmp_path) -> None:
+    """
+    Each span of a trace is one line of JSON
+    """
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(FileSpanExporter(str(path)), logging.getLogger())
+    for _ in range(2):
+        with tracer.trace("invocations", "request-42"):
+            with tracing.start_span("model"):
+                pass
+    tracer.shutdown()
+
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [line["name"] for line in lines] == ["model", "invocations"] * 2
+    assert {line["trace_id"] for line in lines} == {"request-42"}
+
+
+def test_module_functions_are_traced_in_a_copy() -> None:
+    """
+    The copy of the pipeline function traces the feature functions it calls
+    through other functions of the module, which itself is left unchanged
+    """
+    original = feature_engineering.create_trip_ids
+    pipeline, traced_names = tracing.trace_module_functions(
+        feature_engineering.preprocessing_pipeline, tracing.FEATURE_FUNCTIONS + ("missing",)
+    )
+    exporter = ListSpanExporter()
+    tracer = Tracer(exporter, logging.getLogger())
+    df = create_flights()
+
+    with tracer.trace("invocations"):
+        result = pipeline(df)
+
+    assert traced_names == list(tracing.FEATURE_FUNCTIONS)
+    assert feature_engineering.create_trip_ids is original
+    pd.testing.assert_frame_equal(result, feature_engineering.preprocessing_pipeline(df))
+    spans = exporter.traces[0]
+    assert sorted(span.name for span in spans[:-1]) == sorted(tracing.FEATURE_FUNCTIONS)
+    assert all(span.attributes["rows"] == 2 for span in spans[:-1])
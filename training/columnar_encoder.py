@@ -0,0 +1,149 @@
+"""
+A columnar replacement for turning dataframes into records and feeding
+them to sklearn's DictVectorizer.
+Written by Magnus Pierrau for MLOps Zoomcamp Final Project Cohort 2024
+"""
+
+import numpy as np
+import pandas as pd
+import numpy.typing as npt
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin
+
+
+class ColumnarEncoder(TransformerMixin, BaseEstimator):
+    """
+    One-hot encodes string columns and passes numerical columns through,
+    going straight from dataframe columns to a matrix.
+
+    The output has the same features, feature order and sparsity structure as
+    DictVectorizer(sort=True) applied to df.to_dict(orient="records"): a categorical
+    column only stores an entry for the category present in the row, and numerical
+    columns are always stored, also when zero. Tree models such as XGBoost treat
+    entries that are not stored as missing, so this keeps predictions identical.
+    Categories not seen during fit, and missing categorical values, are not stored.
+    """
+
+    def __init__(
+        self,
+        dtype: npt.DTypeLike = np.float32,
+        separator: str = "=",
+        sparse_output: bool = True,
+    ) -> None:
+        """
+        Args:
+            dtype (npt.DTypeLike, optional): dtype of the output matrix. Defaults to np.float32.
+            separator (str, optional): Separator between column name and category in
+                the feature names. Defaults to "=".
+            sparse_output (bool, optional): Whether to return a scipy CSR matrix or a
+                dense array. Entries which are not stored in the sparse output are zero
+                in the dense output. Defaults to True.
+        """
+        self.dtype = dtype
+        self.separator = separator
+        self.sparse_output = sparse_output
+
+    @staticmethod
+    def _is_categorical(column: pd.Series) -> bool:
+        """
+        Whether the column holds strings, which are one-hot encoded.
+
+        Args:
+            column (pd.Series): Column to check
+
+        Returns:
+            bool: True if the values (or categories) of the column are strings
+        """
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            return not pd.api.types.is_numeric_dtype(column.cat.categories.dtype)
+        return not pd.api.types.is_numeric_dtype(column.dtype)
+
+    def fit(self, X: pd.DataFrame, y: npt.ArrayLike | None = None) -> "ColumnarEncoder":
+        """
+        Learn the vocabulary of each categorical column and the output position
+        of every feature.
+
+        Args:
+            X (pd.DataFrame): Dataframe with features
+            y (npt.ArrayLike | None, optional): Ignored. Defaults to None.
+
+        Returns:
+            ColumnarEncoder: The fitted encoder
+        """
+        self.numerical_columns_ = [col for col in X.columns if not self._is_categorical(X[col])]
+        self.categorical_columns_ = [col for col in X.columns if self._is_categorical(X[col])]
+        self.categories_ = {
+            col: np.sort(pd.unique(X[col].dropna().astype(str).to_numpy())).astype(object)
+            for col in self.categorical_columns_
+        }
+
+        feature_names = list(self.numerical_columns_) + [
+            f"{col}{self.separator}{category}"
+            for col in self.categorical_columns_
+            for category in self.categories_[col]
+        ]
+        order = np.argsort(np.array(feature_names, dtype=object), kind="stable")
+        positions = np.empty(len(feature_names), dtype=np.int32)
+        positions[order] = np.arange(len(feature_names), dtype=np.int32)
+
+        self.feature_names_ = np.array(feature_names, dtype=object)[order]
+        self.numerical_positions_ = positions[: len(self.numerical_columns_)]
+        self.category_positions_ = {}
+        offset = len(self.numerical_columns_)
+        for col in self.categorical_columns_:
+            n_categories = len(self.categories_[col])
+            self.category_positions_[col] = positions[offset : offset + n_categories]
+            offset += n_categories
+        return self
+
+    def transform(self, X: pd.DataFrame) -> sparse.csr_matrix | np.ndarray:
+        """
+        Encode the columns of the dataframe into a matrix.
+
+        Args:
+            X (pd.DataFrame): Dataframe with the same columns as during fit
+
+        Returns:
+            sparse.csr_matrix | np.ndarray: Encoded features with one row per row in X
+        """
+        n_rows = len(X)
+        n_columns = len(self.numerical_columns_) + len(self.categorical_columns_)
+        column_positions = np.empty((n_rows, n_columns), dtype=np.int32)
+        values = np.empty((n_rows, n_columns), dtype=self.dtype)
+        stored = np.ones((n_rows, n_columns), dtype=bool)
+
+        for i, col in enumerate(self.numerical_columns_):
+            column_positions[:, i] = self.numerical_positions_[i]
+            values[:, i] = np.asarray(X[col], dtype=self.dtype)
+
+        values[:, len(self.numerical_columns_) :] = 1
+        for i, col in enumerate(self.categorical_columns_, start=len(self.numerical_columns_)):
+            codes = pd.Categorical(X[col], categories=self.categories_[col]).codes
+            stored[:, i] = codes >= 0
+            column_positions[:, i] = self.category_positions_[col][np.maximum(codes, 0)]
+
+        n_features = len(self.feature_names_)
+        if not self.sparse_output:
+            dense = np.zeros((n_rows, n_features), dtype=self.dtype)
+            rows = np.broadcast_to(np.arange(n_rows)[:, None], stored.shape)
+            dense[rows[stored], column_positions[stored]] = values[stored]
+            return dense
+
+        indptr = np.zeros(n_rows + 1, dtype=np.int32)
+        np.cumsum(stored.sum(axis=1), out=indptr[1:])
+        return sparse.csr_matrix(
+            (values[stored], column_positions[stored], indptr),
+            shape=(n_rows, n_features),
+        )
+
+    def get_feature_names_out(self, input_features: npt.ArrayLike | None = None) -> np.ndarray:
+        """
+        Names of the output features, in output order.
+
+        Args:
+            input_features (npt.ArrayLike | None, optional): Ignored. Defaults to None.
+
+        Returns:
+            np.ndarray: Feature names
+        """
+        return self.feature_names_.copy()
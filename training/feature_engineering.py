@@ -4,11 +4,43 @@ base on the dataset Kaggle Flight Price Prediction Dataset.
 Written by Magnus Pierrau for MLOps Zoomcamp Final Project Cohort 2024
 """
 
+import sys
 import calendar
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 
+# Weekday labels indexed by numpy/pandas weekday number (Mon=0), with
+# "Unknown" as the last entry for dates that can not be parsed.
+WEEKDAY_LABELS = np.array([*calendar.day_abbr, "Unknown"], dtype=object)
+UNKNOWN_WEEKDAY_CODE = len(WEEKDAY_LABELS) - 1
+# Range of years which can be represented by pd.Timestamp (ns resolution)
+# for a date in January. 1677 is excluded since pd.Timestamp.min is 1677-09-21.
+MIN_TIMESTAMP_YEAR = 1678
+MAX_TIMESTAMP_YEAR = 2262
+# Weekday number of January 1st of each of these years. 1970-01-01 was a Thursday,
+# i.e. weekday 3 with Monday as 0.
+JANUARY_FIRST_WEEKDAYS = (
+    np.arange(MIN_TIMESTAMP_YEAR - 1970, MAX_TIMESTAMP_YEAR - 1970 + 1)
+    .astype("datetime64[Y]")
+    .astype("datetime64[D]")
+    .astype(np.int64)
+    + 3
+) % 7
+
+# Closest full hour of each minute of the day, indexed by hours * 60 + minutes.
+# Ties are rounded to the closest even hour and 23:30 or later wraps around to 0,
+# like pd.Series.dt.round.
+_HOURS, _MINUTES = np.divmod(np.arange(24 * 60), 60)
+ROUNDED_HOURS = ((_HOURS + ((_MINUTES > 30) | ((_MINUTES == 30) & (_HOURS % 2 == 1)))) % 24).astype(
+    np.int32
+)
+
+# Cities of the Kaggle dataset, whose trip ids are built once
+SOURCES = ["Banglore", "Chennai", "Delhi", "Kolkata", "Mumbai"]
+DESTINATIONS = ["Banglore", "Cochin", "Delhi", "Hyderabad", "Kolkata", "New Delhi"]
+
 
 def get_weekday_or_unknown(date: datetime | None) -> str:
     """
@@ -29,10 +61,59 @@ def get_weekday_or_unknown(date: datetime | None) -> str:
     return weekday
 
 
+def _has_integer_columns(df: pd.DataFrame, cols: list[str]) -> bool:
+    """
+    Check if the vectorized integer implementations can be used for the given columns.
+
+    Args:
+        df (pd.DataFrame): Dataframe holding the columns
+        cols (list[str]): Column names to check
+
+    Returns:
+        bool: True if the df is non-empty and all columns have an integer dtype
+    """
+    return len(df) > 0 and all(pd.api.types.is_integer_dtype(df[col]) for col in cols)
+
+
 def create_weekday_feature(df: pd.DataFrame) -> pd.Series:
     """
-    Function for creating the 'weekday' feature
-    Also removes blank space in source and destination.
+    Function for creating the 'weekday' feature.
+    Note that the month is parsed as minutes ("%M"), so the weekday is
+    that of the given date in January of the given year. This is kept
+    as is to stay consistent with already trained models.
+
+    Args:
+        df (pd.DataFrame): Dataframe holding columns "date", "month"
+                            and "year" as integers or strings.
+
+    Returns:
+        pd.Series: Series containing the created feature
+    """
+    cols = ["date", "month", "year"]
+    if not _has_integer_columns(df, cols):
+        return _create_weekday_feature_from_strings(df)
+
+    date = df["date"].to_numpy(dtype=np.int64)
+    month = df["month"].to_numpy(dtype=np.int64)
+    year = df["year"].to_numpy(dtype=np.int64)
+
+    valid = (
+        (date >= 1)
+        & (date <= 31)
+        & (month >= 0)
+        & (month <= 59)
+        & (year >= MIN_TIMESTAMP_YEAR)
+        & (year <= MAX_TIMESTAMP_YEAR)
+    )
+    january_first = JANUARY_FIRST_WEEKDAYS[np.where(valid, year - MIN_TIMESTAMP_YEAR, 0)]
+    weekday_codes = np.where(valid, (january_first + date - 1) % 7, UNKNOWN_WEEKDAY_CODE)
+    return pd.Series(WEEKDAY_LABELS[weekday_codes], index=df.index)
+
+
+def _create_weekday_feature_from_strings(df: pd.DataFrame) -> pd.Series:
+    """
+    String based implementation of create_weekday_feature, used as fallback
+    for non-integer columns.
 
     Args:
         df (pd.DataFrame): Dataframe holding columns "date", "month"
@@ -49,12 +130,95 @@ def create_weekday_feature(df: pd.DataFrame) -> pd.Series:
     return weekday_abbrs
 
 
+def _join_trip_id(source: str, destination: str) -> str:
+    """
+    Trip id of a source and destination, without blank space.
+    Ex. Banglore, New Delhi -> Banglore_NewDelhi
+
+    Args:
+        source (str): Source city
+        destination (str): Destination city
+
+    Returns:
+        str: The trip id
+    """
+    return sys.intern(source.replace(" ", "") + "_" + destination.replace(" ", ""))
+
+
+TRIP_IDS = {
+    (source, destination): _join_trip_id(source, destination)
+    for source in SOURCES
+    for destination in DESTINATIONS
+}
+# Above this many rows factorizing the columns is faster than a lookup per row
+TRIP_ID_LOOKUP_MAX_ROWS = 2_000
+
+
 def create_trip_ids(df: pd.DataFrame) -> pd.Series:
     """
     Function for creating the 'trip id' feature.
     Removes blank space in source and destination and concatenates them using an underscore.
     Ex. Banglore_NewDelhi, Delhi_Cochin
 
+    Trip ids of the cities of the dataset are looked up in TRIP_IDS, others are
+    only built once per unique source/destination pair. Large frames are
+    factorized first, so that only the unique pairs are looked up.
+
+    Args:
+        df (pd.DataFrame): Dataframe holding columns "destination" and "source"
+
+    Returns:
+        pd.Series: Series containing the created feature
+    """
+    if len(df) == 0:
+        return _create_trip_ids_from_strings(df)
+    if len(df) > TRIP_ID_LOOKUP_MAX_ROWS:
+        return _create_trip_ids_by_factorizing(df)
+
+    trip_ids = dict(TRIP_IDS)
+    values = []
+    for pair in zip(df["source"].to_numpy(), df["destination"].to_numpy()):
+        trip_id = trip_ids.get(pair)
+        if trip_id is None:
+            if not (isinstance(pair[0], str) and isinstance(pair[1], str)):
+                return _create_trip_ids_from_strings(df)
+            trip_id = trip_ids[pair] = _join_trip_id(*pair)
+        values.append(trip_id)
+    return pd.Series(values, index=df.index, dtype=object)
+
+
+def _create_trip_ids_by_factorizing(df: pd.DataFrame) -> pd.Series:
+    """
+    Implementation of create_trip_ids for large frames, which looks up
+    each unique source/destination pair once.
+
+    Args:
+        df (pd.DataFrame): Dataframe holding columns "destination" and "source"
+
+    Returns:
+        pd.Series: Series containing the created feature
+    """
+    source_codes, sources = pd.factorize(df["source"])
+    destination_codes, destinations = pd.factorize(df["destination"])
+    if (source_codes < 0).any() or (destination_codes < 0).any():
+        return _create_trip_ids_from_strings(df)
+
+    pair_codes, unique_pairs = pd.factorize(source_codes * len(destinations) + destination_codes)
+    unique_sources, unique_destinations = np.divmod(unique_pairs, len(destinations))
+    unique_trip_ids = np.empty(len(unique_pairs), dtype=object)
+    for i, (s, d) in enumerate(zip(unique_sources, unique_destinations)):
+        pair = (sources[s], destinations[d])
+        unique_trip_ids[i] = TRIP_IDS.get(pair) or _join_trip_id(*pair)
+    return pd.Series(unique_trip_ids[pair_codes], index=df.index)
+
+
+def _create_trip_ids_from_strings(df: pd.DataFrame) -> pd.Series:
+    """
+    Row-wise implementation of create_trip_ids, used as fallback
+    for columns with missing values.
+    Removes blank space in source and destination and concatenates them using an underscore.
+    Ex. Banglore_NewDelhi, Delhi_Cochin
+
     Args:
         df (pd.DataFrame): Dataframe holding columns "destination" and "source"
 
@@ -67,6 +231,27 @@ def create_trip_ids(df: pd.DataFrame) -> pd.Series:
     return trip_ids
 
 
+def _round_to_closest_full_hour(hours: pd.Series, minutes: pd.Series) -> pd.Series:
+    """
+    Round integer hours and minutes to the closest full hour with the
+    ROUNDED_HOURS table. Invalid times give NaN.
+
+    Args:
+        hours (pd.Series): Integer hours
+        minutes (pd.Series): Integer minutes
+
+    Returns:
+        pd.Series: Rounded hours as int32, or float64 if any time is invalid
+    """
+    h = hours.to_numpy(dtype=np.int64)
+    m = minutes.to_numpy(dtype=np.int64)
+    valid = (h >= 0) & (h <= 23) & (m >= 0) & (m <= 59)
+    rounded = ROUNDED_HOURS[np.where(valid, h * 60 + m, 0)]
+    if valid.all():
+        return pd.Series(rounded, index=hours.index)
+    return pd.Series(np.where(valid, rounded, np.nan), index=hours.index)
+
+
 def create_rounded_arrival_and_departure_times(
     df: pd.DataFrame,
 ) -> tuple[pd.Series, pd.Series]:
@@ -74,6 +259,30 @@ def create_rounded_arrival_and_departure_times(
     Function for rounding departure hours and arrival hours to closest full hour
     to reduce cardinality. Ex. 5:44 -> 6, 23:13 -> 23
 
+    Args:
+        df (pd.DataFrame): Dataframe holding columns "dep_hours" "dep_min",
+                            "arrival_hours" and "arrival_min"
+
+    Returns:
+        tuple[pd.Series[int],pd.Series[int]]: Tuple holding each Series
+                                                containing the created feature
+    """
+    cols = ["dep_hours", "dep_min", "arrival_hours", "arrival_min"]
+    if not _has_integer_columns(df, cols):
+        return _create_rounded_arrival_and_departure_times_from_strings(df)
+
+    dep_closest_full_hour = _round_to_closest_full_hour(df["dep_hours"], df["dep_min"])
+    arr_closest_full_hour = _round_to_closest_full_hour(df["arrival_hours"], df["arrival_min"])
+    return dep_closest_full_hour, arr_closest_full_hour
+
+
+def _create_rounded_arrival_and_departure_times_from_strings(
+    df: pd.DataFrame,
+) -> tuple[pd.Series, pd.Series]:
+    """
+    String based implementation of create_rounded_arrival_and_departure_times,
+    used as fallback for non-integer columns.
+
     Args:
         df (pd.DataFrame): Dataframe holding columns "dep_hours" "dep_min",
                             "arrival_hours" and "arrival_min"
@@ -187,17 +396,16 @@ def feature_engineering(df: pd.DataFrame) -> pd.DataFrame:
 
 def preprocessing_pipeline(
     df_raw: pd.DataFrame,
-) -> list[dict]:
+) -> pd.DataFrame:
     """
-    Combo of feature engineering and selection and
-    final transformation into a list of dicts
+    Combo of feature engineering and selection. The result is
+    encoded column by column by the ColumnarEncoder.
 
     Args:
         df_raw (pd.DataFrame): Data to process
 
     Returns:
-        list[dict]: List of dictionaries
+        pd.DataFrame: Dataframe with the selected features
     """
     df = feature_engineering(df_raw.copy())
-    df = feature_selection(df)
-    return df.to_dict(orient="records")
+    return feature_selection(df)
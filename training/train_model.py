@@ -15,9 +15,9 @@ import pandas as pd
 import numpy.typing as npt
 from prefect import task
 from mlflow.data import pandas_dataset
+from columnar_encoder import ColumnarEncoder
 from sklearn.pipeline import FunctionTransformer, make_pipeline
 from feature_engineering import preprocessing_pipeline
-from sklearn.feature_extraction import DictVectorizer
 
 from training.utils import calculate_metrics
 
@@ -93,11 +93,11 @@ def train_and_evaluate(
         log_model (bool): Whether to save model artifacts to mlflow.
             Good to not do during hyperopt tuning.
     """
-    # Create a pipeline with preprocessing, vectorizer and model
+    # Create a pipeline with preprocessing, encoder and model
     model_instance = model_class(**model_pars)
     pipeline = make_pipeline(
         FunctionTransformer(preprocessing_pipeline, validate=False),
-        DictVectorizer(),
+        ColumnarEncoder(),
         model_instance,
     )
 
@@ -129,7 +129,11 @@ def train_and_evaluate(
                 pipeline,
                 artifact_path="model",
                 input_example=input_example,
-                code_paths=["training/feature_engineering.py", "training/train_model.py"],
+                code_paths=[
+                    "training/feature_engineering.py",
+                    "training/columnar_encoder.py",
+                    "training/train_model.py",
+                ],
             )
 
     return metrics